@@ -1,15 +1,45 @@
 ﻿import pandas as pd
+import numpy as np
+from pandas.api.types import union_categoricals
 import os
-import requests
-from urllib.parse import urlencode
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, date
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+from intervalos import mesclar_intervalos, contar_por_dia, datas_para_dias, dias_para_datas
+from snapshot import SnapshotCache
+from planilhas import arquivo_fonte, ler_aba, origem_planilha
+from clima import ClienteClimaERA5, clima_nas_rotas, dias_por_celula, rotas_em_celulas
+from indices import IndiceNavioMes, IndiceSessoes
+from cubo import CuboConsumo, fatos_consumo
+from desempenho import MonitorDesempenho, medir_etapa
+from treinamento import EntradaNavio, features_navio, gerar_dataset
+from pli import (CUSTOS_LIMPEZA_PADRAO, HORIZONTE_PADRAO_DIAS, PRECOS_COMBUSTIVEL_PADRAO, RISCO_PADRAO,
+                 TAXA_DESCONTO_ANUAL, PerfilNavio, avaliar_frota, penalidade, taxa_incrustacao)
 
 
 # ==============================================================================
 # CLASSE PRINCIPAL DE ANÁLISE DE DADOS
 # ==============================================================================
 
+def _tabela_base(nome: str) -> property:
+    """Atributo df_<nome>: na carga paralela, a primeira leitura aguarda a carga da tabela."""
+
+    def obter(self) -> pd.DataFrame:
+        try:
+            return self._tabelas[nome]
+        except KeyError:
+            df = self._tabelas[nome] = self._cargas[nome].result()
+            return df
+
+    def definir(self, df: pd.DataFrame) -> None:
+        self._tabelas[nome] = df
+
+    return property(obter, definir)
+
+
 class TranspetroAnalytics:
     """
     Classe de análise de dados para o Hackathon Transpetro.
@@ -28,31 +58,226 @@ class TranspetroAnalytics:
         'Tipo de incrustação da embarcação': 'TipoIncrustacao',
         'Data': 'DataRelatorio'
     }
-
-    def __init__(self, eventos_path: str, consumo_path: str, revestimento_path: str, iws_path: str):
+    # Lidas também das planilhas .xlsx quando presentes (atributos do navio, ex.: agrupar_por='Classe')
+    REVESTIMENTO_COLS_EXTRAS = ['Classe']
+
+    # Modo compacto: só as colunas usadas pelas métricas, textos repetidos como categorias
+    # (códigos inteiros + dicionário) e numéricos em float32. Datas já ocupam 8 bytes (datetime64).
+    COLUNAS_EVENTOS = ['sessionId', 'shipName', 'eventName', 'startGMTDate', 'endGMTDate', 'duration',
+                       'decLatitude', 'decLongitude']
+    COLUNAS_CONSUMO = ['sessionId', 'consumedQuantity', 'DESCRIPTION']
+    COLUNAS_CATEGORICAS = ('shipName', 'eventName', 'DESCRIPTION')
+    COLUNAS_FLOAT32 = ('duration', 'decLatitude', 'decLongitude', 'consumedQuantity')
+    LINHAS_POR_BLOCO = 500_000
+    TABELAS_COMPACTAS = ('eventos', 'consumo', 'consolidado')
+    TABELAS_BASE = ('eventos', 'consumo', 'consolidado', 'revestimento', 'iws')
+
+    df_eventos = _tabela_base('eventos')
+    df_consumo = _tabela_base('consumo')
+    df_consolidado = _tabela_base('consolidado')
+    df_revestimento = _tabela_base('revestimento')
+    df_iws = _tabela_base('iws')
+
+    def __init__(self, eventos_path: str, consumo_path: str, revestimento_path: str, iws_path: str,
+                 snapshot_dir: Optional[str] = None, clima_cache_dir: Optional[str] = None,
+                 clima_api_url: str = ClienteClimaERA5.API_URL, desempenho: Optional[MonitorDesempenho] = None,
+                 compacto: bool = False, tabelas: Optional[Dict[str, pd.DataFrame]] = None,
+                 arquivos_ingeridos: Optional[List] = None, paralelo: bool = False):
         print("Iniciando o carregamento e pré-processamento dos dados...")
 
-        self.df_eventos = self._carregar_eventos(eventos_path)
-        self.df_consumo = self._carregar_consumo(consumo_path)
+        # Representação compacta de eventos/consumo e bytes por tabela antes/depois da compactação
+        self._compacto = compacto
+        self.uso_memoria: Dict[str, Dict[str, Any]] = {}
+
+        # Tempo, linhas, memória e erros de cada etapa (compartilhável com a API)
+        self.desempenho = desempenho or MonitorDesempenho()
 
-        self.df_revestimento = self._carregar_revestimento(revestimento_path)
-        self.df_iws = self._carregar_relatorios_iws(iws_path)
+        # Clientes ERA5 (criados sob demanda), URL padrão e diretório do cache de chunks climáticos
+        self._clima_api_url = clima_api_url
+        self._clima_cache_dir = clima_cache_dir
+        self._clientes_clima: Dict[str, ClienteClimaERA5] = {}
+        self._lock_clima = threading.Lock()
 
-        self.df_consolidado = self._consolidar_dados()
+        # Snapshots colunares em disco (opcional): evitam reprocessar CSVs que não mudaram
+        self._snapshots = SnapshotCache(snapshot_dir) if snapshot_dir else None
+
+        # Tabelas derivadas materializadas: nome -> (entradas usadas no cálculo..., resultado)
+        self._tabelas_materializadas: Dict[str, tuple] = {}
+
+        # Tabelas base (df_eventos, df_consumo, ...) e, na carga paralela, a carga de cada uma
+        self._tabelas: Dict[str, pd.DataFrame] = {}
+        self._cargas: Dict[str, Future] = {}
+        self._carga_concluida: Optional[Future] = None
+
+        if tabelas is not None:
+            # Tabelas já prontas (ex.: dataset compartilhado entre workers): nada é lido dos CSVs
+            self._usar_tabelas(tabelas)
+        else:
+            cargas = {
+                'eventos': ([eventos_path], lambda: self._carregar_eventos(eventos_path)),
+                'consumo': ([consumo_path], lambda: self._carregar_consumo(consumo_path)),
+                # Revestimento e IWS: CSV exportado ou, na falta dele, a própria planilha .xlsx
+                'revestimento': ([arquivo_fonte(revestimento_path)],
+                                 lambda: self._carregar_revestimento(revestimento_path)),
+                'iws': ([arquivo_fonte(iws_path)], lambda: self._carregar_relatorios_iws(iws_path)),
+                # Sem snapshot, a consolidação aguarda as cargas de eventos e consumo
+                'consolidado': ([eventos_path, consumo_path], self._consolidar_dados),
+            }
+            if paralelo:
+                self._carregar_em_paralelo(cargas)
+            else:
+                for nome, (fontes, carregar) in cargas.items():
+                    setattr(self, f'df_{nome}', self._carregar_com_snapshot(nome, fontes, carregar))
+
+        # Estado da ingestão incremental
+        self._lock_ingestao = threading.RLock()
+        self._indices_sessao: Dict[str, IndiceSessoes] = {}
+        self._arquivos_ingeridos: set = {tuple(a) for a in arquivos_ingeridos or []}
+
+        if tabelas is None and not paralelo:
+            self._finalizar_carga()
+
+    def _finalizar_carga(self) -> None:
+        # Índice (navio, data) dos eventos, usado pelas consultas por navio (sob demanda com tabelas prontas)
+        self._indice_eventos()
 
         if self.df_consolidado.empty:
             print("⚠️ Atenção: A base consolidada (Eventos + Consumo) está vazia.")
         else:
             print("✅ Dados carregados e consolidados com sucesso.")
 
+    # --- CARGA PARALELA ---
+
+    def _carregar_em_paralelo(self, cargas: Dict[str, tuple]) -> None:
+        """
+        Dispara a carga de cada tabela base numa thread própria e retorna imediatamente:
+        df_<nome> aguarda a carga na primeira leitura e `pronto()` diz o que já pode ser usado.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(cargas) + 1, thread_name_prefix='carga')
+        for nome, (fontes, carregar) in cargas.items():
+            self._cargas[nome] = executor.submit(self._carregar_com_snapshot, nome, fontes, carregar)
+        self._carga_concluida = executor.submit(self._finalizar_carga)
+        executor.shutdown(wait=False)
+
+    def pronto(self, *nomes: str) -> bool:
+        """True se as tabelas base `nomes` (todas, sem argumentos) já foram carregadas sem erro."""
+        for nome in nomes or self.TABELAS_BASE:
+            carga = self._cargas.get(nome)
+            if nome not in self._tabelas and (carga is None or not carga.done() or carga.exception() is not None):
+                return False
+        return True
+
+    def aguardar_carga(self, timeout: Optional[float] = None) -> None:
+        """Bloqueia até o fim da carga paralela, propagando o erro de qualquer tabela."""
+        for carga in list(self._cargas.values()) + [self._carga_concluida]:
+            if carga is not None:
+                carga.result(timeout)
+
+    def estado_carga(self) -> Dict[str, Any]:
+        """Situação de cada tabela base (pronta, carregando ou erro) e tabelas derivadas já materializadas."""
+        tabelas = {}
+        for nome in self.TABELAS_BASE:
+            carga = self._cargas.get(nome)
+            if self.pronto(nome):
+                tabelas[nome] = {'estado': 'pronta', 'linhas': len(getattr(self, f'df_{nome}'))}
+            elif carga is not None and carga.done():
+                erro = carga.exception()
+                tabelas[nome] = {'estado': 'erro', 'erro': f"{type(erro).__name__}: {erro}"}
+            else:
+                tabelas[nome] = {'estado': 'carregando'}
+        derivadas = sorted(nome for nome in self._tabelas_materializadas if not nome.startswith('memoria:'))
+        return {'tabelas': tabelas, 'derivadas': derivadas}
+
     # --- MÉTODOS DE CARREGAMENTO DE DADOS ---
 
+    # --- TABELAS PRONTAS (DATASET COMPARTILHADO) ---
+
+    def exportar_tabelas(self, df_conformidade: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """
+        Tabelas base e as pré-calculadas mais caras (conformidade, consumo mensal, cubo de consumo e
+        risco da frota), no formato aceito por `TranspetroAnalytics(..., tabelas=...)`.
+        """
+        tabelas = {nome: getattr(self, f'df_{nome}') for nome in self.TABELAS_BASE}
+        tabelas['conformidade_normam'] = df_conformidade
+        tabelas['consumo_mensal'] = self.calcular_consumo_mensal_total()
+        tabelas['cubo_consumo'] = self.cubo_consumo().fatos
+        tabelas['risco_frota'] = self.calcular_risco_bioincrustacao_frota(df_conformidade)
+        return tabelas
+
+    @property
+    def arquivos_ingeridos(self) -> List[tuple]:
+        """Assinaturas (caminho, tamanho, mtime) dos arquivos já ingeridos de pastas monitoradas."""
+        return sorted(self._arquivos_ingeridos)
+
+    def _usar_tabelas(self, tabelas: Dict[str, pd.DataFrame]) -> None:
+        for nome in self.TABELAS_BASE:
+            setattr(self, f'df_{nome}', tabelas.get(nome, pd.DataFrame()))
+            print(f"  -> '{nome}' anexado ({len(getattr(self, f'df_{nome}'))} linhas).")
+
+        # As pré-calculadas entram como materializadas sobre as próprias tabelas recebidas
+        if 'consumo_mensal' in tabelas:
+            self._tabelas_materializadas['consumo_mensal'] = (self.df_consolidado, tabelas['consumo_mensal'])
+        if 'cubo_consumo' in tabelas:
+            self._tabelas_materializadas['cubo_consumo'] = (
+                self.df_eventos, self.df_consumo, CuboConsumo(tabelas['cubo_consumo']))
+        if 'risco_frota' in tabelas and 'conformidade_normam' in tabelas:
+            self._tabelas_materializadas['risco_frota'] = (
+                self.df_eventos, tabelas['conformidade_normam'], tabelas['risco_frota'])
+
+    def _carregar_com_snapshot(self, nome: str, fontes: List[str], carregar) -> pd.DataFrame:
+        """Usa o snapshot colunar de `nome` se as fontes não mudaram; senão carrega e grava um novo."""
+        compacta = self._compacto and nome in self.TABELAS_COMPACTAS
+        df = self._ler_snapshot(nome + ('_compacto' if compacta else ''), fontes, carregar)
+        if compacta and nome not in self.uso_memoria and any(
+                isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes):
+            self._registrar_memoria(nome, self._bytes_representacao_padrao(df), df, estimado=True)
+        return df
+
+    def _ler_snapshot(self, nome: str, fontes: List[str], carregar) -> pd.DataFrame:
+        if self._snapshots is not None:
+            with self.desempenho.etapa(f'snapshot:{nome}') as medicao:
+                df = self._snapshots.carregar(nome, fontes)
+                medicao.linhas = len(df) if df is not None else None
+            if df is not None:
+                print(f"  -> '{nome}' carregado do snapshot ({len(df)} linhas).")
+                return df
+
+        df = carregar().reset_index(drop=True)
+        if self._snapshots is not None and not df.empty:
+            self._snapshots.salvar(nome, fontes, df)
+        return df
+
+    def _carregar_tabela_robusta(self, path: str, required_cols_map: Dict[str, str],
+                                 extras: Sequence[str] = ()) -> pd.DataFrame:
+        """
+        CSV via _carregar_csv_robusto ou, para um .xlsx (ou CSV exportado ausente), a aba da planilha
+        lida por planilhas.ler_aba: só as colunas mapeadas e as `extras` presentes, com cache pelo hash.
+        """
+        planilha = origem_planilha(path)
+        if planilha is None:
+            return self._carregar_csv_robusto(path, required_cols_map)
+
+        arquivo, aba = planilha
+        try:
+            df = ler_aba(arquivo, required_cols_map, aba, extras)
+        except Exception as e:
+            print(f"  -> Falha ao ler a planilha {arquivo}: {e}")
+            self.desempenho.registrar_erro(None, e)
+            return pd.DataFrame()
+        print(f"  -> {path}: lido da planilha {os.path.basename(arquivo)}" + (f" (aba '{aba}')" if aba else ''))
+        if 'shipName' in df.columns:
+            df['shipName'] = df['shipName'].astype(str).str.strip()
+        return df
+
     def _carregar_csv_robusto(self, path: str, required_cols_map: Dict[str, str]) -> pd.DataFrame:
         """Função auxiliar para carregar arquivos CSV com múltiplas opções de separador e encoding."""
         if not os.path.exists(path):
+            print(f"  -> Arquivo não encontrado: {path}")
+            self.desempenho.registrar_erro(None, FileNotFoundError(path))
             return pd.DataFrame()
 
         df = pd.DataFrame()
+        ultimo_erro = None
         carregamento_options = [
             {'sep': ',', 'encoding': 'utf-8'},
             {'sep': ';', 'encoding': 'utf-8'},
@@ -60,6 +285,12 @@ class TranspetroAnalytics:
             {'sep': ',', 'encoding': 'latin1'}
         ]
 
+        # A combinação que funcionou da última vez é testada primeiro
+        lembrada = self._snapshots.opcoes_csv(path) if self._snapshots is not None else None
+        if lembrada in carregamento_options:
+            carregamento_options.remove(lembrada)
+            carregamento_options.insert(0, lembrada)
+
         for options in carregamento_options:
             try:
                 df_temp = pd.read_csv(path, **options)
@@ -68,11 +299,15 @@ class TranspetroAnalytics:
 
                 if all(col in df_temp.columns for col in required_cols_map.keys()):
                     df = df_temp
+                    if self._snapshots is not None:
+                        self._snapshots.lembrar_opcoes_csv(path, options)
                     break
-            except Exception:
-                pass
+            except Exception as e:
+                ultimo_erro = e
 
         if df.empty:
+            self.desempenho.registrar_erro(
+                None, ultimo_erro or KeyError(f"{path}: colunas {list(required_cols_map)} não encontradas"))
             return pd.DataFrame()
 
         df.rename(columns=required_cols_map, inplace=True)
@@ -81,29 +316,139 @@ class TranspetroAnalytics:
 
         return df
 
+    @medir_etapa
     def _carregar_eventos(self, path: str) -> pd.DataFrame:
         try:
-            df = pd.read_csv(path)
-            df.columns = df.columns.str.strip().str.replace('"', '', regex=False)
-            df.rename(columns={'startGMTDate': 'startGMTDate', 'endGMTDate': 'endGMTDate'}, inplace=True)
-            df['startGMTDate'] = pd.to_datetime(df['startGMTDate'], errors='coerce')
-            df['endGMTDate'] = pd.to_datetime(df['endGMTDate'], errors='coerce')
-            return df
-        except Exception:
+            if self._compacto:
+                return self._ler_csv_compacto('eventos', path, self._preparar_eventos, self.COLUNAS_EVENTOS)
+            return self._preparar_eventos(pd.read_csv(path))
+        except Exception as e:
+            print(f"  -> Falha ao carregar eventos de {path}: {e}")
+            self.desempenho.registrar_erro('_carregar_eventos', e)
             return pd.DataFrame()
 
+    @medir_etapa
     def _carregar_consumo(self, path: str) -> pd.DataFrame:
         try:
-            df = pd.read_csv(path)
-            df.rename(columns={'SESSION_ID': 'sessionId', 'CONSUMED_QUANTITY': 'consumedQuantity'}, inplace=True)
-            df.columns = df.columns.str.strip().str.replace('"', '', regex=False)
-            df['consumedQuantity'] = pd.to_numeric(df['consumedQuantity'], errors='coerce').fillna(0)
-            return df
-        except Exception:
+            if self._compacto:
+                return self._ler_csv_compacto('consumo', path, self._preparar_consumo, self.COLUNAS_CONSUMO)
+            return self._preparar_consumo(pd.read_csv(path))
+        except Exception as e:
+            print(f"  -> Falha ao carregar consumo de {path}: {e}")
+            self.desempenho.registrar_erro('_carregar_consumo', e)
             return pd.DataFrame()
 
+    @staticmethod
+    def _preparar_eventos(df: pd.DataFrame) -> pd.DataFrame:
+        df.columns = df.columns.str.strip().str.replace('"', '', regex=False)
+        df.rename(columns={'startGMTDate': 'startGMTDate', 'endGMTDate': 'endGMTDate'}, inplace=True)
+        df['startGMTDate'] = pd.to_datetime(df['startGMTDate'], errors='coerce')
+        df['endGMTDate'] = pd.to_datetime(df['endGMTDate'], errors='coerce')
+        return df
+
+    @staticmethod
+    def _preparar_consumo(df: pd.DataFrame) -> pd.DataFrame:
+        df.rename(columns={'SESSION_ID': 'sessionId', 'CONSUMED_QUANTITY': 'consumedQuantity'}, inplace=True)
+        df.columns = df.columns.str.strip().str.replace('"', '', regex=False)
+        df['consumedQuantity'] = pd.to_numeric(df['consumedQuantity'], errors='coerce').fillna(0)
+        return df
+
+    # --- REPRESENTAÇÃO COMPACTA ---
+
+    def _ler_csv_compacto(self, nome: str, path: str, preparar, colunas: List[str]) -> pd.DataFrame:
+        """
+        Lê o CSV em blocos, limpando e compactando cada um antes do próximo: o pico de memória
+        fica em um bloco na representação padrão. Os bytes que a tabela inteira ocuparia sem
+        compactação (todas as colunas, dtypes padrão) são somados bloco a bloco.
+        """
+        blocos, bytes_padrao = [], 0
+        for bloco in pd.read_csv(path, chunksize=self.LINHAS_POR_BLOCO):
+            bloco = preparar(bloco)
+            bytes_padrao += int(bloco.memory_usage(index=False, deep=True).sum())
+            blocos.append(self._compactar(bloco, colunas))
+
+        df = self._concatenar(blocos) if blocos else pd.DataFrame(columns=colunas)
+        self._registrar_memoria(nome, bytes_padrao, df)
+        return df
+
+    @classmethod
+    def _compactar(cls, df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
+        """Projeta `colunas` e converte textos repetidos em categorias e numéricos em float32."""
+        df = df[[col for col in colunas if col in df.columns]].copy()
+        for col in df.columns:
+            if col in cls.COLUNAS_CATEGORICAS:
+                df[col] = df[col].astype('category')
+            elif col in cls.COLUNAS_FLOAT32:
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+        return df
+
+    @staticmethod
+    def _concatenar(partes: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        pd.concat que preserva as colunas categóricas: os dicionários das partes são unidos
+        (union_categoricals) em vez de a coluna cair para object quando as categorias diferem.
+        """
+        colunas = partes[0].columns
+        categoricas = [col for col in colunas if isinstance(partes[0][col].dtype, pd.CategoricalDtype)]
+        if not categoricas:
+            return pd.concat(partes, ignore_index=True)
+
+        if any(not p.columns.equals(colunas) for p in partes[1:]):
+            df = pd.concat(partes, ignore_index=True)
+            for col in categoricas:
+                df[col] = df[col].astype('category')
+            return df
+
+        dados = {}
+        for col in colunas:
+            if col in categoricas:
+                dados[col] = pd.Series(union_categoricals(
+                    [p[col] if isinstance(p[col].dtype, pd.CategoricalDtype) else p[col].astype('category')
+                     for p in partes]))
+            else:
+                dados[col] = pd.concat([p[col] for p in partes], ignore_index=True)
+        return pd.DataFrame(dados, copy=False)
+
+    @classmethod
+    def _bytes_representacao_padrao(cls, df: pd.DataFrame) -> int:
+        """Estimativa dos bytes de `df` com dtypes padrão (object para textos, float64) sem convertê-lo."""
+        total = 0
+        for col in df.columns:
+            serie = df[col]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                # Um ponteiro por linha + o objeto str de cada linha (NaN vira um float de 24 bytes)
+                tamanhos = np.array([sys.getsizeof(c) for c in serie.cat.categories] + [sys.getsizeof(np.nan)])
+                codigos = serie.cat.codes.to_numpy()
+                total += 8 * len(serie) + int(tamanhos[np.where(codigos < 0, len(tamanhos) - 1, codigos)].sum())
+            elif serie.dtype == np.float32:
+                total += 8 * len(serie)
+            else:
+                total += int(serie.memory_usage(index=False, deep=True))
+        return total
+
+    def _registrar_memoria(self, nome: str, bytes_padrao: int, df: pd.DataFrame, estimado: bool = False) -> None:
+        bytes_compacto = int(df.memory_usage(index=False, deep=True).sum())
+        self.uso_memoria[nome] = {'bytes_padrao': bytes_padrao, 'bytes_compacto': bytes_compacto,
+                                  'padrao_estimado': estimado}
+        reducao = 1 - bytes_compacto / bytes_padrao if bytes_padrao else 0.0
+        print(f"  -> '{nome}' compacto: {bytes_padrao / 2 ** 20:.1f} MiB -> {bytes_compacto / 2 ** 20:.1f} MiB "
+              f"(-{reducao:.0%}{', padrão estimado' if estimado else ''})")
+
+    def relatorio_memoria(self) -> Dict[str, Dict[str, Any]]:
+        """Linhas e bytes atuais (deep) de cada tabela base, com o comparativo da compactação quando houver."""
+        relatorio = {}
+        for nome in self.TABELAS_BASE:
+            df = getattr(self, f'df_{nome}')
+            cache = self._tabelas_materializadas.get(f'memoria:{nome}')
+            if cache is None or cache[0] is not df:
+                cache = (df, int(df.memory_usage(index=True, deep=True).sum()))
+                self._tabelas_materializadas[f'memoria:{nome}'] = cache
+            relatorio[nome] = {'linhas': len(df), 'bytes': cache[1], **self.uso_memoria.get(nome, {})}
+        return relatorio
+
+    @medir_etapa
     def _carregar_revestimento(self, path: str) -> pd.DataFrame:
-        df = self._carregar_csv_robusto(path, self.REVESTIMENTO_COLS)
+        df = self._carregar_tabela_robusta(path, self.REVESTIMENTO_COLS, self.REVESTIMENTO_COLS_EXTRAS)
         if df.empty:
             return pd.DataFrame()
 
@@ -114,8 +459,9 @@ class TranspetroAnalytics:
         print(f"  -> Linhas de revestimento válidas carregadas: {len(df)}")
         return df
 
+    @medir_etapa
     def _carregar_relatorios_iws(self, path: str) -> pd.DataFrame:
-        df = self._carregar_csv_robusto(path, self.IWS_COLS)
+        df = self._carregar_tabela_robusta(path, self.IWS_COLS)
 
         if df.empty:
             return pd.DataFrame()
@@ -133,6 +479,7 @@ class TranspetroAnalytics:
         else:
             return pd.DataFrame()
 
+    @medir_etapa
     def _consolidar_dados(self) -> pd.DataFrame:
         if self.df_eventos.empty or self.df_consumo.empty:
             return pd.DataFrame()
@@ -140,33 +487,282 @@ class TranspetroAnalytics:
         df_eventos_limpo = self.df_eventos[['sessionId', 'shipName', 'startGMTDate', 'eventName']].drop_duplicates(
             subset=['sessionId'])
 
-        df = pd.merge(
+        return self._juntar_eventos_consumo(df_eventos_limpo, self.df_consumo)
+
+    @staticmethod
+    def _juntar_eventos_consumo(df_eventos_limpo: pd.DataFrame, df_consumo: pd.DataFrame) -> pd.DataFrame:
+        """Inner join por sessionId entre eventos (um por sessão) e linhas de consumo."""
+        return pd.merge(
             df_eventos_limpo,
-            self.df_consumo[['sessionId', 'consumedQuantity']],
+            df_consumo[['sessionId', 'consumedQuantity']],
             on='sessionId',
             how='inner'
         )
-        return df
+
+    # --- INGESTÃO INCREMENTAL ---
+
+    @medir_etapa
+    def ingerir_eventos(self, df_novos: pd.DataFrame) -> Dict[str, int]:
+        """
+        Acrescenta novos eventos de viagem sem recarregar a base.
+        Sessões (sessionId) já conhecidas são ignoradas. df_consolidado e as tabelas
+        derivadas materializadas são atualizados apenas nas células (navio, mês) afetadas.
+        """
+        with self._lock_ingestao:
+            df_novos = self._preparar_eventos(df_novos.copy())
+            indice_eventos = self._indice_sessoes('eventos')
+            df_novos = df_novos[~indice_eventos.contem(df_novos['sessionId'].to_numpy())]
+            df_novos = df_novos.drop_duplicates(subset=['sessionId']).reset_index(drop=True)
+            if df_novos.empty:
+                return {'eventos_novos': 0, 'linhas_consolidadas': 0}
+            if self._compacto:
+                df_novos = self._compactar(df_novos, self.COLUNAS_EVENTOS)
+
+            df_eventos_antigo = self.df_eventos
+            self.df_eventos = self._concatenar([df_eventos_antigo, df_novos])
+            indice_eventos.acrescentar(df_novos['sessionId'].to_numpy(),
+                                       len(df_eventos_antigo) + np.arange(len(df_novos)))
+
+            # Consumo que já tinha chegado para essas sessões
+            posicoes = self._indice_sessoes('consumo').todas_posicoes(df_novos['sessionId'].to_numpy())
+            df_consolidado_novo = self._juntar_eventos_consumo(
+                df_novos[['sessionId', 'shipName', 'startGMTDate', 'eventName']],
+                self.df_consumo.iloc[posicoes]) if len(posicoes) else pd.DataFrame()
+
+            self._acrescentar_consolidado(df_consolidado_novo)
+            self._somar_ao_cubo(df_eventos_antigo, self.df_consumo, df_novos, self.df_consumo.iloc[posicoes])
+            self._atualizar_risco_incremental(df_eventos_antigo, df_novos)
+
+            return {'eventos_novos': len(df_novos), 'linhas_consolidadas': len(df_consolidado_novo)}
+
+    @medir_etapa
+    def ingerir_consumo(self, df_novos: pd.DataFrame) -> Dict[str, int]:
+        """
+        Acrescenta novas linhas de consumo (ResultadoQueryConsumo). Uma sessão pode chegar em
+        vários lotes (ex.: outra linha de combustível depois): só são ignoradas as linhas iguais
+        a uma já presente em df_consumo (sessionId, DESCRIPTION e quantidade), contadas em
+        'linhas_repetidas'.
+        """
+        with self._lock_ingestao:
+            df_novos = self._preparar_consumo(df_novos.copy())
+            indice_consumo = self._indice_sessoes('consumo')
+            repetidas = self._linhas_consumo_repetidas(df_novos, indice_consumo)
+            df_novos = df_novos[~repetidas].reset_index(drop=True)
+            if df_novos.empty:
+                return {'linhas_consumo_novas': 0, 'linhas_consolidadas': 0, 'linhas_repetidas': int(repetidas.sum())}
+            if self._compacto:
+                df_novos = self._compactar(df_novos, self.COLUNAS_CONSUMO)
+
+            df_consumo_antigo = self.df_consumo
+            n_antigo = len(df_consumo_antigo)
+            self.df_consumo = self._concatenar([df_consumo_antigo, df_novos])
+            indice_consumo.acrescentar(df_novos['sessionId'].to_numpy(), n_antigo + np.arange(len(df_novos)))
+
+            # Primeiro evento de cada sessão (mesma regra de _consolidar_dados)
+            posicoes = self._indice_sessoes('eventos').primeira_posicao(df_novos['sessionId'].unique())
+            posicoes = posicoes[posicoes >= 0]
+            df_consolidado_novo = self._juntar_eventos_consumo(
+                self.df_eventos.iloc[posicoes][['sessionId', 'shipName', 'startGMTDate', 'eventName']],
+                df_novos) if len(posicoes) else pd.DataFrame()
+
+            self._acrescentar_consolidado(df_consolidado_novo)
+            # Os eventos dessas sessões já estão no cubo: soma só o consumo
+            self._somar_ao_cubo(self.df_eventos, df_consumo_antigo, self.df_eventos.iloc[posicoes], df_novos,
+                                contar_eventos=False)
+
+            return {'linhas_consumo_novas': len(df_novos), 'linhas_consolidadas': len(df_consolidado_novo),
+                    'linhas_repetidas': int(repetidas.sum())}
+
+    def _linhas_consumo_repetidas(self, df_novos: pd.DataFrame, indice_consumo: IndiceSessoes) -> np.ndarray:
+        """Máscara das linhas de `df_novos` iguais a uma linha de df_consumo das mesmas sessões."""
+        ids = df_novos['sessionId'].to_numpy()
+        repetidas = np.zeros(len(df_novos), dtype=bool)
+        conhecidas = indice_consumo.contem(ids)
+        if not conhecidas.any():
+            return repetidas
+        existentes = self.df_consumo.iloc[indice_consumo.todas_posicoes(np.unique(ids[conhecidas]))]
+        # Compara na precisão armazenada (float32 no modo compacto) e com o combustível como texto
+        tipo_quantidade = self.df_consumo['consumedQuantity'].dtype
+
+        def chaves(df: pd.DataFrame) -> pd.MultiIndex:
+            return pd.MultiIndex.from_arrays([df['sessionId'].to_numpy(), df['DESCRIPTION'].astype(str).to_numpy(),
+                                              df['consumedQuantity'].to_numpy(dtype=tipo_quantidade)])
+
+        repetidas[conhecidas] = chaves(df_novos[conhecidas]).isin(chaves(existentes))
+        return repetidas
+
+    def ingerir_pasta(self, pasta: str) -> Dict[str, int]:
+        """
+        Ingere os CSVs ainda não processados de uma pasta monitorada. O tipo de cada arquivo
+        é reconhecido pelo cabeçalho (eventos: eventName; consumo: SESSION_ID/CONSUMED_QUANTITY).
+        """
+        resumo = {'arquivos': 0, 'eventos_novos': 0, 'linhas_consumo_novas': 0}
+        if not os.path.isdir(pasta):
+            return resumo
+
+        arquivos_eventos, arquivos_consumo = [], []
+        for nome in sorted(os.listdir(pasta)):
+            path = os.path.join(pasta, nome)
+            if not nome.lower().endswith('.csv') or not os.path.isfile(path):
+                continue
+            assinatura = self._assinatura_arquivo(path)
+            if assinatura in self._arquivos_ingeridos:
+                continue
+            try:
+                df = pd.read_csv(path)
+            except Exception as e:
+                print(f"  -> [ingestão] Arquivo ignorado {nome}: {e}")
+                continue
+            colunas = set(df.columns.str.strip().str.replace('"', '', regex=False))
+            if 'eventName' in colunas:
+                arquivos_eventos.append((assinatura, df))
+            elif colunas & {'SESSION_ID', 'CONSUMED_QUANTITY', 'consumedQuantity'}:
+                arquivos_consumo.append((assinatura, df))
+
+        # Eventos primeiro, para que o consumo do mesmo lote já encontre suas sessões
+        for assinatura, df in arquivos_eventos:
+            resumo['eventos_novos'] += self.ingerir_eventos(df)['eventos_novos']
+            self._arquivos_ingeridos.add(assinatura)
+            resumo['arquivos'] += 1
+        for assinatura, df in arquivos_consumo:
+            resumo['linhas_consumo_novas'] += self.ingerir_consumo(df)['linhas_consumo_novas']
+            self._arquivos_ingeridos.add(assinatura)
+            resumo['arquivos'] += 1
+
+        return resumo
+
+    def registrar_arquivo_ingerido(self, path: str) -> None:
+        """Marca `path` como já ingerido (ex.: lote recebido pela API e gravado na pasta monitorada)."""
+        self._arquivos_ingeridos.add(self._assinatura_arquivo(path))
+
+    @staticmethod
+    def _assinatura_arquivo(path: str) -> tuple:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def _indice_sessoes(self, tabela: str) -> IndiceSessoes:
+        """Índice ordenado de sessionId de 'eventos' ou 'consumo' (montado na primeira ingestão)."""
+        if tabela not in self._indices_sessao:
+            df = self.df_eventos if tabela == 'eventos' else self.df_consumo
+            ids = df['sessionId'].to_numpy() if 'sessionId' in df.columns else np.array([], dtype=np.int64)
+            self._indices_sessao[tabela] = IndiceSessoes(ids)
+        return self._indices_sessao[tabela]
+
+    def _acrescentar_consolidado(self, df_consolidado_novo: pd.DataFrame) -> None:
+        """Anexa linhas novas a df_consolidado e soma-as ao consumo mensal materializado."""
+        if df_consolidado_novo.empty:
+            return
+
+        df_antigo = self.df_consolidado
+        self.df_consolidado = self._concatenar([df_antigo, df_consolidado_novo])
+
+        cache = self._tabelas_materializadas.get('consumo_mensal')
+        if cache is not None and cache[0] is df_antigo:
+            df_mensal = pd.concat([cache[1], self._somar_consumo_mensal(df_consolidado_novo)])
+            df_mensal = df_mensal.groupby('Mês/Ano', as_index=False)['Consumo Total (unidade)'].sum()
+            self._tabelas_materializadas['consumo_mensal'] = (self.df_consolidado, df_mensal)
+
+    def _somar_ao_cubo(self, df_eventos_antigo: pd.DataFrame, df_consumo_antigo: pd.DataFrame,
+                       eventos_novos: pd.DataFrame, consumo_novo: pd.DataFrame, contar_eventos: bool = True) -> None:
+        """Soma ao cubo de consumo materializado os fatos das sessões ingeridas (ou o descarta)."""
+        cache = self._tabelas_materializadas.get('cubo_consumo')
+        if cache is None or cache[0] is not df_eventos_antigo or cache[1] is not df_consumo_antigo:
+            self.invalidar_cache('cubo_consumo')
+            return
+        fatos_novos = fatos_consumo(self._eventos_cubo(eventos_novos), consumo_novo, contar_eventos)
+        self._tabelas_materializadas['cubo_consumo'] = (self.df_eventos, self.df_consumo, cache[2].somar(fatos_novos))
+
+    def _atualizar_risco_incremental(self, df_eventos_antigo: pd.DataFrame, df_novos: pd.DataFrame) -> None:
+        """Recalcula o agregado mensal e o risco apenas nas células (navio, mês) dos eventos novos."""
+        cache_agg = self._tabelas_materializadas.get('agregado_eventos_mensal')
+        if cache_agg is None or cache_agg[0] is not df_eventos_antigo:
+            self.invalidar_cache('agregado_eventos_mensal', 'risco_frota')
+            return
+
+        _, df_agg, ordem_navios = cache_agg
+        for nome in self._nomes_navio(df_novos['shipName']).unique():
+            ordem_navios.setdefault(nome, len(ordem_navios))
+
+        df_agg_novo = self._agregar_eventos_mensal(df_novos, ordem_navios)
+        chaves = ['OrdemNavio', 'shipName', 'Mes_Ano']
+        df_agg = (pd.concat([df_agg, df_agg_novo])
+                  .groupby(chaves, sort=True, as_index=False)
+                  [['SomaAbsLat', 'NumEventos', 'TotalHorasPorto']].sum())
+        self._tabelas_materializadas['agregado_eventos_mensal'] = (self.df_eventos, df_agg, ordem_navios)
+
+        cache_risco = self._tabelas_materializadas.get('risco_frota')
+        if cache_risco is None or cache_risco[0] is not df_eventos_antigo:
+            self.invalidar_cache('risco_frota')
+            return
+
+        _, df_conformidade, df_risco = cache_risco
+        celulas = df_agg_novo[['shipName', 'Mes_Ano']].drop_duplicates()
+        df_agg_tocado = df_agg.merge(celulas, on=['shipName', 'Mes_Ano'], how='inner')
+        df_risco_tocado = self._pontuar_risco(df_agg_tocado, df_conformidade)
+
+        tocadas = pd.MultiIndex.from_frame(df_risco_tocado[['shipName', 'Mês/Ano']])
+        mantidas = ~pd.MultiIndex.from_frame(df_risco[['shipName', 'Mês/Ano']]).isin(tocadas)
+        df_risco = pd.concat([df_risco[mantidas], df_risco_tocado], ignore_index=True)
+        ordem = np.lexsort((df_risco['Mês/Ano'].to_numpy(), df_risco['shipName'].map(ordem_navios).to_numpy()))
+        df_risco = df_risco.iloc[ordem].reset_index(drop=True)
+        self._tabelas_materializadas['risco_frota'] = (self.df_eventos, df_conformidade, df_risco)
 
     # --- MÉTODOS DO DASHBOARD (MÉTRICAS 1 a 4) ---
 
+    @medir_etapa
     def calcular_total_embarcacoes(self) -> int:
         if self.df_eventos.empty:
             return 0
         return self.df_eventos['shipName'].nunique()
 
+    @medir_etapa
     def calcular_embarcacoes_operando(self) -> int:
         if self.df_eventos.empty:
             return 0
         df_operando = self.df_eventos[self.df_eventos['eventName'] == 'NAVEGACAO']
         return df_operando['shipName'].nunique()
 
+    @medir_etapa
     def calcular_consumo_mensal_total(self) -> pd.DataFrame:
-        if self.df_consolidado.empty:
+        """Métrica 3: Consumo total por mês (materializado; novas linhas são somadas na ingestão)."""
+        cache = self._tabelas_materializadas.get('consumo_mensal')
+        if cache is not None and cache[0] is self.df_consolidado:
+            return cache[1]
+
+        consumo_mensal = self._somar_consumo_mensal(self.df_consolidado)
+        self._tabelas_materializadas['consumo_mensal'] = (self.df_consolidado, consumo_mensal)
+        return consumo_mensal
+
+    @medir_etapa
+    def cubo_consumo(self) -> CuboConsumo:
+        """
+        Cubo navio x mês x combustível (DESCRIPTION) x tipo de evento com consumo, sessões e horas em
+        porto/navegando (materializado; as sessões ingeridas são somadas às células existentes).
+        Consultas: `cubo_consumo().agregar(['navio', 'mes'], combustivel=..., inicio=...)`.
+        """
+        cache = self._tabelas_materializadas.get('cubo_consumo')
+        if cache is not None and cache[0] is self.df_eventos and cache[1] is self.df_consumo:
+            return cache[2]
+
+        cubo = CuboConsumo.construir(self._eventos_cubo(self.df_eventos), self.df_consumo)
+        self._tabelas_materializadas['cubo_consumo'] = (self.df_eventos, self.df_consumo, cubo)
+        return cubo
+
+    def _eventos_cubo(self, df: pd.DataFrame) -> pd.DataFrame:
+        colunas = ['sessionId', 'startGMTDate', 'eventName', 'duration']
+        if df.empty:
+            return pd.DataFrame(columns=colunas + ['shipName'])
+        return df[colunas].assign(shipName=self._nomes_navio(df['shipName']))
+
+    @staticmethod
+    def _somar_consumo_mensal(df_consolidado: pd.DataFrame) -> pd.DataFrame:
+        if df_consolidado.empty:
             return pd.DataFrame({'Mês/Ano': [], 'Consumo Total (unidade)': []})
 
-        df = self.df_consolidado.copy()
-        df['Mes_Ano'] = df['startGMTDate'].dt.to_period('M')
+        df = pd.DataFrame({
+            'Mes_Ano': df_consolidado['startGMTDate'].dt.to_period('M'),
+            'consumedQuantity': df_consolidado['consumedQuantity'].astype(np.float64, copy=False)
+        })
 
         consumo_mensal = df.groupby('Mes_Ano')['consumedQuantity'].sum().reset_index()
 
@@ -175,94 +771,164 @@ class TranspetroAnalytics:
 
         return consumo_mensal[['Mês/Ano', 'Consumo Total (unidade)']].sort_values(by='Mês/Ano').reset_index(drop=True)
 
-    def calcular_embarcacoes_navegando_por_dia(self) -> pd.DataFrame:
+    @medir_etapa
+    def calcular_intervalos_navegacao(self) -> pd.DataFrame:
+        """
+        Intervalos de NAVEGACAO (em dias) por navio, já mesclados quando se sobrepõem
+        ou são adjacentes. Base para as contagens diárias de embarcações navegando.
+        """
         if self.df_eventos.empty:
-            return pd.DataFrame({'Data': [], 'Embarcações Navegando': []})
-
-        df_nav = self.df_eventos[self.df_eventos['eventName'] == 'NAVEGACAO'].copy()
-        df_nav.dropna(subset=['startGMTDate', 'endGMTDate'], inplace=True)
+            return pd.DataFrame({'shipName': [], 'Inicio': [], 'Fim': []})
 
-        df_nav['start_date'] = df_nav['startGMTDate'].dt.normalize()
-        df_nav['end_date'] = df_nav['endGMTDate'].dt.normalize()
+        df_nav = self.df_eventos[self.df_eventos['eventName'] == 'NAVEGACAO']
+        df_nav = df_nav.dropna(subset=['shipName', 'startGMTDate', 'endGMTDate'])
 
-        date_ranges = []
-        for _, row in df_nav.iterrows():
-            dates = pd.date_range(start=row['start_date'], end=row['end_date'], freq='D')
-            date_ranges.extend([(row['shipName'], date) for date in dates])
-
-        df_daily_nav = pd.DataFrame(date_ranges, columns=['shipName', 'Data'])
-
-        if df_daily_nav.empty:
-            return pd.DataFrame({'Data': [], 'Embarcações Navegando': []})
-
-        df_resultado = df_daily_nav.groupby('Data')['shipName'].nunique().reset_index()
-        df_resultado.rename(columns={'shipName': 'Embarcações Navegando'}, inplace=True)
+        codigos, navios = pd.factorize(df_nav['shipName'])
+        chave, inicio, fim = mesclar_intervalos(
+            codigos.astype(np.int64),
+            datas_para_dias(df_nav['startGMTDate']),
+            datas_para_dias(df_nav['endGMTDate'])
+        )
 
-        return df_resultado[['Data', 'Embarcações Navegando']].sort_values(by='Data').reset_index(drop=True)
+        return pd.DataFrame({
+            'shipName': np.asarray(navios).take(chave),  # valores simples também no modo compacto (categorias)
+            'Inicio': dias_para_datas(inicio),
+            'Fim': dias_para_datas(fim)
+        })
 
-    # --- ANÁLISE DE CONFORMIDADE (MÉTRICA 5) ---
+    @medir_etapa
+    def calcular_embarcacoes_navegando_por_dia(self, agrupar_por: Optional[str] = None) -> pd.DataFrame:
+        """
+        Métrica 4: Número de embarcações distintas navegando em cada dia.
+        `agrupar_por` permite quebrar a contagem por navio ('shipName') ou por uma coluna
+        de atributo do navio (ex.: 'Classe'), procurada em df_eventos ou df_revestimento.
+        O resultado fica materializado até df_eventos ou df_revestimento serem substituídos.
+        """
+        chave = f'navegacao_diaria:{agrupar_por}'
+        cache = self._tabelas_materializadas.get(chave)
+        if cache is not None and cache[0] is self.df_eventos and cache[1] is self.df_revestimento:
+            return cache[2]
 
-    def calcular_conformidade_normam_401(self) -> pd.DataFrame:
-        if self.df_revestimento.empty or self.df_eventos.empty:
-            return pd.DataFrame({'Mês/Ano': [], 'shipName': [], 'Conformidade (%)': []})
+        df_resultado = self._contar_navegacao_diaria(agrupar_por)
+        self._tabelas_materializadas[chave] = (self.df_eventos, self.df_revestimento, df_resultado)
+        return df_resultado
 
-        df_r = self.df_revestimento.copy()
+    def _contar_navegacao_diaria(self, agrupar_por: Optional[str]) -> pd.DataFrame:
+        colunas = ['Data', 'Embarcações Navegando'] if agrupar_por is None else ['Data', agrupar_por, 'Embarcações Navegando']
+        df_intervalos = self.calcular_intervalos_navegacao()
 
-        min_date = df_r['DataAplicacao'].min().to_period('M')
-        max_date = pd.to_datetime('today').to_period('M')
-        meses = pd.period_range(start=min_date, end=max_date, freq='M')
-        navios_unicos = df_r['shipName'].unique()
+        if df_intervalos.empty:
+            return pd.DataFrame({col: [] for col in colunas})
 
-        resultados = []
+        if agrupar_por is None:
+            grupos = pd.Series(0, index=df_intervalos.index)
+        else:
+            grupos = self._atributo_por_navio(df_intervalos['shipName'], agrupar_por).fillna('N/D')
+
+        codigos, valores = pd.factorize(grupos)
+        idx_grupo, dias, contagem = contar_por_dia(
+            codigos.astype(np.int64),
+            datas_para_dias(df_intervalos['Inicio']),
+            datas_para_dias(df_intervalos['Fim']),
+            len(valores)
+        )
 
-        for ship in navios_unicos:
-            df_ship = df_r[df_r['shipName'] == ship].sort_values('DataAplicacao')
-            last_app_date = pd.NaT
-            T_base_current = 0
-            T_max_current = 0
+        df_resultado = pd.DataFrame({'Data': dias_para_datas(dias), 'Embarcações Navegando': contagem})
+        if agrupar_por is not None:
+            df_resultado[agrupar_por] = valores.take(idx_grupo)
 
-            for mes in meses:
-                data_fim_mes = mes.to_timestamp(how='end')
+        return df_resultado[colunas]
 
-                aplicacao_recente = df_ship[df_ship['DataAplicacao'] <= data_fim_mes]
+    @staticmethod
+    def _nomes_navio(serie: pd.Series) -> pd.Series:
+        """Equivale a `serie.astype(str).str.strip()`; em colunas categóricas limpa só o dicionário."""
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            dicionario = np.append(serie.cat.categories.astype(str).str.strip().to_numpy(dtype=object), 'nan')
+            return pd.Series(dicionario[serie.cat.codes.to_numpy()], index=serie.index, name=serie.name)
+        return serie.astype(str).str.strip()
 
-                if not aplicacao_recente.empty:
-                    ultima_app = aplicacao_recente.iloc[-1]
+    def _atributo_por_navio(self, navios: pd.Series, coluna: str) -> pd.Series:
+        """Valor de `coluna` para cada navio (primeira ocorrência em df_eventos ou df_revestimento)."""
+        if coluna == 'shipName':
+            return navios
 
-                    if ultima_app['DataAplicacao'] > last_app_date or pd.isna(last_app_date):
-                        last_app_date = ultima_app['DataAplicacao']
-                        T_base_current = ultima_app['T_base']
-                        T_max_current = ultima_app['T_max']
+        for df in (self.df_eventos, self.df_revestimento):
+            if coluna in df.columns:
+                mapa = (df.assign(_navio=self._nomes_navio(df['shipName']))
+                        .dropna(subset=[coluna])
+                        .drop_duplicates(subset=['_navio'])
+                        .set_index('_navio')[coluna])
+                return self._nomes_navio(navios).map(mapa)
 
-                if pd.isna(last_app_date) or T_base_current == 0 or T_max_current == 0:
-                    conformidade = 0.0
-                else:
-                    T_passado_dias = (data_fim_mes - last_app_date).days
-                    T_passado_meses = T_passado_dias / 30.437
+        raise ValueError(f"Coluna de agrupamento desconhecida: {coluna}")
 
-                    consumo_base = T_passado_meses / T_base_current
-                    consumo_max = T_passado_meses / T_max_current
+    # --- ANÁLISE DE CONFORMIDADE (MÉTRICA 5) ---
 
-                    conformidade = 1.0 - max(consumo_base, consumo_max)
-                    conformidade = max(0.0, conformidade) * 100.0
+    @medir_etapa
+    def calcular_conformidade_normam_401(self) -> pd.DataFrame:
+        """
+        Métrica 5: Conformidade NORMAM 401 por navio e mês.
+        Monta a grade navio x mês uma única vez e localiza a última aplicação de
+        revestimento de cada célula com um as-of join (merge_asof).
+        """
+        if self.df_revestimento.empty or self.df_eventos.empty:
+            return pd.DataFrame({'Mês/Ano': [], 'shipName': [], 'Conformidade (%)': []})
 
-                resultados.append({
-                    'Mês/Ano': str(mes),
-                    'shipName': ship,
-                    'Conformidade (%)': round(conformidade, 2)
-                })
+        df_r = self.df_revestimento[['shipName', 'DataAplicacao', 'T_base', 'T_max']].sort_values(
+            'DataAplicacao', kind='mergesort')
 
-        return pd.DataFrame(resultados)
+        min_date = df_r['DataAplicacao'].min().to_period('M')
+        max_date = pd.to_datetime('today').to_period('M')
+        meses = pd.period_range(start=min_date, end=max_date, freq='M')
+        navios_unicos = self.df_revestimento['shipName'].unique()
+
+        n_meses, n_navios = len(meses), len(navios_unicos)
+        df_grade = pd.DataFrame({
+            'Mês/Ano': np.tile(meses.astype(str).to_numpy(), n_navios),
+            'shipName': np.repeat(navios_unicos, n_meses),
+            'FimMes': np.tile(meses.to_timestamp(how='end').to_numpy(), n_navios),
+        })
+
+        # merge_asof exige a chave ordenada; as células da grade já estão em ordem de saída
+        # (navio, mês), então a ordem original é restaurada pelo índice.
+        df_grade['_ordem'] = np.arange(len(df_grade))
+        df = pd.merge_asof(
+            df_grade.sort_values('FimMes', kind='mergesort'),
+            df_r,
+            left_on='FimMes',
+            right_on='DataAplicacao',
+            by='shipName',
+            direction='backward'
+        ).sort_values('_ordem').reset_index(drop=True)
+
+        t_base = df['T_base'].to_numpy(dtype=float)
+        t_max = df['T_max'].to_numpy(dtype=float)
+        sem_aplicacao = df['DataAplicacao'].isna().to_numpy() | (t_base == 0) | (t_max == 0)
+
+        T_passado_meses = (df['FimMes'] - df['DataAplicacao']).dt.days.to_numpy(dtype=float) / 30.437
+        with np.errstate(divide='ignore', invalid='ignore'):
+            consumo = np.maximum(T_passado_meses / t_base, T_passado_meses / t_max)
+        conformidade = np.clip(1.0 - consumo, 0.0, None) * 100.0
+        conformidade = np.where(sem_aplicacao, 0.0, conformidade)
+
+        df['Conformidade (%)'] = np.round(conformidade, 2)
+        return df[['Mês/Ano', 'shipName', 'Conformidade (%)']]
 
     # --- INTEGRAÇÃO API (MÉTRICA 6) ---
 
-    def obter_dados_climaticos_navio(self, ship_name: str,
-                                     api_url: str = "https://archive-api.open-meteo.com/v1/era5") -> pd.DataFrame:
-        """Métrica 6: Busca dados climáticos históricos (ERA5) em chunks de 1 ano."""
+    @medir_etapa
+    def obter_dados_climaticos_navio(self, ship_name: str, api_url: Optional[str] = None,
+                                     progresso: Optional[Callable[[int, int], None]] = None) -> pd.DataFrame:
+        """
+        Métrica 6: Busca dados climáticos históricos (ERA5) em chunks de 1 ano, baixados em paralelo.
+        `progresso(feitos, total)` acompanha os chunks concluídos (usado pelas tarefas assíncronas).
+        """
         if self.df_eventos.empty:
             return pd.DataFrame()
 
-        df_navio = self.df_eventos[self.df_eventos['shipName'].astype(str).str.strip() == ship_name.strip()].copy()
+        # Fatia do índice (navio, início) em vez de comparar shipName em todas as linhas
+        posicoes = np.sort(self._indice_eventos().consultar(ship_name.strip()))
+        df_navio = self.df_eventos.iloc[posicoes]
 
         if df_navio.empty:
             return pd.DataFrame()
@@ -274,139 +940,423 @@ class TranspetroAnalytics:
         latitude = coords.iloc[0]['decLatitude']
         longitude = coords.iloc[0]['decLongitude']
 
-        API_START_LIMIT = datetime(2022, 1, 1).date()
-        API_MAX_CHUNK_DAYS = 365
-
         start_date_eventos = df_navio['startGMTDate'].min().date()
         end_date_eventos = df_navio['endGMTDate'].max().date()
 
-        current_start = max(start_date_eventos, API_START_LIMIT)
-        target_end = end_date_eventos
+        return self._cliente_clima(api_url or self._clima_api_url).buscar(
+            latitude, longitude, start_date_eventos, end_date_eventos, progresso=progresso)
 
-        if current_start > target_end:
+    @medir_etapa
+    def obter_clima_frota(self, navios: Optional[List[str]] = None, api_url: Optional[str] = None,
+                          progresso: Optional[Callable[[int, int], None]] = None) -> pd.DataFrame:
+        """
+        Clima horário ao longo da rota de cada navio (ou de `navios`): cada hora recebe o clima da
+        célula ERA5 (0,25°) da última posição conhecida do navio naquela hora. As posições de toda a
+        frota são agrupadas em pares (célula, dia), cada par é baixado uma única vez (várias células
+        por requisição) e o resultado é cruzado de volta com os trechos de cada navio.
+        Colunas: shipName, DataHoraGMT, latitude, longitude (centro da célula) e as variáveis.
+        """
+        if self.df_eventos.empty:
             return pd.DataFrame()
 
-        all_clima_data = []
-
-        while current_start <= target_end:
-            chunk_end = min(current_start + timedelta(days=API_MAX_CHUNK_DAYS - 1), target_end)
-
-            start_date_chunk = current_start.strftime('%Y-%m-%d')
-            end_date_chunk = chunk_end.strftime('%Y-%m-%d')
-
-            params = {
-                'latitude': latitude,
-                'longitude': longitude,
-                'hourly': 'temperature_2m,apparent_temperature',
-                'timezone': 'America/Sao_Paulo',
-                'start_date': start_date_chunk,
-                'end_date': end_date_chunk
-            }
+        colunas = ['startGMTDate', 'endGMTDate', 'decLatitude', 'decLongitude']
+        if navios is None:
+            eventos = self.df_eventos[colunas].assign(shipName=self._nomes_navio(self.df_eventos['shipName']))
+        else:
+            indice = self._indice_eventos()
+            posicoes = np.sort(np.concatenate([indice.consultar(n.strip()) for n in navios] or [[]]).astype(np.int64))
+            eventos = self.df_eventos.iloc[posicoes][colunas].assign(
+                shipName=self._nomes_navio(self.df_eventos['shipName'].iloc[posicoes]))
 
-            full_url = f"{api_url}?{urlencode(params)}"
+        trechos = rotas_em_celulas(eventos)
+        if trechos.empty:
+            return pd.DataFrame()
+        cliente = self._cliente_clima(api_url or self._clima_api_url)
+        df_grade = cliente.buscar_grade(dias_por_celula(trechos), progresso=progresso)
+        return clima_nas_rotas(trechos, df_grade, self._variaveis_clima())
 
-            try:
-                response = requests.get(full_url, timeout=30)
-                response.raise_for_status()
-                data = response.json()
+    # --- CONSULTAS INDEXADAS (NAVIO x PERÍODO) ---
 
-                if 'hourly' in data:
-                    df_clima_chunk = pd.DataFrame(data['hourly'])
-                    all_clima_data.append(df_clima_chunk)
+    def _indice_eventos(self) -> IndiceNavioMes:
+        """Índice de df_eventos por (navio normalizado, startGMTDate); refeito quando df_eventos é substituído."""
+        cache = self._tabelas_materializadas.get('indice_eventos')
+        if cache is not None and cache[0] is self.df_eventos:
+            return cache[1]
 
-            except requests.exceptions.RequestException:
-                pass
+        if self.df_eventos.empty:
+            indice = IndiceNavioMes(np.array([], dtype=object), np.array([], dtype=np.int64))
+        else:
+            indice = IndiceNavioMes(self._nomes_navio(self.df_eventos['shipName']).to_numpy(),
+                                    self._tempos_ordenaveis(self.df_eventos['startGMTDate']))
+        self._tabelas_materializadas['indice_eventos'] = (self.df_eventos, indice)
+        return indice
 
-            current_start = chunk_end + timedelta(days=1)
+    def consultar_tabela(self, nome: str, df: pd.DataFrame, coluna_tempo: str, navio: Optional[str] = None,
+                         inicio: Optional[str] = None, fim: Optional[str] = None) -> pd.DataFrame:
+        """
+        Filtra uma tabela derivada (ex.: conformidade, risco) por navio e período usando um
+        IndiceNavioMes montado uma vez por tabela. Colunas de texto 'AAAA-MM' são comparadas
+        pelo mês dos limites; colunas de data, pela data informada (limites inclusivos).
+        Cada variante da tabela (ex.: navegacao_diaria por agrupar_por, que muda as colunas)
+        tem o seu índice, e consultas alternadas entre variantes não o remontam.
+        As linhas saem na ordem da própria tabela, como na resposta sem filtros.
+        """
+        if df.empty:
+            return df
 
-        if not all_clima_data:
-            return pd.DataFrame()
+        chave = f"indice_tabela:{nome}:{','.join(map(str, df.columns))}"
+        cache = self._tabelas_materializadas.get(chave)
+        if cache is not None and cache[0] is df:
+            indice = cache[1]
+        else:
+            navios = self._nomes_navio(df['shipName']).to_numpy() if 'shipName' in df.columns \
+                else np.zeros(len(df), dtype=np.int64)
+            indice = IndiceNavioMes(navios, self._tempos_ordenaveis(df[coluna_tempo]))
+            self._tabelas_materializadas[chave] = (df, indice)
 
-        df_final = pd.concat(all_clima_data, ignore_index=True)
-        df_final.rename(columns={'time': 'DataHoraGMT'}, inplace=True)
-        df_final['DataHoraGMT'] = pd.to_datetime(df_final['DataHoraGMT'])
+        if navio is not None and 'shipName' not in df.columns:
+            raise ValueError(f"A tabela '{nome}' não é separada por navio.")
 
-        return df_final
+        if pd.api.types.is_datetime64_any_dtype(df[coluna_tempo]):
+            inicio = pd.Timestamp(inicio).value if inicio is not None else None
+            fim = pd.Timestamp(fim).value if fim is not None else None
+        else:
+            inicio = str(inicio)[:7] if inicio is not None else None
+            fim = str(fim)[:7] if fim is not None else None
+
+        posicoes = indice.consultar(navio.strip() if navio is not None else None, inicio, fim)
+        return df.iloc[np.sort(posicoes)]
+
+    @staticmethod
+    def _tempos_ordenaveis(serie: pd.Series) -> np.ndarray:
+        """Datas viram int64 (NaT vai para o fim); textos 'AAAA-MM' são comparados lexicograficamente."""
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            valores = serie.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+            return np.where(serie.isna().to_numpy(), np.iinfo(np.int64).max, valores)
+        return serie.astype(str).to_numpy(dtype=str)
+
+    def _cliente_clima(self, api_url: str) -> ClienteClimaERA5:
+        """Um cliente (sessão HTTP + pool de threads) por URL, reaproveitado entre chamadas."""
+        with self._lock_clima:
+            if api_url not in self._clientes_clima:
+                self._clientes_clima[api_url] = ClienteClimaERA5(api_url, cache_dir=self._clima_cache_dir)
+            return self._clientes_clima[api_url]
 
     # --- PREDIÇÃO/RISCO (MÉTRICA 8) ---
 
+    @medir_etapa
     def calcular_risco_bioincrustacao_frota(self, df_conformidade: pd.DataFrame) -> pd.DataFrame:
         """
         Métrica 8: Calcula o risco de bioincrustação (escala 1 a 5) por mês,
         para TODA A FROTA, baseado em regras simples de Latitude, Exposição e Conformidade.
+        O resultado fica materializado e só é recalculado quando df_eventos ou a tabela
+        de conformidade recebida forem substituídos (ou após `invalidar_cache`).
         """
-        if self.df_eventos.empty:
-            return pd.DataFrame()
-
-        navios_unicos = self.df_eventos['shipName'].astype(str).str.strip().unique()
-        resultados_frota = []
+        cache = self._tabelas_materializadas.get('risco_frota')
+        if cache is not None and cache[0] is self.df_eventos and cache[1] is df_conformidade:
+            return cache[2]
+
+        df_risco = self._pontuar_risco(self._agregado_eventos_mensal(), df_conformidade)
+        self._tabelas_materializadas['risco_frota'] = (self.df_eventos, df_conformidade, df_risco)
+        return df_risco
+
+    def invalidar_cache(self, *nomes: str) -> None:
+        """Descarta tabelas materializadas (todas, se nenhum nome for informado)."""
+        if not nomes:
+            self._tabelas_materializadas.clear()
+        for nome in nomes:
+            self._tabelas_materializadas.pop(nome, None)
+
+    def _agregado_eventos_mensal(self) -> pd.DataFrame:
+        """Somas mensais por navio usadas pelo risco (materializadas; aditivas na ingestão)."""
+        cache = self._tabelas_materializadas.get('agregado_eventos_mensal')
+        if cache is not None and cache[0] is self.df_eventos:
+            return cache[1]
 
-        for ship_name in navios_unicos:
-            df_navio = self.df_eventos[self.df_eventos['shipName'].astype(str).str.strip() == ship_name].copy()
-            df_navio.dropna(subset=['startGMTDate', 'decLatitude', 'eventName'], inplace=True)
+        if self.df_eventos.empty:
+            ordem_navios = {}
+        else:
+            nomes = self._nomes_navio(self.df_eventos['shipName']).unique()
+            ordem_navios = {nome: i for i, nome in enumerate(nomes)}
+
+        df_agg = self._agregar_eventos_mensal(self.df_eventos, ordem_navios)
+        self._tabelas_materializadas['agregado_eventos_mensal'] = (self.df_eventos, df_agg, ordem_navios)
+        return df_agg
+
+    @staticmethod
+    def _agregar_eventos_mensal(df_eventos: pd.DataFrame, ordem_navios: Dict[str, int]) -> pd.DataFrame:
+        """Uma única passada agrupada por (navio, mês): soma de |latitude|, nº de eventos e horas em porto."""
+        colunas = ['OrdemNavio', 'shipName', 'Mes_Ano', 'SomaAbsLat', 'NumEventos', 'TotalHorasPorto']
+        if df_eventos.empty:
+            return pd.DataFrame({col: [] for col in colunas})
+
+        nomes = TranspetroAnalytics._nomes_navio(df_eventos['shipName'])
+        df = pd.DataFrame({
+            'OrdemNavio': nomes.map(ordem_navios),
+            'shipName': nomes,
+            'startGMTDate': df_eventos['startGMTDate'],
+            'decLatitude': df_eventos['decLatitude'].astype(np.float64, copy=False),
+            'eventName': df_eventos['eventName'],
+            'duration': df_eventos['duration'].astype(np.float64, copy=False),
+        }).dropna(subset=['startGMTDate', 'decLatitude', 'eventName'])
 
-            if df_navio.empty:
-                continue
+        if df.empty:
+            return pd.DataFrame({col: [] for col in colunas})
 
-            # 2. Engenharia de Features Mensais
-            df_navio['Mes_Ano'] = df_navio['startGMTDate'].dt.to_period('M')
-            df_navio['AbsLat'] = df_navio['decLatitude'].abs()
-
-            df_navio['horas_em_porto'] = df_navio.apply(
-                lambda row: row['duration'] if row['eventName'] == 'EM PORTO' else 0, axis=1
-            )
-
-            df_mensal = df_navio.groupby('Mes_Ano').agg(
-                MediaAbsLat=('AbsLat', 'mean'),
-                TotalHorasPorto=('horas_em_porto', 'sum')
-            ).reset_index()
-
-            df_mensal['shipName'] = ship_name
-            df_mensal['TotalDiasPorto'] = df_mensal['TotalHorasPorto'] / 24
-
-            # 3. Lógica de Risco Base (Latitude) - Max 2.5 pontos
-            df_mensal['R_base'] = 0.0
-            df_mensal.loc[df_mensal['MediaAbsLat'] < 20, 'R_base'] = 2.5
-            df_mensal.loc[df_mensal['MediaAbsLat'] >= 20, 'R_base'] = 1.0
-
-            # Risco de Exposição (Tempo Parado) - Max 1.5 pontos
-            df_mensal['R_exp'] = 0.0
-            df_mensal.loc[df_mensal['TotalDiasPorto'] > 10, 'R_exp'] = 1.5
-            df_mensal.loc[(df_mensal['TotalDiasPorto'] > 3) & (df_mensal['TotalDiasPorto'] <= 10), 'R_exp'] = 0.5
-
-            # 4. Integração do Risco de Revestimento (Conformidade NORMAM 401) - Max 1.0 ponto
-            df_conform_ship = df_conformidade[df_conformidade['shipName'].astype(str).str.strip() == ship_name].copy()
-
-            if not df_conform_ship.empty:
-                df_conform_ship['Mes_Ano'] = df_conform_ship['Mês/Ano'].astype(str).str.strip().str.replace('-', '',
-                                                                                                            regex=False).str.replace(
-                    'P', '', regex=False).apply(lambda x: pd.Period(x, freq='M'))
-                df_mensal = pd.merge(df_mensal, df_conform_ship[['Mes_Ano', 'Conformidade (%)']], on='Mes_Ano',
-                                     how='left')
-            else:
-                df_mensal['Conformidade (%)'] = 100.0
+        # 2. Engenharia de Features Mensais
+        df['Mes_Ano'] = df['startGMTDate'].dt.to_period('M')
+        df['AbsLat'] = df['decLatitude'].abs()
+        df['horas_em_porto'] = df['duration'].where(df['eventName'] == 'EM PORTO', 0)
+
+        return df.groupby(['OrdemNavio', 'shipName', 'Mes_Ano'], sort=True).agg(
+            SomaAbsLat=('AbsLat', 'sum'),
+            NumEventos=('AbsLat', 'size'),
+            TotalHorasPorto=('horas_em_porto', 'sum')
+        ).reset_index()[colunas]
+
+    def _conformidade_por_periodo(self, df_conformidade: pd.DataFrame) -> pd.DataFrame:
+        """Tabela de conformidade com chaves (navio normalizado, Period mensal), preparada uma vez por tabela."""
+        cache = self._tabelas_materializadas.get('conformidade_por_periodo')
+        if cache is not None and cache[0] is df_conformidade:
+            return cache[1]
+
+        mes_ano = df_conformidade['Mês/Ano'].astype(str).str.strip().str.replace('-', '', regex=False).str.replace(
+            'P', '', regex=False)
+        df_conform = pd.DataFrame({
+            'shipName': df_conformidade['shipName'].astype(str).str.strip(),
+            'Mes_Ano': pd.to_datetime(mes_ano, format='%Y%m').dt.to_period('M'),
+            'Conformidade (%)': df_conformidade['Conformidade (%)'],
+        })
+        self._tabelas_materializadas['conformidade_por_periodo'] = (df_conformidade, df_conform)
+        return df_conform
+
+    def _pontuar_risco(self, df_agg: pd.DataFrame, df_conformidade: pd.DataFrame) -> pd.DataFrame:
+        """Aplica as regras de risco às células (navio, mês) agregadas, com um único merge de conformidade."""
+        colunas = ['shipName', 'Mês/Ano', 'Risco Total (1-5)']
+        if df_agg.empty:
+            return pd.DataFrame({col: [] for col in colunas})
+
+        df_mensal = df_agg[['shipName', 'Mes_Ano']].copy()
+        df_mensal['MediaAbsLat'] = df_agg['SomaAbsLat'] / df_agg['NumEventos']
+        df_mensal['TotalDiasPorto'] = df_agg['TotalHorasPorto'] / 24
+
+        # 3. Lógica de Risco Base (Latitude) - Max 2.5 pontos
+        df_mensal['R_base'] = 0.0
+        df_mensal.loc[df_mensal['MediaAbsLat'] < 20, 'R_base'] = 2.5
+        df_mensal.loc[df_mensal['MediaAbsLat'] >= 20, 'R_base'] = 1.0
+
+        # Risco de Exposição (Tempo Parado) - Max 1.5 pontos
+        df_mensal['R_exp'] = 0.0
+        df_mensal.loc[df_mensal['TotalDiasPorto'] > 10, 'R_exp'] = 1.5
+        df_mensal.loc[(df_mensal['TotalDiasPorto'] > 3) & (df_mensal['TotalDiasPorto'] <= 10), 'R_exp'] = 0.5
+
+        # 4. Integração do Risco de Revestimento (Conformidade NORMAM 401) - Max 1.0 ponto
+        if not df_conformidade.empty:
+            df_mensal = pd.merge(df_mensal, self._conformidade_por_periodo(df_conformidade),
+                                 on=['shipName', 'Mes_Ano'], how='left')
+        else:
+            df_mensal['Conformidade (%)'] = 100.0
 
-            df_mensal['Conformidade (%)'].fillna(100.0, inplace=True)
+        df_mensal['Conformidade (%)'] = df_mensal['Conformidade (%)'].fillna(100.0)
 
-            df_mensal['R_coat'] = 0.0
-            df_mensal.loc[df_mensal['Conformidade (%)'] < 25, 'R_coat'] = 1.0
-            df_mensal.loc[(df_mensal['Conformidade (%)'] >= 25) & (df_mensal['Conformidade (%)'] < 75), 'R_coat'] = 0.5
+        df_mensal['R_coat'] = 0.0
+        df_mensal.loc[df_mensal['Conformidade (%)'] < 25, 'R_coat'] = 1.0
+        df_mensal.loc[(df_mensal['Conformidade (%)'] >= 25) & (df_mensal['Conformidade (%)'] < 75), 'R_coat'] = 0.5
 
-            # 5. Cálculo do Risco Final
-            df_mensal['Risco Total'] = df_mensal['R_base'] + df_mensal['R_exp'] + df_mensal['R_coat']
-            df_mensal['Risco Total (1-5)'] = df_mensal['Risco Total'].clip(lower=1.0, upper=5.0).round().astype(int)
-            df_mensal['Mês/Ano'] = df_mensal['Mes_Ano'].astype(str)
+        # 5. Cálculo do Risco Final
+        df_mensal['Risco Total'] = df_mensal['R_base'] + df_mensal['R_exp'] + df_mensal['R_coat']
+        df_mensal['Risco Total (1-5)'] = df_mensal['Risco Total'].clip(lower=1.0, upper=5.0).round().astype(int)
+        df_mensal['Mês/Ano'] = df_mensal['Mes_Ano'].astype(str)
 
-            resultados_frota.append(df_mensal[['shipName', 'Mês/Ano', 'Risco Total (1-5)']])
+        return df_mensal[colunas]
 
-        if not resultados_frota:
-            return pd.DataFrame({'shipName': [], 'Mês/Ano': [], 'Risco Total (1-5)': []})
+    # --- DATASET DE TREINAMENTO (MÉTRICA 7) ---
 
-        return pd.concat(resultados_frota, ignore_index=True)
+    @medir_etapa
+    def predizer_risco_bioincrustacao(self, df_clima: pd.DataFrame, lookback_days: int = 30,
+                                      ship_name: Optional[str] = None) -> pd.DataFrame:
+        """
+        Métrica 7: Dataset de treinamento de um navio, uma linha por navio-dia (ver treinamento.features_navio).
+        `df_clima` é a série horária do navio (obter_dados_climaticos_navio); vazio deixa as features
+        climáticas nulas. Sem `ship_name`, usa o shipName de `df_clima`; sem nenhum dos dois, vazio.
+        Para a frota inteira, gravada em disco, use construir_dataset_treinamento.
+        """
+        if ship_name is None and df_clima is not None and 'shipName' in df_clima.columns and not df_clima.empty:
+            ship_name = str(df_clima['shipName'].iloc[0])
+        if ship_name is None or self.df_eventos.empty:
+            return pd.DataFrame()
+        entrada = self._entrada_treinamento(ship_name.strip(), self._fatias_por_navio(), df_clima)
+        return features_navio(*entrada, lookback_days=lookback_days, variaveis_clima=self._variaveis_clima())
 
-    def predizer_risco_bioincrustacao(self, df_clima: pd.DataFrame, lookback_days: int = 30) -> pd.DataFrame:
+    @medir_etapa
+    def construir_dataset_treinamento(self, destino: str, lookback_days: int = 30,
+                                      navios: Optional[List[str]] = None, com_clima: bool = True,
+                                      processos: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Grava o dataset de treinamento navio-dia da frota (ou de `navios`) em `destino`, em Parquet
+        particionado por navio (shipName=<navio>/; requer pyarrow). As features de cada navio são
+        calculadas num pool de processos; com `com_clima`, o clima vem de `obter_clima_frota` (a
+        célula ERA5 de cada trecho da rota, baixada uma vez para a frota toda). Devolve o resumo
+        gravado em _metadados.json.
+        """
+        if self.df_eventos.empty:
+            raise ValueError("Sem eventos carregados para montar o dataset de treinamento.")
+        if navios is None:
+            navios = list(self._nomes_navio(self.df_eventos['shipName']).unique())
+        fatias = self._fatias_por_navio()
+        clima_por_navio = {}
+        if com_clima:
+            df_clima = self.obter_clima_frota(navios)
+            if not df_clima.empty:
+                clima_por_navio = {navio: df for navio, df in df_clima.groupby('shipName', sort=False, observed=True)}
+
+        def entradas():
+            for navio in navios:
+                yield self._entrada_treinamento(navio.strip(), fatias, clima_por_navio.get(navio.strip()))
+
+        return gerar_dataset(entradas(), destino, lookback_days, self._variaveis_clima(), processos)
+
+    def _fatias_por_navio(self) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+        """Revestimento e IWS separados por navio normalizado (tabelas pequenas: um groupby por chamada)."""
+        fatias = []
+        for df in (self.df_revestimento, self.df_iws):
+            fatias.append({} if df.empty else
+                          {navio: grupo for navio, grupo in df.groupby(self._nomes_navio(df['shipName']), sort=False)})
+        return tuple(fatias)
+
+    def _entrada_treinamento(self, navio: str, fatias: Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]],
+                             df_clima: Optional[pd.DataFrame]) -> EntradaNavio:
+        posicoes = np.sort(self._indice_eventos().consultar(navio))
+        eventos = self.df_eventos.iloc[posicoes][['startGMTDate', 'endGMTDate', 'eventName', 'duration',
+                                                  'decLatitude']]
+        por_revestimento, por_iws = fatias
+        revestimento = por_revestimento.get(navio, pd.DataFrame(columns=['DataAplicacao', 'T_base', 'T_max']))
+        iws = por_iws.get(navio, pd.DataFrame(columns=['DataRelatorio', 'RiscoBioincrustacao']))
+        return navio, eventos, revestimento, iws, df_clima
+
+    @staticmethod
+    def _variaveis_clima() -> List[str]:
+        return ClienteClimaERA5.VARIAVEIS_PADRAO.split(',')
+
+    # --- PONTO DE LIMPEZA IDEAL (PLI) ---
+
+    @medir_etapa
+    def calcular_ponto_limpeza_ideal(self, df_conformidade: pd.DataFrame, navios: Optional[List[str]] = None,
+                                     precos_combustivel: Sequence[float] = PRECOS_COMBUSTIVEL_PADRAO,
+                                     custos_limpeza: Sequence[float] = CUSTOS_LIMPEZA_PADRAO,
+                                     horizonte_dias: int = HORIZONTE_PADRAO_DIAS,
+                                     taxa_desconto: float = TAXA_DESCONTO_ANUAL,
+                                     processos: Optional[int] = None) -> Dict[str, Any]:
         """
-        Métrica 7: Estrutura o Dataset de Treinamento (Mantida vazia, pois não é utilizada na Métrica 8).
+        Simulação "e se" da limpeza do casco: para cada navio (ou `navios`), avalia limpar em cada
+        dia dos próximos `horizonte_dias` em todos os cenários preço do combustível x custo da
+        limpeza (ver pli.avaliar_navio), com os navios divididos num pool de processos.
+        O perfil de cada navio vem do consumo diário recente (df_consolidado), do risco mensal
+        médio por mês do ano e da conformidade/última aplicação de revestimento.
+        Devolve 'inicio' (primeiro dia simulado), 'cenarios' (melhor data e economia líquida em valor
+        presente, descontada a `taxa_desconto` ao ano, por navio e cenário; Data Ideal nula quando
+        nenhuma limpeza se paga) e 'curvas' (combustível economizado por data de limpeza, a curva de
+        economia de cada navio).
         """
-        # Apenas um placeholder, pois a Métrica 8 (Regra Simples) foi a escolhida para a API.
-        return pd.DataFrame()
\ No newline at end of file
+        inicio, perfis = self._perfis_limpeza(df_conformidade)
+        if navios is not None:
+            escolhidos = {n.strip() for n in navios}
+            perfis = [perfil for perfil in perfis if perfil[0] in escolhidos]
+        precos = np.asarray(precos_combustivel, dtype=np.float64)
+        custos = np.asarray(custos_limpeza, dtype=np.float64)
+        resultados = (avaliar_frota(perfis, inicio, horizonte_dias, precos, custos, taxa_desconto, processos)
+                      if perfis else [])
+
+        nomes = np.asarray([perfil[0] for perfil in perfis], dtype=object)
+        n_navios, n_cenarios = len(perfis), len(precos) * len(custos)
+
+        def empilhar(campo: str) -> np.ndarray:  # (navio, preço, custo)
+            return np.stack([r[campo] for r in resultados]) if resultados else np.zeros((0, len(precos), len(custos)))
+
+        melhor_dia = empilhar('melhor_dia').reshape(-1)
+        datas_ideais = inicio + np.maximum(melhor_dia, 0).astype('timedelta64[D]')
+        cenarios = pd.DataFrame({
+            'shipName': np.repeat(nomes, n_cenarios),
+            'Preço Combustível': np.tile(np.repeat(precos, len(custos)), n_navios),
+            'Custo Limpeza': np.tile(np.tile(custos, len(precos)), n_navios),
+            'Data Ideal': pd.to_datetime(np.where(melhor_dia >= 0, datas_ideais, np.datetime64('NaT'))),
+            'Combustível Economizado (unidade)': np.round(empilhar('combustivel_melhor').reshape(-1), 3),
+            'Economia Líquida': np.round(empilhar('economia_melhor').reshape(-1), 2),
+        })
+        curvas = pd.DataFrame({
+            'shipName': np.repeat(nomes, horizonte_dias),
+            'Data': np.tile(inicio + np.arange(horizonte_dias).astype('timedelta64[D]'), n_navios),
+            'Combustível Economizado (unidade)': np.round(
+                np.concatenate([r['combustivel_economizado'] for r in resultados] or [np.zeros(0)]), 3),
+        })
+        return {'inicio': pd.Timestamp(inicio), 'cenarios': cenarios, 'curvas': curvas}
+
+    def _perfis_limpeza(self, df_conformidade: pd.DataFrame) -> Tuple[np.datetime64, List[PerfilNavio]]:
+        """
+        Perfis (pli.PerfilNavio) dos navios com consumo, materializados até df_consolidado,
+        df_eventos, df_revestimento ou a conformidade serem substituídos. A simulação começa no
+        dia seguinte ao último evento da frota.
+        """
+        cache = self._tabelas_materializadas.get('perfis_limpeza')
+        if (cache is not None and cache[0] is self.df_consolidado and cache[1] is self.df_eventos
+                and cache[2] is self.df_revestimento and cache[3] is df_conformidade):
+            return cache[4]
+
+        if self.df_consolidado.empty or self.df_eventos.empty:
+            resultado = (np.datetime64(pd.Timestamp('today').date(), 'D'), [])
+        else:
+            resultado = self._montar_perfis_limpeza(df_conformidade)
+        self._tabelas_materializadas['perfis_limpeza'] = (self.df_consolidado, self.df_eventos,
+                                                          self.df_revestimento, df_conformidade, resultado)
+        return resultado
+
+    def _montar_perfis_limpeza(self, df_conformidade: pd.DataFrame) -> Tuple[np.datetime64, List[PerfilNavio]]:
+        inicio = self.df_eventos['startGMTDate'].max().to_datetime64().astype('datetime64[D]') + np.timedelta64(1, 'D')
+        mes_inicio = str(inicio.astype('datetime64[M]'))
+
+        # Consumo observado por dia nos últimos 365 dias de dados de cada navio
+        df_c = pd.DataFrame({'navio': self._nomes_navio(self.df_consolidado['shipName']).to_numpy(),
+                             'data': self.df_consolidado['startGMTDate'].to_numpy(dtype='datetime64[ns]'),
+                             'consumo': self.df_consolidado['consumedQuantity'].to_numpy(dtype=np.float64)})
+        df_c = df_c[df_c['data'] > df_c.groupby('navio', sort=False)['data'].transform('max') - pd.Timedelta(days=365)]
+        por_navio = df_c.groupby('navio', sort=True).agg(consumo=('consumo', 'sum'), de=('data', 'min'),
+                                                         ate=('data', 'max'))
+        dias_observados = ((por_navio['ate'] - por_navio['de']).dt.days + 1).to_numpy(dtype=np.float64)
+        consumo_observado = por_navio['consumo'].to_numpy() / dias_observados
+
+        # Risco médio de cada navio por mês do ano (1 a 12)
+        df_risco = self.calcular_risco_bioincrustacao_frota(df_conformidade)
+        risco_mes = pd.DataFrame(np.nan, index=por_navio.index, columns=range(1, 13))
+        if not df_risco.empty:
+            risco = (df_risco.assign(navio=self._nomes_navio(df_risco['shipName']),
+                                     mes=df_risco['Mês/Ano'].str[5:7].astype(int))
+                     .groupby(['navio', 'mes'])['Risco Total (1-5)'].mean().unstack())
+            risco_mes.update(risco)
+        risco_medio = risco_mes.mean(axis=1).fillna(RISCO_PADRAO)
+        risco_mes = risco_mes.apply(lambda coluna: coluna.fillna(risco_medio)).to_numpy(dtype=np.float64)
+
+        # Conformidade no mês de início (ou a última anterior): revestimento gasto incrusta até 2x mais rápido
+        conformidade = pd.Series(np.nan, index=por_navio.index)
+        if not df_conformidade.empty:
+            ate_inicio = df_conformidade[df_conformidade['Mês/Ano'] <= mes_inicio]
+            ultima = (ate_inicio.assign(navio=self._nomes_navio(ate_inicio['shipName']))
+                      .sort_values('Mês/Ano', kind='mergesort').groupby('navio')['Conformidade (%)'].last())
+            conformidade.update(ultima)
+        multiplicador = 2.0 - conformidade.fillna(0.0).to_numpy() / 100.0
+
+        # Incrustação no início: dias desde a última aplicação de revestimento (sem registro, desde o
+        # primeiro evento do navio) à taxa do risco médio
+        referencia = (self.df_eventos.groupby(self._nomes_navio(self.df_eventos['shipName']))['startGMTDate'].min()
+                      .reindex(por_navio.index))
+        if not self.df_revestimento.empty:
+            df_r = self.df_revestimento[self.df_revestimento['DataAplicacao'] < pd.Timestamp(inicio)]
+            aplicacao = df_r.groupby(self._nomes_navio(df_r['shipName']))['DataAplicacao'].max()
+            referencia = aplicacao.reindex(por_navio.index).fillna(referencia)
+        dias_sem_limpeza = (pd.Timestamp(inicio) - referencia).dt.days.fillna(0).clip(lower=0).to_numpy()
+        incrustacao_inicial = dias_sem_limpeza * taxa_incrustacao(risco_medio.to_numpy(), multiplicador)
+
+        # O consumo observado já inclui a penalidade da incrustação atual
+        consumo_limpo = consumo_observado / (1.0 + penalidade(incrustacao_inicial))
+        perfis = [(navio, float(consumo_limpo[i]), float(incrustacao_inicial[i]), risco_mes[i], float(multiplicador[i]))
+                  for i, navio in enumerate(por_navio.index)]
+        return inicio, perfis
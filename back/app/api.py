@@ -1,7 +1,29 @@
-﻿from flask import Flask, jsonify, request, abort
+﻿from flask import Flask, jsonify, request, abort, Response, g, has_request_context
 from analytics import TranspetroAnalytics  # Importa APENAS a classe
+from desempenho import MonitorDesempenho, resumo_perfil
+from compartilhado import DatasetCompartilhado
+from cubo import CuboConsumo
+from exportacao import FORMATOS as FORMATOS_EXPORTACAO, blocos as blocos_exportacao, comprimir_gzip
+from pli import CUSTOS_LIMPEZA_PADRAO, HORIZONTE_PADRAO_DIAS, PRECOS_COMBUSTIVEL_PADRAO, TAXA_DESCONTO_ANUAL
+from planilhas import arquivo_fonte
+from snapshot import SnapshotCache
+from tarefas import GerenciadorTarefas, Progresso
 import pandas as pd
-from typing import Optional
+import base64
+import binascii
+import cProfile
+import gzip
+import hashlib
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
 
 # ====================================================================
 # 1. VARIÁVEIS DE CONFIGURAÇÃO (Definidas aqui para evitar ImportError)
@@ -10,55 +32,631 @@ EVENTOS_FILE = 'ResultadoQueryEventos.csv'
 CONSUMO_FILE = 'ResultadoQueryConsumo.csv'
 REVESTIMENTO_FILE = 'Dados navios Hackathon.xlsx - Especificacao revestimento.csv'
 IWS_FILE = 'Relatorios IWS.xlsx - Planilha1.csv'
+SNAPSHOT_DIR = '.snapshots'  # Cache colunar dos dados já limpos (requer pyarrow)
+CLIMA_CACHE_DIR = '.cache_clima'  # Chunks ERA5 já baixados
+INGESTAO_DIR = 'ingestao'  # Pasta monitorada: novos CSVs de eventos/consumo são ingeridos sem reiniciar
+INGESTAO_INTERVALO_S = 60
+# Verificação de CSVs alterados e de virada de mês, que refaz os pré-cálculos em segundo plano (0 desliga)
+ATUALIZACAO_INTERVALO_S = int(os.environ.get('ATUALIZACAO_INTERVALO_S', '300'))
+PERF_MEDIR_MEMORIA = os.environ.get('PERF_MEDIR_MEMORIA') == '1'  # Pico de memória por etapa/rota (tracemalloc, ~2x mais lento)
+PERF_PERFIL = os.environ.get('PERF_PERFIL') == '1'  # Habilita ?_perfil=1: resumo cProfile da requisição
+MODO_COMPACTO = os.environ.get('MODO_COMPACTO') == '1'  # Eventos/consumo em categorias e float32 (menos memória)
+TAREFAS_DIR = '.tarefas'  # Descritores das tarefas assíncronas: qualquer worker retoma uma tarefa pelo id
+TAREFAS_PARALELO = 2  # Navios com clima sendo baixado ao mesmo tempo (cada um já usa 4 conexões ao ERA5)
+MAX_NAVIOS_POR_TAREFA = 50
+# Rotas síncronas de clima: espera máxima pelo download antes de responder 202 com a tarefa
+CLIMA_ESPERA_S = float(os.environ.get('CLIMA_ESPERA_S', '10'))
+MAX_NAVIOS_POR_LOTE = 50  # /metrics/navios: páginas de vários navios numa requisição
+MAX_LIMIT_PAGINA = 10000  # ?limit= das tabelas paginadas (tabelas inteiras: /export)
+# Limites da simulação do ponto de limpeza ideal por requisição (cenários preço x custo e dias simulados)
+MAX_CENARIOS_PLI = 2000
+MAX_HORIZONTE_PLI_DIAS = 3650
+RETRY_AFTER_CARGA_S = 5  # Sugestão aos clientes de rotas cujos dados ainda estão carregando
+# Pasta do dataset publicado em Arrow e mapeado por todos os workers do gunicorn (implica o modo compacto)
+DATASET_COMPARTILHADO = os.environ.get('DATASET_COMPARTILHADO')
+CARREGADOR_TIMEOUT_S = int(os.environ.get('CARREGADOR_TIMEOUT_S', '1800'))  # Espera máxima pelo processo carregador
 
 app = Flask(__name__)
-# Tipagem para garantir que o objeto de análise seja carregado
-analytics: Optional[TranspetroAnalytics] = None
-df_conformidade_normam: pd.DataFrame = pd.DataFrame()
+# (instância de análise, conformidade NORMAM 401 pré-calculada dela): trocadas juntas numa única
+# atribuição e lidas uma vez por requisição (estado_analise), para nunca misturar versões
+_estado_analise: Tuple[Optional[TranspetroAnalytics], pd.DataFrame] = (None, pd.DataFrame())
+# Latência, linhas, memória e erros das etapas de análise e das rotas (exposto em /metrics/_perf)
+desempenho = MonitorDesempenho(medir_memoria=PERF_MEDIR_MEMORIA)
+# Dataset compartilhado: o primeiro worker carrega e publica; os demais (e ele próprio) só mapeiam os arquivos
+dataset = DatasetCompartilhado(DATASET_COMPARTILHADO) if DATASET_COMPARTILHADO else None
+if dataset is not None and not dataset.ativo:
+    print("[AVISO] DATASET_COMPARTILHADO requer pyarrow; cada worker carregará a própria cópia dos dados.")
+    dataset = None
+manifesto_anexado: Optional[Dict[str, Any]] = None
+_assinatura_anexada: Optional[int] = None
+_lock_dataset = threading.Lock()
+# A carga roda em segundo plano: a porta HTTP abre na hora e /prontidao informa o que já está pronto
+estado_inicializacao = 'carregando'  # 'carregando' | 'pronta' | 'falhou'
+erro_inicializacao: Optional[str] = None
+_inicializacao_concluida = threading.Event()
+# Mês até o qual a conformidade foi calculada (ela depende da data corrente) e fontes da última carga
+mes_referencia: Optional[str] = None
+_fontes_carregadas: Optional[list] = None
+# Serializa atualizações dos pré-cálculos e ingestões (uma ingestão não se perde numa recarga)
+_lock_atualizacao = threading.RLock()
+estado_atualizacao: Dict[str, Any] = {'atualizacoes': 0, 'ultima': None, 'motivo': None, 'duracao_s': None,
+                                      'erro': None}
 
 # ====================================================================
 # 2. INICIALIZAÇÃO E PRÉ-CÁLCULO
 # ====================================================================
 
-try:
-    # 1. Instancia a classe de análise (carrega todos os dados)
-    analytics = TranspetroAnalytics(EVENTOS_FILE, CONSUMO_FILE, REVESTIMENTO_FILE, IWS_FILE)
+# Sem os CSVs exportados, revestimento e IWS são lidos das planilhas .xlsx (a origem é que é monitorada)
+FONTES = [EVENTOS_FILE, CONSUMO_FILE, arquivo_fonte(REVESTIMENTO_FILE), arquivo_fonte(IWS_FILE)]
 
-    # 2. Pré-calcula a Conformidade NORMAM 401 (Métrica 5) na inicialização
-    if analytics:
-        df_conformidade_normam = analytics.calcular_conformidade_normam_401()
 
-    print("\n[INFO] Análise e pré-cálculos prontos. API Flask inicializada.")
+def _carregar_analytics(**kwargs) -> TranspetroAnalytics:
+    return TranspetroAnalytics(EVENTOS_FILE, CONSUMO_FILE, REVESTIMENTO_FILE, IWS_FILE,
+                               snapshot_dir=SNAPSHOT_DIR, clima_cache_dir=CLIMA_CACHE_DIR,
+                               desempenho=desempenho, compacto=MODO_COMPACTO or dataset is not None,
+                               paralelo=True, **kwargs)
 
-except Exception as e:
-    print(f"\n[FATAL ERROR] Falha ao inicializar a classe de análise. Verifique logs e arquivos: {e}")
-    analytics = None
+
+def _mes_atual() -> str:
+    return pd.Timestamp.today().strftime('%Y-%m')
+
+
+def _anexar_dataset(fontes: Optional[list] = None) -> bool:
+    """Passa a servir a geração publicada do dataset (tabelas mapeadas em memória, sem cópia)."""
+    global _estado_analise, manifesto_anexado, _assinatura_anexada, mes_referencia, _fontes_carregadas
+    with desempenho.etapa('anexar_dataset'):
+        assinatura = dataset.assinatura()
+        publicacao = dataset.anexar(fontes)
+        if publicacao is None:
+            return False
+        manifesto, tabelas = publicacao
+        novo = _carregar_analytics(tabelas=tabelas, arquivos_ingeridos=manifesto.get('arquivos_ingeridos'))
+        _estado_analise = (novo, tabelas['conformidade_normam'])
+        manifesto_anexado, _assinatura_anexada = manifesto, assinatura
+        mes_referencia, _fontes_carregadas = manifesto.get('mes_referencia'), manifesto.get('fontes')
+    print(f"[INFO] Dataset compartilhado: geração {manifesto['geracao']} anexada.")
+    return True
+
+
+def _publicar_dataset(origem: Optional[TranspetroAnalytics] = None, df_conformidade: Optional[pd.DataFrame] = None,
+                      mes: Optional[str] = None) -> None:
+    """
+    Publica as tabelas deste processo (ou de `origem`, com sua conformidade do `mes`) como nova
+    geração e troca a cópia local pela mapeada.
+    """
+    if origem is None:
+        origem, df_conformidade = _estado_analise
+    with desempenho.etapa('publicar_dataset'):
+        dataset.publicar(origem.exportar_tabelas(df_conformidade), FONTES, chave_fontes=_fontes_carregadas,
+                         arquivos_ingeridos=origem.arquivos_ingeridos, mes_referencia=mes or mes_referencia)
+    _anexar_dataset()
+
+
+def _carregar_e_publicar() -> None:
+    """Corpo do processo carregador: lê os CSVs e a pasta de ingestão, pré-calcula e grava uma geração."""
+    fontes, mes = SnapshotCache.chave_fontes(FONTES), _mes_atual()
+    analise = _carregar_analytics()
+    analise.ingerir_pasta(INGESTAO_DIR)
+    df_conformidade = analise.calcular_conformidade_normam_401()
+    with desempenho.etapa('publicar_dataset'):
+        dataset.publicar(analise.exportar_tabelas(df_conformidade), FONTES, chave_fontes=fontes,
+                         arquivos_ingeridos=analise.arquivos_ingeridos, mes_referencia=mes)
+    _imprimir_etapas()
+
+
+def _publicar_em_processo_carregador() -> None:
+    """
+    A carga roda em um processo filho, para que a memória temporária da leitura dos CSVs volte ao
+    sistema quando ele termina: o worker só anexa. O filho é criado por spawn, não fork: o worker já
+    tem threads (requisições, ingestão, agendador, tarefas) e um fork herdaria locks presos por elas
+    (stdout, planilhas, snapshots, pandas). O worker segura o lock entre processos enquanto espera,
+    então a espera é limitada a CARREGADOR_TIMEOUT_S.
+    """
+    processo = multiprocessing.get_context('spawn').Process(target=_carregar_e_publicar, name='carregador-dataset')
+    processo.start()
+    processo.join(CARREGADOR_TIMEOUT_S)
+    if processo.is_alive():
+        processo.terminate()
+        processo.join()
+        raise RuntimeError(f"Processo carregador do dataset não terminou em {CARREGADOR_TIMEOUT_S} s")
+    if processo.exitcode != 0:
+        raise RuntimeError(f"Processo carregador do dataset terminou com código {processo.exitcode}")
+
+
+def _imprimir_etapas() -> None:
+    for etapa in desempenho.resumo()['etapas']:
+        erro = f" | ERRO: {etapa['ultimo_erro']}" if etapa['erros'] else ""
+        print(f"[PERF] {etapa['nome']}: {etapa['soma_s']:.3f} s, linhas={etapa['linhas']}{erro}")
+
+
+@contextmanager
+def _alterando_dataset():
+    """
+    Envolve uma ingestão e entrega a instância em que ela deve ser feita. Com dataset compartilhado,
+    roda sob o lock entre processos a partir da geração mais recente e, se eventos ou consumo
+    mudaram, publica uma geração nova para todos.
+    """
+    with _lock_atualizacao:
+        if dataset is None:
+            yield _estado_analise[0]
+            return
+
+        with dataset.bloqueio(), _lock_dataset:
+            if dataset.assinatura() != _assinatura_anexada:
+                _anexar_dataset()
+            analise = _estado_analise[0]
+            antes = (analise.df_eventos, analise.df_consumo)
+            yield analise
+            if analise.df_eventos is not antes[0] or analise.df_consumo is not antes[1]:
+                _publicar_dataset()
+
+
+def _sincronizar_dataset() -> None:
+    """Reanexa quando outro worker publicou uma geração nova (custa um stat por requisição)."""
+    if dataset is None or estado_inicializacao != 'pronta' or dataset.assinatura() == _assinatura_anexada:
+        return
+    with _lock_dataset:
+        if dataset.assinatura() != _assinatura_anexada:
+            _anexar_dataset()
+
+
+def _monitorar_pasta_ingestao():
+    """Verifica periodicamente a pasta de ingestão e acrescenta arquivos novos à base em memória."""
+    while True:
+        try:
+            with _alterando_dataset() as analise:
+                resumo = analise.ingerir_pasta(INGESTAO_DIR)
+            if resumo['arquivos']:
+                print(f"[INFO] Ingestão incremental: {resumo}")
+        except Exception as e:
+            print(f"[ERRO] Falha na ingestão incremental: {e}")
+        time.sleep(INGESTAO_INTERVALO_S)
+
+
+# --- ATUALIZAÇÃO AGENDADA DOS PRÉ-CÁLCULOS ---
+
+def _motivo_atualizacao() -> Optional[str]:
+    """'fontes' se algum CSV mudou desde a última carga, 'virada_mes' se a conformidade ficou para trás."""
+    fontes = SnapshotCache.chave_fontes(FONTES)
+    if fontes is not None and fontes != _fontes_carregadas:  # None: arquivo sendo substituído, espera
+        return 'fontes'
+    if mes_referencia != _mes_atual():
+        return 'virada_mes'
+    return None
+
+
+def _montar_instancia(recarregar: bool) -> Tuple[TranspetroAnalytics, pd.DataFrame]:
+    """
+    Instância nova com conformidade, consumo mensal, risco e navegação diária já calculados:
+    relida dos CSVs (e da pasta de ingestão) ou reaproveitando as tabelas base da atual, sem cópia.
+    """
+    if recarregar:
+        novo = _carregar_analytics()
+        novo.ingerir_pasta(INGESTAO_DIR)
+    else:
+        atual = _estado_analise[0]
+        novo = _carregar_analytics(tabelas={nome: getattr(atual, f'df_{nome}')
+                                            for nome in TranspetroAnalytics.TABELAS_BASE},
+                                   arquivos_ingeridos=atual.arquivos_ingeridos)
+    df_conformidade = novo.calcular_conformidade_normam_401()
+    novo.calcular_consumo_mensal_total()
+    novo.cubo_consumo()
+    novo.calcular_risco_bioincrustacao_frota(df_conformidade)
+    novo.calcular_embarcacoes_navegando_por_dia()
+    return novo, df_conformidade
+
+
+def atualizar_pre_calculos(motivo: str) -> None:
+    """
+    Refaz os pré-cálculos fora do caminho das requisições, numa instância nova que só substitui
+    a atual quando está pronta: leitores seguem servindo a versão anterior enquanto isso e nunca
+    veem uma tabela pela metade. Com dataset compartilhado, publica uma geração nova para todos.
+    """
+    global _estado_analise, mes_referencia, _fontes_carregadas
+    inicio = time.perf_counter()
+    try:
+        with _lock_atualizacao, desempenho.etapa('atualizar_pre_calculos'):
+            if dataset is not None:
+                _atualizar_dataset_compartilhado()
+            else:
+                fontes, mes = SnapshotCache.chave_fontes(FONTES), _mes_atual()
+                _estado_analise = _montar_instancia(recarregar=motivo == 'fontes')
+                mes_referencia, _fontes_carregadas = mes, fontes
+    except Exception as e:
+        estado_atualizacao['erro'] = f"{type(e).__name__}: {e}"
+        raise
+    estado_atualizacao.update(atualizacoes=estado_atualizacao['atualizacoes'] + 1, motivo=motivo, erro=None,
+                              ultima=datetime.now(timezone.utc).isoformat(),
+                              duracao_s=round(time.perf_counter() - inicio, 3))
+
+
+def _atualizar_dataset_compartilhado() -> None:
+    with dataset.bloqueio(), _lock_dataset:
+        # Outro worker pode ter feito a mesma atualização enquanto este esperava o lock
+        if dataset.assinatura() != _assinatura_anexada:
+            _anexar_dataset()
+        motivo = _motivo_atualizacao()
+        if motivo == 'fontes':
+            _publicar_em_processo_carregador()
+            _anexar_dataset()
+        elif motivo == 'virada_mes':
+            novo, df_conformidade = _montar_instancia(recarregar=False)
+            _publicar_dataset(novo, df_conformidade, _mes_atual())
+
+
+def _agendar_atualizacoes():
+    """Verifica periodicamente se os CSVs de origem mudaram ou o mês virou e atualiza os pré-cálculos."""
+    while True:
+        time.sleep(ATUALIZACAO_INTERVALO_S)
+        motivo = _motivo_atualizacao()
+        if motivo is None:
+            continue
+        try:
+            atualizar_pre_calculos(motivo)
+            print(f"[INFO] Pré-cálculos atualizados ({motivo}) em {estado_atualizacao['duracao_s']} s.")
+        except Exception as e:
+            print(f"[ERRO] Falha na atualização dos pré-cálculos ({motivo}): {e}")
+
+
+# --- INICIALIZAÇÃO EM SEGUNDO PLANO ---
+
+def _inicializar() -> None:
+    """
+    Carrega os dados e faz os pré-cálculos fora da importação. As tabelas base carregam em paralelo
+    e a instância é publicada logo no início: rotas cujas tabelas já chegaram respondem enquanto
+    as demais ainda carregam (check_analytics_ready devolve 503 para as outras).
+    """
+    global _estado_analise, _fontes_carregadas, mes_referencia
+    global estado_inicializacao, erro_inicializacao
+    try:
+        if dataset is not None:
+            with dataset.bloqueio():
+                # Só o primeiro worker (ou quem encontrar CSVs alterados) dispara a carga e a publicação
+                if not _anexar_dataset(FONTES):
+                    _publicar_em_processo_carregador()
+                    if not _anexar_dataset(FONTES):
+                        raise RuntimeError(f"Nenhuma geração válida publicada em {DATASET_COMPARTILHADO}")
+        else:
+            # 1. Instancia a classe de análise (as tabelas base seguem carregando em threads)
+            _fontes_carregadas, mes_referencia = SnapshotCache.chave_fontes(FONTES), _mes_atual()
+            analise = _carregar_analytics()
+            _estado_analise = (analise, pd.DataFrame())
+
+            # 2. Pré-calcula a Conformidade NORMAM 401 (Métrica 5), o risco, o consumo mensal e o cubo de consumo
+            df_conformidade = analise.calcular_conformidade_normam_401()
+            _estado_analise = (analise, df_conformidade)
+            analise.calcular_risco_bioincrustacao_frota(df_conformidade)
+            analise.calcular_consumo_mensal_total()
+            analise.cubo_consumo()
+            analise.aguardar_carga()
+
+        _imprimir_etapas()
+        print("\n[INFO] Análise e pré-cálculos prontos. API Flask inicializada.")
+        estado_inicializacao = 'pronta'
+
+    except Exception as e:
+        print(f"\n[FATAL ERROR] Falha ao inicializar a classe de análise. Verifique logs e arquivos: {e}")
+        _estado_analise = (None, pd.DataFrame())
+        estado_inicializacao, erro_inicializacao = 'falhou', f"{type(e).__name__}: {e}"
+        return
+    finally:
+        _inicializacao_concluida.set()
+
+    threading.Thread(target=_monitorar_pasta_ingestao, name='ingestao', daemon=True).start()
+    if ATUALIZACAO_INTERVALO_S > 0:
+        threading.Thread(target=_agendar_atualizacoes, name='atualizacao', daemon=True).start()
+
+
+def aguardar_inicializacao(timeout: Optional[float] = None) -> bool:
+    """Bloqueia até a inicialização terminar (com sucesso ou não); útil para scripts e benchmarks."""
+    _inicializacao_concluida.wait(timeout)
+    return estado_inicializacao == 'pronta'
+
+
+# Importado (gunicorn, testes) carrega já; com `python api.py` (debug=True) o processo pai do reloader
+# só vigia os arquivos e reinicia o filho, então a carga roda apenas no filho (WERKZEUG_RUN_MAIN).
+# O processo carregador (spawn) reimporta este módulo só para rodar _carregar_e_publicar: não inicializa.
+if multiprocessing.parent_process() is None and (__name__ != '__main__'
+                                                 or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    threading.Thread(target=_inicializar, name='inicializacao', daemon=True).start()
+
+
+def estado_analise() -> Tuple[Optional[TranspetroAnalytics], pd.DataFrame]:
+    """
+    (analytics, conformidade) da requisição: lido uma vez do estado global e guardado em `g`, para
+    que uma troca concorrente (atualização, nova geração do dataset) não junte a instância nova à
+    conformidade antiga no meio da rota. Fora de requisições, o estado atual.
+    """
+    if not has_request_context():
+        return _estado_analise
+    if 'estado_analise' not in g:
+        g.estado_analise = _estado_analise
+    return g.estado_analise
 
 
 # Função de apoio para checagem de serviço
-def check_analytics_ready():
-    """Verifica se o serviço de análise foi inicializado com sucesso."""
+def check_analytics_ready(*tabelas: str) -> TranspetroAnalytics:
+    """
+    Verifica se o serviço de análise foi inicializado com sucesso e se as tabelas base de que a rota
+    depende já foram carregadas (durante a carga, 503 com Retry-After). Devolve a instância da requisição.
+    """
+    analytics = estado_analise()[0]
     if analytics is None:
+        if estado_inicializacao == 'carregando':
+            abort(503, description="Serviço de análise em inicialização. Acompanhe em /prontidao.",
+                  retry_after=RETRY_AFTER_CARGA_S)
         abort(503, description="Serviço de análise indisponível. Verifique logs de inicialização e arquivos de dados.")
+    if tabelas and not analytics.pronto(*tabelas):
+        abort(503, description=f"Dados ainda carregando ({', '.join(tabelas)}). Acompanhe em /prontidao.",
+              retry_after=RETRY_AFTER_CARGA_S)
+    return analytics
+
+
+def conformidade_calculada() -> pd.DataFrame:
+    """
+    Conformidade NORMAM 401 pré-calculada. 503 com Retry-After só enquanto a inicialização ainda a
+    calcula; depois dela, uma tabela vazia (ex.: sem aplicações de revestimento) é o resultado.
+    """
+    check_analytics_ready()
+    df_conformidade = estado_analise()[1]
+    if df_conformidade.empty and estado_inicializacao == 'carregando':
+        abort(503, description="Conformidade NORMAM 401 ainda em pré-cálculo. Acompanhe em /prontidao.",
+              retry_after=RETRY_AFTER_CARGA_S)
+    return df_conformidade
 
 
 # ====================================================================
-# 3. ROTAS (ENDPOINTS)
+# 3. CAMADA DE RESPOSTA (JSON PRÉ-SERIALIZADO + GZIP + ETAG)
+# ====================================================================
+
+class RespostaSerializada:
+    """Payload de uma métrica já serializado em bytes JSON, com variante gzip e validadores HTTP."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        with desempenho.serializacao():
+            self.corpo = app.json.dumps(payload).encode('utf-8')
+            self.corpo_gzip = gzip.compress(self.corpo, compresslevel=6)
+        self.etag = hashlib.sha1(self.corpo).hexdigest()
+        # Validador forte próprio para a representação gzip (bytes diferentes, RFC 9110 §8.8.3)
+        self.etag_gzip = f"{self.etag}-gz"
+        self.tamanho = len(self.corpo) + len(self.corpo_gzip)
+        self.ultima_modificacao = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+# chave da métrica/consulta -> (objetos de origem usados no cálculo, resposta serializada), em ordem LRU
+_respostas_serializadas: "OrderedDict[Tuple, Tuple[Tuple, RespostaSerializada]]" = OrderedDict()
+_lock_respostas = threading.Lock()
+MAX_RESPOSTAS_SERIALIZADAS = 256
+# Limite em bytes (JSON + gzip) do cache: cada combinação de filtros e página é uma entrada, e
+# 256 páginas da frota inteira ocupariam muito mais do que isso em cada worker
+MAX_BYTES_RESPOSTAS_SERIALIZADAS = int(os.environ.get('CACHE_RESPOSTAS_MB', '64')) * 2 ** 20
+
+
+def responder_metrica(chave: Tuple, origens: Tuple, construir_payload: Callable[[], Dict[str, Any]]) -> Response:
+    """
+    Serializa a métrica apenas quando algum dos objetos em `origens` (DataFrames de entrada)
+    foi substituído; caso contrário reutiliza os bytes prontos. Clientes que repetem o ETag
+    (If-None-Match) ou a data (If-Modified-Since) recebem 304 sem nenhum trabalho de pandas.
+    """
+    with _lock_respostas:
+        cache = _respostas_serializadas.get(chave)
+        if cache is not None:
+            _respostas_serializadas.move_to_end(chave)
+    valido = (cache is not None and len(cache[0]) == len(origens)
+              and all(a is b for a, b in zip(cache[0], origens)))
+
+    if valido:
+        resposta = cache[1]
+    else:
+        resposta = RespostaSerializada(construir_payload())
+        with _lock_respostas:
+            _respostas_serializadas.pop(chave, None)
+            # Uma resposta maior que o limite inteiro é servida, mas não guardada
+            if resposta.tamanho <= MAX_BYTES_RESPOSTAS_SERIALIZADAS:
+                _respostas_serializadas[chave] = (origens, resposta)
+            total = sum(r.tamanho for _, r in _respostas_serializadas.values())
+            while (len(_respostas_serializadas) > MAX_RESPOSTAS_SERIALIZADAS
+                   or total > MAX_BYTES_RESPOSTAS_SERIALIZADAS):
+                total -= _respostas_serializadas.popitem(last=False)[1][1].tamanho
+
+    return _servir_resposta(resposta)
+
+
+def responder_tabela(metrica: str, df: pd.DataFrame, coluna_tempo: str,
+                     extras: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    Resposta de uma tabela navio x tempo com filtros opcionais ?ship=, ?from=, ?to= (resolvidos
+    pelo índice da tabela) e paginação por ?limit= e ?cursor=. As linhas saem sempre na ordem da
+    tabela, com ou sem filtros. O cursor ('proximo_cursor') é opaco e ligado à versão da tabela e
+    aos filtros: um cursor de outra versão (a tabela foi recalculada entre as páginas) responde 409.
+    """
+    filtros = {'navio': request.args.get('ship'), 'inicio': request.args.get('from'), 'fim': request.args.get('to')}
+    limit = request.args.get('limit')
+    if limit is not None:
+        # limit < 1 devolveria páginas vazias com o mesmo cursor: clientes que seguem cursores não terminariam
+        limit = int(limit) if limit.strip().isdigit() else 0
+        if not 1 <= limit <= MAX_LIMIT_PAGINA:
+            abort(400, description=f"limit deve ser um inteiro entre 1 e {MAX_LIMIT_PAGINA}.")
+    consulta = tuple(sorted((k, v) for k, v in request.args.items() if k in ('ship', 'from', 'to', 'limit', 'cursor')))
+    chave_tabela = (metrica, tuple(sorted((extras or {}).items())))
+
+    assinatura, inicio_pagina = None, 0
+    if limit is not None or 'cursor' in request.args:
+        assinatura = hashlib.sha1(repr((_versao_tabela(chave_tabela, df), chave_tabela, sorted(filtros.items())))
+                                  .encode('utf-8')).hexdigest()[:16]
+        inicio_pagina = _ler_cursor(request.args.get('cursor'), assinatura)
+
+    def construir_payload():
+        payload = {"metrica": metrica, **(extras or {})}
+        if not consulta:
+            payload["dados"] = _registros(df, coluna_tempo)
+            return payload
+
+        if any(v is not None for v in filtros.values()):
+            try:
+                df_filtrado = estado_analise()[0].consultar_tabela(metrica, df, coluna_tempo, **filtros)
+            except ValueError as e:
+                abort(400, description=str(e))
+        else:
+            df_filtrado = df
+
+        fim_pagina = len(df_filtrado) if limit is None else inicio_pagina + limit
+        payload["dados"] = _registros(df_filtrado.iloc[inicio_pagina:fim_pagina], coluna_tempo)
+        payload["paginacao"] = {
+            "total": len(df_filtrado),
+            "cursor": request.args.get('cursor'),
+            "limit": limit,
+            "proximo_cursor": _gerar_cursor(assinatura, fim_pagina) if fim_pagina < len(df_filtrado) else None
+        }
+        return payload
+
+    return responder_metrica(chave_tabela + (consulta,), (df,), construir_payload)
+
+
+# chave da tabela -> (DataFrame, hash do conteúdo): a versão que amarra os cursores de paginação
+_versoes_tabela: Dict[Tuple, Tuple[pd.DataFrame, str]] = {}
+
+
+def _versao_tabela(chave: Tuple, df: pd.DataFrame) -> str:
+    """
+    Hash do conteúdo de `df`, calculado uma vez por objeto: tabelas iguais recalculadas (ou em
+    outro worker) têm a mesma versão, então os cursores só expiram quando os dados mudam.
+    """
+    with _lock_respostas:
+        cache = _versoes_tabela.get(chave)
+    if cache is not None and cache[0] is df:
+        return cache[1]
+    with desempenho.serializacao():
+        versao = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+    with _lock_respostas:
+        _versoes_tabela[chave] = (df, versao)
+    return versao
+
+
+def _gerar_cursor(assinatura: str, posicao: int) -> str:
+    return base64.urlsafe_b64encode(f"{assinatura}.{posicao}".encode('ascii')).decode('ascii').rstrip('=')
+
+
+def _ler_cursor(cursor: Optional[str], assinatura: str) -> int:
+    """Posição guardada no cursor (0 sem cursor); 400 se inválido, 409 se de outra versão da tabela ou consulta."""
+    if not cursor:
+        return 0
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        assinatura_cursor, posicao = texto.split('.')
+        posicao = int(posicao)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400, description=f"Cursor inválido: {cursor}")
+    if assinatura_cursor != assinatura or posicao < 0:
+        abort(409, description="O cursor é de outra versão da tabela ou de outros filtros; recomece sem cursor.")
+    return posicao
+
+
+def _registros(df: pd.DataFrame, coluna_tempo: str) -> list:
+    _anotar_linhas(len(df))
+    with desempenho.serializacao():
+        if pd.api.types.is_datetime64_any_dtype(df[coluna_tempo]):
+            df = df.assign(**{coluna_tempo: df[coluna_tempo].astype(str)})
+        return df.to_dict(orient='records')
+
+
+def _servir_resposta(resposta: RespostaSerializada) -> Response:
+    usar_gzip = 'gzip' in request.accept_encodings
+    http_response = Response(resposta.corpo_gzip if usar_gzip else resposta.corpo, mimetype='application/json')
+    if usar_gzip:
+        http_response.headers['Content-Encoding'] = 'gzip'
+    http_response.headers['Vary'] = 'Accept-Encoding'
+    http_response.headers['Cache-Control'] = 'no-cache'
+    http_response.set_etag(resposta.etag_gzip if usar_gzip else resposta.etag)
+    http_response.last_modified = resposta.ultima_modificacao
+    return http_response.make_conditional(request)
+
+
+def _anotar_linhas(linhas: int) -> None:
+    medicao = g.get('medicao')
+    if medicao is not None:
+        medicao.linhas = linhas
+
+
+def _json(payload: Dict[str, Any]) -> Response:
+    """jsonify contabilizado como serialização da rota."""
+    with desempenho.serializacao():
+        return jsonify(payload)
+
+
+# --- INSTRUMENTAÇÃO DAS ROTAS ---
+
+@app.before_request
+def _iniciar_medicao():
+    if request.endpoint == 'get_perf':
+        return
+    g.medicao = desempenho.iniciar('rota', f"{request.method} {request.url_rule.rule if request.url_rule else '<404>'}")
+    if PERF_PERFIL and request.args.get('_perfil') == '1':
+        g.perfil = cProfile.Profile()
+        g.perfil.enable()
+
+
+@app.before_request
+def _acompanhar_dataset():
+    _sincronizar_dataset()
+
+
+@app.after_request
+def _encerrar_medicao(response: Response) -> Response:
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfil.disable()
+        status_original = response.status_code
+        response = Response(resumo_perfil(perfil), mimetype='text/plain')
+        response.headers['X-Status-Original'] = str(status_original)
+
+    medicao = g.pop('medicao', None)
+    if medicao is not None:
+        erro = RuntimeError(f"HTTP {response.status_code}") if response.status_code >= 500 else None
+        total = desempenho.encerrar(medicao, erro=erro)
+        calculo = max(total - medicao.serializacao, 0.0)
+        response.headers['Server-Timing'] = (f"calculo;dur={calculo * 1000:.1f}, "
+                                             f"serializacao;dur={medicao.serializacao * 1000:.1f}")
+    return response
+
+
+@app.teardown_request
+def _encerrar_medicao_com_erro(erro: Optional[BaseException]):
+    # Só chega aqui com a medição aberta quando a rota levantou uma exceção não tratada
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfil.disable()
+    medicao = g.pop('medicao', None)
+    if medicao is not None:
+        desempenho.encerrar(medicao, erro=erro)
+
+
+# ====================================================================
+# 4. ROTAS (ENDPOINTS)
 # ====================================================================
 
 @app.route('/', methods=['GET'])
 def home():
     """Rota inicial para verificar o status da API."""
-    return jsonify({
-        "status": "online" if analytics else "inicializacao_falhou",
+    status = {'pronta': "online", 'carregando': "carregando", 'falhou': "inicializacao_falhou"}
+    return _json({
+        "status": status[estado_inicializacao],
         "message": "API de Análise Transpetro / Hackathon",
         "endpoints_principais": [
             "/metrics/total_embarcacoes",
             "/metrics/consumo_mensal",
+            "/metrics/consumo/<frota|navio|combustivel|evento|mes>",
             "/metrics/navegacao_diaria",
             "/metrics/risco_bioincrustacao_frota",
             "/metrics/conformidade_normam",
-            "/metrics/clima_navio/<ship_name>"
+            "/metrics/ponto_limpeza_ideal",
+            "/metrics/clima_navio/<ship_name>",
+            "/metrics/navios?ship=<navio>&ship=<navio>&metricas=risco,conformidade,clima",
+            "/tarefas/clima (POST) e /tarefas/<id>",
+            "/export/<conformidade_normam|risco_bioincrustacao_frota|navegacao_diaria|consumo_mensal|clima_navio>",
+            "/ingestao/<eventos|consumo> (POST)",
+            "/prontidao",
+            "/metrics/_perf"
         ]
     })
 
@@ -68,77 +666,548 @@ def home():
 @app.route('/metrics/total_embarcacoes', methods=['GET'])
 def get_total_embarcacoes():
     """Métrica 1: Retorna o total de embarcações únicas."""
-    check_analytics_ready()
+    analytics = check_analytics_ready('eventos')
     total = analytics.calcular_total_embarcacoes()
-    return jsonify({"metrica": "total_embarcacoes", "valor": total})
+    return _json({"metrica": "total_embarcacoes", "valor": total})
 
 
 @app.route('/metrics/consumo_mensal', methods=['GET'])
 def get_consumo_mensal():
-    """Métrica 3: Retorna o consumo total de combustível agrupado por mês."""
-    check_analytics_ready()
+    """Métrica 3: Retorna o consumo total de combustível agrupado por mês (filtros: from, to, limit, cursor)."""
+    analytics = check_analytics_ready('consolidado')
     df = analytics.calcular_consumo_mensal_total()
-    dados = df.to_dict(orient='records')
-    return jsonify({"metrica": "consumo_mensal", "dados": dados})
+    return responder_tabela("consumo_mensal", df, 'Mês/Ano')
+
+
+@app.route('/metrics/consumo/<string:dimensao>', methods=['GET'])
+def get_consumo_por(dimensao):
+    """
+    Consumo, sessões e horas em porto/navegando por frota (total), navio, combustivel, evento ou mes,
+    respondidos pelo cubo de consumo pré-calculado. ?mensal=1 abre também por mês.
+    Filtros: ship, fuel, event, from, to (AAAA-MM).
+    """
+    analytics = check_analytics_ready('eventos', 'consumo')
+    if dimensao != 'frota' and dimensao not in CuboConsumo.DIMENSOES:
+        abort(404, description=f"Dimensão desconhecida: {dimensao} (use frota, {', '.join(CuboConsumo.DIMENSOES)}).")
+
+    por = [] if dimensao == 'frota' else [dimensao]
+    if request.args.get('mensal') in ('1', 'true') and 'mes' not in por:
+        por.append('mes')
+    filtros = {'navio': request.args.get('ship'), 'combustivel': request.args.get('fuel'),
+               'evento': request.args.get('event'), 'inicio': request.args.get('from'), 'fim': request.args.get('to')}
+    cubo = analytics.cubo_consumo()
+
+    def construir_payload():
+        df = cubo.agregar(por, **filtros)
+        _anotar_linhas(len(df))
+        return {"metrica": f"consumo_{dimensao}", "dimensoes": [CuboConsumo.DIMENSOES[d] for d in por],
+                "filtros": {k: v for k, v in filtros.items() if v is not None}, "dados": df.to_dict(orient='records')}
+
+    return responder_metrica(('consumo', tuple(por), tuple(sorted(filtros.items()))), (cubo,), construir_payload)
 
 
 @app.route('/metrics/navegacao_diaria', methods=['GET'])
 def get_navegacao_diaria():
-    """Métrica 4: Retorna o número de embarcações navegando por dia."""
-    check_analytics_ready()
-    df = analytics.calcular_embarcacoes_navegando_por_dia()
-    df['Data'] = df['Data'].astype(str)
-    dados = df.to_dict(orient='records')
-    return jsonify({"metrica": "navegacao_diaria", "dados": dados})
+    """
+    Métrica 4: Retorna o número de embarcações navegando por dia
+    (opcional: ?agrupar_por=shipName|Classe; filtros: ship (com agrupar_por=shipName), from, to, limit, cursor).
+    """
+    analytics = check_analytics_ready('eventos', 'revestimento')
+    agrupar_por = request.args.get('agrupar_por')
+    try:
+        df = analytics.calcular_embarcacoes_navegando_por_dia(agrupar_por)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return responder_tabela("navegacao_diaria", df, 'Data', extras={"agrupar_por": agrupar_por} if agrupar_por else None)
 
 
 # --- ENDPOINTS DE RISCO E CONFORMIDADE (Métricas 5 e 8) ---
 
 @app.route('/metrics/conformidade_normam', methods=['GET'])
 def get_conformidade_normam():
-    """Métrica 5: Retorna a Conformidade NORMAM 401 por navio e mês."""
-    if df_conformidade_normam.empty:
-        abort(503, description="Dados de Conformidade NORMAM 401 indisponíveis após pré-cálculo.")
-
-    dados = df_conformidade_normam.to_dict(orient='records')
-    return jsonify({"metrica": "conformidade_normam", "dados": dados})
+    """Métrica 5: Retorna a Conformidade NORMAM 401 por navio e mês (filtros: ship, from, to, limit, cursor)."""
+    return responder_tabela("conformidade_normam", conformidade_calculada(), 'Mês/Ano')
 
 
 @app.route('/metrics/risco_bioincrustacao_frota', methods=['GET'])
 def get_risco_bioincrustacao_frota():
-    """Métrica 8: Retorna o Risco de Bioincrustação (1-5) para toda a frota por mês (POR EMBARCAÇÃO)."""
-    check_analytics_ready()
+    """
+    Métrica 8: Retorna o Risco de Bioincrustação (1-5) para toda a frota por mês (POR EMBARCAÇÃO).
+    Filtros: ship, from, to, limit, cursor.
+    """
+    analytics = check_analytics_ready('eventos')
 
     # Usa o DataFrame pré-calculado da Conformidade (Métrica 5)
-    df_conformidade = df_conformidade_normam
+    df_conformidade = conformidade_calculada()
 
-    # CHAMADA CORRIGIDA: Agora o método existe na classe
+    # Resultado materializado na classe: só recalcula se eventos ou conformidade mudarem
     df = analytics.calcular_risco_bioincrustacao_frota(df_conformidade)
 
-    df['Mês/Ano'] = df['Mês/Ano'].astype(str)
+    return responder_tabela("risco_bioincrustacao_frota", df, 'Mês/Ano')
+
+
+@app.route('/metrics/ponto_limpeza_ideal', methods=['GET'])
+def get_ponto_limpeza_ideal():
+    """
+    Ponto de limpeza ideal (PLI): melhor data de limpeza do casco e economia líquida por navio em
+    cada cenário preço do combustível x custo da limpeza. Parâmetros: ship, preco e custo (listas
+    separadas por vírgula; padrão: grade pli), horizonte (dias), desconto (taxa ao ano) e curva=1
+    (curva de combustível economizado por data; sempre incluída com ship).
+    """
+    analytics = check_analytics_ready('eventos', 'consolidado', 'revestimento')
+    df_conformidade = conformidade_calculada()
+
+    try:
+        precos = _lista_numeros('preco', PRECOS_COMBUSTIVEL_PADRAO)
+        custos = _lista_numeros('custo', CUSTOS_LIMPEZA_PADRAO)
+        horizonte = int(request.args.get('horizonte', HORIZONTE_PADRAO_DIAS))
+        desconto = _numero_finito(request.args.get('desconto', TAXA_DESCONTO_ANUAL))
+    except ValueError:
+        abort(400, description="preco, custo, horizonte e desconto devem ser numéricos e finitos.")
+    if len(precos) * len(custos) > MAX_CENARIOS_PLI:
+        abort(400, description=f"No máximo {MAX_CENARIOS_PLI} cenários (preço x custo) por consulta.")
+    if not 1 <= horizonte <= MAX_HORIZONTE_PLI_DIAS:
+        abort(400, description=f"horizonte deve estar entre 1 e {MAX_HORIZONTE_PLI_DIAS} dias.")
+    if desconto <= -1:
+        abort(400, description="desconto deve ser maior que -1.")
+
+    navio = request.args.get('ship')
+    incluir_curva = navio is not None or request.args.get('curva') in ('1', 'true')
+
+    def construir_payload():
+        # processos=1: um pool (fork) por requisição, a partir de um worker com threads, arriscaria
+        # herdar locks presos e custaria mais que simular a frota (dezenas de ms) aqui mesmo
+        resultado = analytics.calcular_ponto_limpeza_ideal(
+            df_conformidade, navios=[navio] if navio is not None else None, precos_combustivel=precos,
+            custos_limpeza=custos, horizonte_dias=horizonte, taxa_desconto=desconto, processos=1)
+        if navio is not None and resultado['cenarios'].empty:
+            abort(404, description=f"Navio sem consumo registrado: {navio}")
+        # Data Ideal nula (nenhuma limpeza se paga no horizonte) vira null, não 'NaT'
+        cenarios = resultado['cenarios']
+        data_ideal = cenarios['Data Ideal'].dt.strftime('%Y-%m-%d')
+        cenarios = cenarios.assign(**{'Data Ideal': data_ideal.astype(object).where(data_ideal.notna(), None)})
+        payload = {"metrica": "ponto_limpeza_ideal", "inicio": str(resultado['inicio'].date()),
+                   "horizonte_dias": horizonte, "taxa_desconto": desconto,
+                   "dados": _registros(cenarios, 'Data Ideal')}
+        if incluir_curva:
+            payload["curvas"] = _registros(resultado['curvas'], 'Data')
+        return payload
+
+    chave = ('ponto_limpeza_ideal', navio, precos, custos, horizonte, desconto, incluir_curva)
+    origens = (analytics.df_consolidado, analytics.df_eventos, analytics.df_revestimento, df_conformidade)
+    return responder_metrica(chave, origens, construir_payload)
 
-    dados = df.to_dict(orient='records')
-    return jsonify({"metrica": "risco_bioincrustacao_frota", "dados": dados})
+
+def _lista_numeros(parametro: str, padrao: Tuple[float, ...]) -> Tuple[float, ...]:
+    valor = request.args.get(parametro)
+    if not valor:
+        return tuple(padrao)
+    return tuple(_numero_finito(v) for v in valor.split(',') if v.strip())
+
+
+def _numero_finito(valor) -> float:
+    """float(valor), recusando nan e inf (ValueError), que passariam por float() e pelas faixas."""
+    numero = float(valor)
+    if not math.isfinite(numero):
+        raise ValueError(f"valor não finito: {valor}")
+    return numero
 
 
 @app.route('/metrics/clima_navio/<string:ship_name>', methods=['GET'])
 def get_clima_navio(ship_name):
-    """Métrica 6: Retorna dados climáticos históricos para uma embarcação específica."""
-    check_analytics_ready()
+    """
+    Métrica 6: Retorna dados climáticos históricos para uma embarcação específica.
+    Aguarda o download por até CLIMA_ESPERA_S; se ainda não terminou, responde 202 com a tarefa
+    (/tarefas/<id>) que o acompanha. Pedidos simultâneos do mesmo navio compartilham a execução
+    das tarefas assíncronas (/tarefas/clima).
+    """
+    check_analytics_ready('eventos')
 
-    df_clima = analytics.obter_dados_climaticos_navio(ship_name)
+    df_clima = _aguardar_clima(ship_name, CLIMA_ESPERA_S)
+    if df_clima is None:
+        return _tarefa_aceita(tarefas.submeter('clima', [ship_name.strip()]))
 
     if df_clima.empty:
         abort(404, description=f"Dados climáticos não encontrados ou erro na API para {ship_name}.")
 
-    df_clima['DataHoraGMT'] = df_clima['DataHoraGMT'].astype(str)
+    _anotar_linhas(len(df_clima))
+    return _json({"navio": ship_name, "dados_climaticos": _registros_clima(df_clima)})
+
+
+def _aguardar_clima(navio: str, espera_s: float) -> Optional[pd.DataFrame]:
+    """
+    Clima do navio se a execução (nova ou já em andamento) terminar em `espera_s`; None se ainda
+    não terminou (o download continua em segundo plano). Falha no download: 502.
+    """
+    execucao = tarefas.executar('clima', navio)
+    if not wait([execucao.future], timeout=espera_s).done:
+        return None
+    erro = execucao.future.exception()
+    if erro is not None:
+        abort(502, description=f"Falha ao buscar dados climáticos para {navio}: {type(erro).__name__}: {erro}")
+    return execucao.future.result()
+
+
+def _janela_clima(df_clima: pd.DataFrame, inicio: Optional[str], fim: Optional[str]) -> pd.DataFrame:
+    """Horas de `df_clima` entre `inicio` e `fim` (inclusivos; None = sem limite)."""
+    horas = df_clima['DataHoraGMT']
+    mascara = pd.Series(True, index=df_clima.index)
+    if inicio is not None:
+        mascara &= horas >= pd.Timestamp(inicio)
+    if fim is not None:
+        mascara &= horas <= pd.Timestamp(fim)
+    return df_clima if mascara.all() else df_clima[mascara]
+
+
+def _registros_clima(df_clima: pd.DataFrame) -> list:
+    # O DataFrame pode estar sendo servido a outros pedidos: converte numa cópia
+    with desempenho.serializacao():
+        return df_clima.assign(DataHoraGMT=df_clima['DataHoraGMT'].astype(str)).to_dict(orient='records')
+
+
+# --- TAREFAS ASSÍNCRONAS ---
+
+def _buscar_clima(navio: str, progresso: Progresso) -> pd.DataFrame:
+    # Roda nas threads das tarefas, fora da requisição: usa a instância atual
+    return _estado_analise[0].obter_dados_climaticos_navio(navio, progresso=progresso)
+
+
+tarefas = GerenciadorTarefas(max_paralelo=TAREFAS_PARALELO, diretorio=TAREFAS_DIR)
+tarefas.registrar('clima', _buscar_clima, chave=lambda navio: navio.strip())
+
+
+@app.route('/tarefas/clima', methods=['POST'])
+def post_tarefa_clima():
+    """
+    Inicia em segundo plano a busca climática de um ou mais navios ({"navios": [...]}) e responde
+    202 com o id da tarefa. Navios já em download (por qualquer tarefa) não são baixados de novo.
+    """
+    check_analytics_ready('eventos')
+
+    corpo = request.get_json(silent=True) or {}
+    navios = corpo.get('navios', [corpo['navio']] if 'navio' in corpo else [])
+    if not isinstance(navios, list) or not navios or not all(isinstance(n, str) and n.strip() for n in navios):
+        abort(400, description="Envie {\"navios\": [\"NOME\", ...]} com ao menos um navio.")
+    if len(navios) > MAX_NAVIOS_POR_TAREFA:
+        abort(400, description=f"No máximo {MAX_NAVIOS_POR_TAREFA} navios por tarefa.")
+
+    return _tarefa_aceita(tarefas.submeter('clima', [n.strip() for n in navios]))
+
+
+def _tarefa_aceita(tarefa) -> Response:
+    """202 com o resumo da tarefa e, em Location, a rota que a acompanha."""
+    resposta = _json(_resumo_tarefa(tarefa, incluir_dados=False))
+    resposta.status_code = 202
+    resposta.headers['Location'] = f"/tarefas/{tarefa.id}"
+    resposta.headers['Retry-After'] = str(RETRY_AFTER_CARGA_S)
+    return resposta
+
+
+@app.route('/tarefas/<string:tarefa_id>', methods=['GET'])
+def get_tarefa(tarefa_id):
+    """
+    Status e progresso (0 a 1) da tarefa e de cada navio; concluída, traz os dados climáticos
+    (?dados=0 omite os dados). Tarefas concluídas ficam disponíveis por 15 minutos.
+    """
+    tarefa = tarefas.obter(tarefa_id)
+    if tarefa is None:
+        abort(404, description=f"Tarefa não encontrada ou expirada: {tarefa_id}")
+
+    incluir_dados = request.args.get('dados') != '0'
+    if not tarefa.concluida:
+        return _json(_resumo_tarefa(tarefa, incluir_dados=False))
+
+    # Concluída: os bytes são serializados uma vez e revalidados por ETag nos próximos GETs
+    resultados = tarefa.resultados()
+    return responder_metrica(('tarefa', tarefa.id, incluir_dados), tuple(resultados.values()),
+                             lambda: _resumo_tarefa(tarefa, incluir_dados))
+
+
+def _resumo_tarefa(tarefa, incluir_dados: bool) -> Dict[str, Any]:
+    def instante(t):
+        return datetime.fromtimestamp(t, timezone.utc).isoformat() if t is not None else None
+
+    resultados = tarefa.resultados()
+    navios = []
+    for navio, execucao in tarefa.execucoes.items():
+        item = {"navio": navio, **execucao.resumo()}
+        if navio in resultados:
+            item["linhas"] = len(resultados[navio])
+            if resultados[navio].empty:
+                item["status"] = "sem_dados"
+        navios.append(item)
+
+    payload = {
+        "tarefa": tarefa.id,
+        "tipo": tarefa.tipo,
+        "status": tarefa.status,
+        "progresso": round(tarefa.progresso, 4),
+        "criada_em": instante(tarefa.criada_em),
+        "concluida_em": instante(tarefa.concluida_em),
+        "navios": navios,
+    }
+    if incluir_dados and tarefa.concluida:
+        payload["dados_climaticos"] = {navio: _registros_clima(df) for navio, df in resultados.items() if not df.empty}
+    return payload
+
+
+# --- LOTE DE NAVIOS ---
+
+METRICAS_LOTE = {'risco': 'risco_bioincrustacao_frota', 'conformidade': 'conformidade_normam', 'clima': None}
+
+
+@app.route('/metrics/navios', methods=['GET'])
+def get_lote_navios():
+    """
+    Risco, conformidade e clima de vários navios numa única resposta, para as páginas de navio
+    abertas juntas: ?ship=A&ship=B (ou ?ship=A,B), ?metricas=risco,conformidade,clima (padrão:
+    todas) e a janela from/to. As tabelas da frota são obtidas uma vez e fatiadas por navio pelo
+    índice; o clima de todos os navios entra de uma vez no pool das tarefas (compartilhando
+    downloads em andamento com /metrics/clima_navio e /tarefas/clima) e é aguardado por até
+    CLIMA_ESPERA_S no total. Navios cujo clima ainda não terminou vão para uma tarefa
+    (/tarefas/<id>, em 'clima_pendente') e a resposta, com o restante já preenchido, é 202.
+    """
+    analytics = check_analytics_ready('eventos')
+    navios = list(dict.fromkeys(n.strip() for valor in request.args.getlist('ship')
+                                for n in valor.split(',') if n.strip()))
+    if not navios:
+        abort(400, description="Informe ao menos um navio em ?ship=.")
+    if len(navios) > MAX_NAVIOS_POR_LOTE:
+        abort(400, description=f"No máximo {MAX_NAVIOS_POR_LOTE} navios por lote.")
+    metricas = list(dict.fromkeys(m.strip() for m in request.args.get('metricas', ','.join(METRICAS_LOTE)).split(',')
+                                  if m.strip()))
+    desconhecidas = [m for m in metricas if m not in METRICAS_LOTE]
+    if desconhecidas or not metricas:
+        abort(400, description=f"Métricas desconhecidas: {', '.join(desconhecidas)} (use {', '.join(METRICAS_LOTE)}).")
+    inicio, fim = request.args.get('from'), request.args.get('to')
+
+    # Trabalho da frota, feito uma vez para o lote: conformidade pré-calculada e risco materializado
+    tabelas = {}
+    if 'risco' in metricas or 'conformidade' in metricas:
+        df_conformidade = conformidade_calculada()
+        if 'risco' in metricas:
+            tabelas['risco'] = analytics.calcular_risco_bioincrustacao_frota(df_conformidade)
+        if 'conformidade' in metricas:
+            tabelas['conformidade'] = df_conformidade
+
+    # Clima: todos os navios são submetidos antes de esperar qualquer um, com um prazo único para o lote
+    climas: Dict[str, Any] = {}
+    tarefa_pendente = None
+    if 'clima' in metricas:
+        execucoes = {navio: tarefas.executar('clima', navio) for navio in navios}
+        wait([e.future for e in execucoes.values()], timeout=CLIMA_ESPERA_S)
+        for navio, execucao in execucoes.items():
+            if execucao.future.done():
+                erro = execucao.future.exception()
+                climas[navio] = erro if erro is not None else execucao.future.result()
+        pendentes = [navio for navio in navios if navio not in climas]
+        if pendentes:
+            tarefa_pendente = tarefas.submeter('clima', pendentes)
+
+    def construir_payload():
+        dados, linhas = {}, 0
+        for navio in navios:
+            item = {}
+            for metrica, df in tabelas.items():
+                df_navio = analytics.consultar_tabela(METRICAS_LOTE[metrica], df, 'Mês/Ano', navio, inicio, fim)
+                item[metrica] = _registros(df_navio, 'Mês/Ano')
+                linhas += len(df_navio)
+            if tarefa_pendente is not None and navio in tarefa_pendente.execucoes:
+                item['clima'], item['tarefa_clima'] = None, f"/tarefas/{tarefa_pendente.id}"
+            elif navio in climas:
+                clima = climas[navio]
+                if isinstance(clima, Exception):
+                    item['clima'], item['erro_clima'] = None, f"{type(clima).__name__}: {clima}"
+                else:
+                    df_janela = _janela_clima(clima, inicio, fim) if not clima.empty else clima
+                    item['clima'] = _registros_clima(df_janela) if not df_janela.empty else []
+                    linhas += len(df_janela)
+            dados[navio] = item
+        _anotar_linhas(linhas)
+        payload = {"metrica": "lote_navios", "metricas": metricas, "janela": {"from": inicio, "to": fim},
+                   "navios": dados}
+        if tarefa_pendente is not None:
+            payload["clima_pendente"] = {"tarefa": tarefa_pendente.id, "url": f"/tarefas/{tarefa_pendente.id}",
+                                         "navios": list(tarefa_pendente.execucoes)}
+        return payload
+
+    if tarefa_pendente is not None:
+        # Resposta parcial: não vai para o cache de respostas (o próximo pedido traz o clima pronto)
+        resposta = _json(construir_payload())
+        resposta.status_code = 202
+        resposta.headers['Location'] = f"/tarefas/{tarefa_pendente.id}"
+        resposta.headers['Retry-After'] = str(RETRY_AFTER_CARGA_S)
+        return resposta
+
+    chave = ('lote_navios', tuple(navios), tuple(metricas), inicio, fim)
+    return responder_metrica(chave, tuple(tabelas.values()) + tuple(climas.values()), construir_payload)
+
+
+# --- EXPORTAÇÃO EM FLUXO ---
+
+@app.route('/export/<string:tabela>', methods=['GET'])
+def get_export(tabela):
+    """
+    Tabela completa em NDJSON (padrão) ou CSV (?formato=csv), enviada em blocos à medida que é
+    serializada: a memória não cresce com o histórico e o cliente começa a ler no primeiro bloco.
+    Tabelas: conformidade_normam, risco_bioincrustacao_frota, navegacao_diaria (?agrupar_por=),
+    consumo_mensal e clima_navio (série horária; exige ship; 202 com a tarefa enquanto o download
+    não termina, como em /metrics/clima_navio). Filtros: ship, from, to.
+    """
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in FORMATOS_EXPORTACAO:
+        abort(400, description=f"Formato desconhecido: {formato} (use {', '.join(FORMATOS_EXPORTACAO)}).")
+
+    df = _tabela_exportacao(tabela)
+    _anotar_linhas(len(df))
+    mimetype, extensao = FORMATOS_EXPORTACAO[formato]
+    partes = blocos_exportacao(df, formato)
+    usar_gzip = 'gzip' in request.accept_encodings
+    resposta = Response(comprimir_gzip(partes) if usar_gzip else partes, mimetype=mimetype)
+    if usar_gzip:
+        resposta.headers['Content-Encoding'] = 'gzip'
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{tabela}.{extensao}"'
+    return resposta
+
+
+def _tabela_exportacao(tabela: str) -> pd.DataFrame:
+    """DataFrame (já materializado) de uma tabela exportável, com os filtros ship/from/to aplicados."""
+    navio, inicio, fim = request.args.get('ship'), request.args.get('from'), request.args.get('to')
+
+    if tabela == 'clima_navio':
+        check_analytics_ready('eventos')
+        if not navio:
+            abort(400, description="Informe o navio em ?ship= para exportar o clima.")
+        df = _aguardar_clima(navio, CLIMA_ESPERA_S)
+        if df is None:
+            # Download ainda em andamento: o fluxo só começa com a série completa
+            abort(_tarefa_aceita(tarefas.submeter('clima', [navio.strip()])))
+        if df.empty:
+            abort(404, description=f"Dados climáticos não encontrados ou erro na API para {navio}.")
+        return _janela_clima(df, inicio, fim)
+
+    if tabela == 'conformidade_normam':
+        analytics = check_analytics_ready()
+        df, coluna_tempo = conformidade_calculada(), 'Mês/Ano'
+    elif tabela == 'risco_bioincrustacao_frota':
+        analytics = check_analytics_ready('eventos')
+        df, coluna_tempo = analytics.calcular_risco_bioincrustacao_frota(conformidade_calculada()), 'Mês/Ano'
+    elif tabela == 'navegacao_diaria':
+        analytics = check_analytics_ready('eventos', 'revestimento')
+        try:
+            df = analytics.calcular_embarcacoes_navegando_por_dia(request.args.get('agrupar_por'))
+        except ValueError as e:
+            abort(400, description=str(e))
+        coluna_tempo = 'Data'
+    elif tabela == 'consumo_mensal':
+        analytics = check_analytics_ready('consolidado')
+        df, coluna_tempo = analytics.calcular_consumo_mensal_total(), 'Mês/Ano'
+    else:
+        abort(404, description=f"Tabela de exportação desconhecida: {tabela}")
+
+    if navio is None and inicio is None and fim is None:
+        return df
+    try:
+        return analytics.consultar_tabela(tabela, df, coluna_tempo, navio, inicio, fim)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+
+# --- INGESTÃO INCREMENTAL ---
+
+@app.route('/ingestao/<string:tabela>', methods=['POST'])
+def post_ingestao(tabela):
+    """Acrescenta registros (lista JSON) de 'eventos' ou 'consumo' sem recarregar a base."""
+    check_analytics_ready('eventos', 'consumo', 'consolidado')
+
+    registros = request.get_json(silent=True)
+    if not isinstance(registros, list):
+        abort(400, description="Envie uma lista JSON de registros.")
+
+    if tabela not in ('eventos', 'consumo'):
+        abort(404, description=f"Tabela de ingestão desconhecida: {tabela}")
+
+    df_novos = pd.DataFrame.from_records(registros)
+    try:
+        with _alterando_dataset() as analytics:
+            if tabela == 'eventos':
+                resumo = analytics.ingerir_eventos(df_novos)
+                novas = resumo['eventos_novos']
+            else:
+                resumo = analytics.ingerir_consumo(df_novos)
+                novas = resumo['linhas_consumo_novas']
+            if novas:
+                _persistir_lote(analytics, tabela, df_novos)
+    except KeyError as e:
+        abort(400, description=f"Coluna obrigatória ausente: {e}")
+
+    return _json({"tabela": tabela, **resumo})
+
+
+def _persistir_lote(analytics: TranspetroAnalytics, tabela: str, df_novos: pd.DataFrame) -> None:
+    """
+    Grava o lote aceito como CSV na pasta de ingestão, já marcado como ingerido nesta instância:
+    uma recarga por mudança das fontes relê CSVs e pasta e, assim, não perde o que chegou pela API.
+    """
+    os.makedirs(INGESTAO_DIR, exist_ok=True)
+    destino = os.path.join(INGESTAO_DIR, f"api-{time.time_ns()}-{os.getpid()}-{tabela}.csv")
+    df_novos.to_csv(destino + '.tmp', index=False)
+    os.replace(destino + '.tmp', destino)
+    analytics.registrar_arquivo_ingerido(destino)
+
+
+# --- PRONTIDÃO ---
+
+@app.route('/prontidao', methods=['GET'])
+def get_prontidao():
+    """
+    Prontidão do serviço: 200 quando tudo foi carregado e pré-calculado, 503 enquanto carrega ou se
+    a inicialização falhou. Traz o estado de cada tabela base e das tabelas derivadas, para saber
+    quais rotas já respondem durante a carga.
+    """
+    analytics, df_conformidade = estado_analise()
+    carga = analytics.estado_carga() if analytics is not None else {'tabelas': {}, 'derivadas': []}
+    materializadas = set(carga['derivadas'])
+    resposta = _json({
+        "status": estado_inicializacao,
+        "erro": erro_inicializacao,
+        "tabelas": carga['tabelas'],
+        "derivadas": {
+            "conformidade_normam": estado_inicializacao == 'pronta' or not df_conformidade.empty,
+            "consumo_mensal": 'consumo_mensal' in materializadas,
+            "cubo_consumo": 'cubo_consumo' in materializadas,
+            "risco_bioincrustacao_frota": 'risco_frota' in materializadas,
+        },
+        "materializadas": carga['derivadas'],
+    })
+    if estado_inicializacao != 'pronta':
+        resposta.status_code = 503
+        resposta.headers['Retry-After'] = str(RETRY_AFTER_CARGA_S)
+    return resposta
+
+
+# --- DESEMPENHO ---
 
-    dados = df_clima.to_dict(orient='records')
-    return jsonify({"navio": ship_name, "dados_climaticos": dados})
+@app.route('/metrics/_perf', methods=['GET'])
+def get_perf():
+    """
+    Latência (histograma, p50/p95/p99), linhas e pico de memória por etapa de análise e por rota
+    (fases total, calculo e serializacao), além dos erros registrados nos loaders e dos bytes
+    em memória de cada tabela carregada. ?format=prometheus devolve o texto no formato de exposição do Prometheus.
+    """
+    if request.args.get('format') == 'prometheus':
+        return Response(desempenho.prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    analytics = estado_analise()[0]
+    memoria_tabelas = analytics.relatorio_memoria() if analytics is not None and analytics.pronto() else {}
+    geracao = {k: manifesto_anexado[k] for k in ('geracao', 'publicado_em')} if manifesto_anexado else None
+    atualizacao = {"mes_referencia": mes_referencia, "intervalo_s": ATUALIZACAO_INTERVALO_S, **estado_atualizacao}
+    return jsonify({"medir_memoria": desempenho.medir_memoria, "memoria_tabelas": memoria_tabelas,
+                    "dataset_compartilhado": geracao, "atualizacao": atualizacao, **desempenho.resumo()})
 
 
 # ====================================================================
-# 4. EXECUÇÃO
+# 5. EXECUÇÃO
 # ====================================================================
 
 if __name__ == '__main__':
@@ -0,0 +1,366 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# ==============================================================================
+# CLIENTE ERA5 (OPEN-METEO) COM POOL DE CONEXÕES, PARALELISMO E CACHE EM DISCO
+# ==============================================================================
+
+class ClienteClimaERA5:
+    """
+    Busca séries horárias do arquivo ERA5 da Open-Meteo.
+    O período é dividido em chunks de até 1 ano, baixados em paralelo (com limite) por uma
+    sessão HTTP com pool de conexões e retry/backoff. Chunks já consolidados no ERA5 são
+    gravados em disco, chaveados por (lat, lon arredondadas, chunk, variáveis).
+    Para a frota, `buscar_grade` baixa células da grade ERA5 dia a dia, várias por requisição.
+    """
+
+    API_URL = "https://archive-api.open-meteo.com/v1/era5"
+    API_START_LIMIT = date(2022, 1, 1)
+    API_MAX_CHUNK_DAYS = 365
+    VARIAVEIS_PADRAO = 'temperature_2m,apparent_temperature'
+    TIMEZONE = 'America/Sao_Paulo'
+    # O ERA5 é publicado com ~5 dias de atraso; chunks mais recentes que isso podem mudar.
+    ATRASO_ERA5_DIAS = 7
+    RESOLUCAO_GRADE = 0.25  # graus: posições na mesma célula recebem a mesma série
+    MAX_LOCAIS_POR_REQUISICAO = 50  # a API aceita listas de coordenadas separadas por vírgula
+    TIMEZONE_GRADE = 'GMT'  # a grade é cruzada com os horários GMT dos eventos
+
+    def __init__(self, api_url: str = API_URL, cache_dir: Optional[str] = None, max_paralelo: int = 4,
+                 timeout: float = 30, tentativas: int = 3, backoff: float = 0.5, casas_decimais: int = 2):
+        self.api_url = api_url
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.casas_decimais = casas_decimais
+        self.requisicoes = 0  # chamadas HTTP feitas (cache em disco não conta)
+        self._lock_contador = threading.Lock()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        retry = Retry(total=tentativas, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=max_paralelo, pool_maxsize=max_paralelo, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix='clima')
+
+    # --- API PÚBLICA ---
+
+    def buscar(self, latitude: float, longitude: float, inicio: date, fim: date,
+               variaveis: str = VARIAVEIS_PADRAO,
+               progresso: Optional[Callable[[int, int], None]] = None) -> pd.DataFrame:
+        """
+        Série horária entre `inicio` e `fim` (inclusive) para o ponto informado.
+        `progresso(feitos, total)` é chamado a cada chunk concluído (na ordem dos chunks).
+        """
+        inicio = max(inicio, self.API_START_LIMIT)
+        if inicio > fim:
+            return pd.DataFrame()
+
+        latitude = round(float(latitude), self.casas_decimais)
+        longitude = round(float(longitude), self.casas_decimais)
+
+        chunks = self.dividir_em_chunks(inicio, fim)
+        resultados = self._executor.map(
+            lambda chunk: self._buscar_chunk(latitude, longitude, chunk[0], chunk[1], variaveis), chunks)
+        all_clima_data = []
+        for feitos, df in enumerate(resultados, start=1):
+            if df is not None and not df.empty:
+                all_clima_data.append(df)
+            if progresso is not None:
+                progresso(feitos, len(chunks))
+
+        if not all_clima_data:
+            return pd.DataFrame()
+
+        df_final = pd.concat(all_clima_data, ignore_index=True)
+        df_final.rename(columns={'time': 'DataHoraGMT'}, inplace=True)
+        df_final['DataHoraGMT'] = pd.to_datetime(df_final['DataHoraGMT'])
+        return df_final
+
+    def buscar_grade(self, pedidos: pd.DataFrame, variaveis: str = VARIAVEIS_PADRAO,
+                     progresso: Optional[Callable[[int, int], None]] = None) -> pd.DataFrame:
+        """
+        Séries horárias (GMT) de células da grade em dias específicos. `pedidos` tem colunas
+        latitude, longitude (centros de célula, ver `celula_grade`) e dia; repetições são descartadas.
+        As células de um mesmo dia vão juntas, até MAX_LOCAIS_POR_REQUISICAO por requisição, e o
+        cache em disco guarda um arquivo por dia com todas as células já baixadas.
+        `progresso(feitos, total)` é chamado a cada dia concluído.
+        """
+        dias = pd.to_datetime(pedidos['dia']).dt.normalize()
+        no_arquivo = (dias >= pd.Timestamp(self.API_START_LIMIT)) & (dias <= pd.Timestamp(date.today()))
+        pedidos = pd.DataFrame({'latitude': pedidos['latitude'], 'longitude': pedidos['longitude'],
+                                'dia': dias})[no_arquivo].drop_duplicates()
+        grupos = [(dia.date(), grupo[['latitude', 'longitude']].to_numpy())
+                  for dia, grupo in pedidos.groupby('dia', sort=True)]
+
+        resultados = self._executor.map(lambda grupo: self._buscar_dia_grade(*grupo, variaveis), grupos)
+        partes = []
+        for feitos, df in enumerate(resultados, start=1):
+            if not df.empty:
+                partes.append(df)
+            if progresso is not None:
+                progresso(feitos, len(grupos))
+
+        if not partes:
+            return pd.DataFrame()
+        df_final = pd.concat(partes, ignore_index=True)
+        df_final.rename(columns={'time': 'DataHoraGMT'}, inplace=True)
+        df_final['DataHoraGMT'] = pd.to_datetime(df_final['DataHoraGMT'], format='ISO8601')
+        return df_final
+
+    @classmethod
+    def celula_grade(cls, coordenadas) -> np.ndarray:
+        """Centro da célula da grade (múltiplo de RESOLUCAO_GRADE) mais próximo de cada coordenada."""
+        valores = np.asarray(coordenadas, dtype=np.float64)
+        return np.round(np.round(valores / cls.RESOLUCAO_GRADE) * cls.RESOLUCAO_GRADE, 2)
+
+    @classmethod
+    def dividir_em_chunks(cls, inicio: date, fim: date) -> List[Tuple[date, date]]:
+        chunks = []
+        current_start = inicio
+        while current_start <= fim:
+            chunk_end = min(current_start + timedelta(days=cls.API_MAX_CHUNK_DAYS - 1), fim)
+            chunks.append((current_start, chunk_end))
+            current_start = chunk_end + timedelta(days=1)
+        return chunks
+
+    def fechar(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    # --- DOWNLOAD / CACHE DE UM CHUNK ---
+
+    def _buscar_chunk(self, latitude: float, longitude: float, inicio: date, fim: date,
+                      variaveis: str) -> Optional[pd.DataFrame]:
+        caminho_cache = self._caminho_cache(latitude, longitude, inicio, fim, variaveis)
+        hourly = self._ler_cache(caminho_cache)
+
+        if hourly is None:
+            params = {
+                'latitude': latitude,
+                'longitude': longitude,
+                'hourly': variaveis,
+                'timezone': self.TIMEZONE,
+                'start_date': inicio.strftime('%Y-%m-%d'),
+                'end_date': fim.strftime('%Y-%m-%d')
+            }
+            try:
+                data = self._requisitar(params)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"  -> [clima] Falha ao baixar {inicio}..{fim} ({latitude}, {longitude}): {e}")
+                return None
+
+            hourly = data.get('hourly')
+            if hourly is None:
+                return None
+
+            if fim < date.today() - timedelta(days=self.ATRASO_ERA5_DIAS):
+                self._gravar_cache(caminho_cache, hourly)
+
+        return pd.DataFrame(hourly)
+
+    def _buscar_dia_grade(self, dia: date, coordenadas: np.ndarray, variaveis: str) -> pd.DataFrame:
+        caminho_cache = self._caminho_cache_grade(dia, variaveis)
+        por_celula: Dict[str, dict] = self._ler_cache(caminho_cache) or {}
+        chaves = [f"{lat:.2f}_{lon:.2f}" for lat, lon in coordenadas]
+
+        faltantes = [(chave, lat, lon) for chave, (lat, lon) in zip(chaves, coordenadas) if chave not in por_celula]
+        baixou = False
+        for i in range(0, len(faltantes), self.MAX_LOCAIS_POR_REQUISICAO):
+            lote = faltantes[i:i + self.MAX_LOCAIS_POR_REQUISICAO]
+            params = {
+                'latitude': ','.join(f"{lat:.2f}" for _, lat, _ in lote),
+                'longitude': ','.join(f"{lon:.2f}" for _, _, lon in lote),
+                'hourly': variaveis,
+                'timezone': self.TIMEZONE_GRADE,
+                'start_date': dia.strftime('%Y-%m-%d'),
+                'end_date': dia.strftime('%Y-%m-%d')
+            }
+            try:
+                data = self._requisitar(params)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"  -> [clima] Falha ao baixar {dia} ({len(lote)} células): {e}")
+                continue
+            # Uma coordenada: objeto; várias: lista na ordem pedida
+            respostas = data if isinstance(data, list) else [data]
+            for (chave, _, _), resposta in zip(lote, respostas):
+                if isinstance(resposta, dict) and resposta.get('hourly') is not None:
+                    por_celula[chave] = resposta['hourly']
+                    baixou = True
+
+        if baixou and dia < date.today() - timedelta(days=self.ATRASO_ERA5_DIAS):
+            self._gravar_cache(caminho_cache, por_celula)
+
+        # Monta as colunas do dia de uma vez (um DataFrame por célula seria o gargalo com milhares delas)
+        nomes = ['time'] + variaveis.split(',')
+        colunas: Dict[str, list] = {nome: [] for nome in nomes}
+        horas_por_celula = np.zeros(len(chaves), dtype=np.int64)
+        for i, chave in enumerate(chaves):
+            hourly = por_celula.get(chave)
+            if not hourly or not hourly.get('time'):
+                continue
+            horas_por_celula[i] = n = len(hourly['time'])
+            for nome in nomes:
+                colunas[nome].extend(hourly.get(nome) or [None] * n)
+        if not horas_por_celula.any():
+            return pd.DataFrame()
+        df = pd.DataFrame({'latitude': np.repeat(coordenadas[:, 0], horas_por_celula),
+                           'longitude': np.repeat(coordenadas[:, 1], horas_por_celula),
+                           'time': colunas.pop('time')})
+        for nome, valores in colunas.items():
+            df[nome] = np.array(valores, dtype=np.float64)  # None -> NaN
+        return df
+
+    def _requisitar(self, params: dict):
+        with self._lock_contador:
+            self.requisicoes += 1
+        response = self.session.get(self.api_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _caminho_cache_grade(self, dia: date, variaveis: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        assinatura = hashlib.sha1(f"{self.api_url}|{variaveis}|{self.TIMEZONE_GRADE}".encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"grade_{dia}_{assinatura}.json")
+
+    def _caminho_cache(self, latitude: float, longitude: float, inicio: date, fim: date,
+                       variaveis: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        assinatura = hashlib.sha1(f"{self.api_url}|{variaveis}|{self.TIMEZONE}".encode()).hexdigest()[:12]
+        nome = f"{latitude:.{self.casas_decimais}f}_{longitude:.{self.casas_decimais}f}_{inicio}_{fim}_{assinatura}.json"
+        return os.path.join(self.cache_dir, nome)
+
+    @staticmethod
+    def _ler_cache(caminho: Optional[str]) -> Optional[dict]:
+        if caminho is None or not os.path.exists(caminho):
+            return None
+        try:
+            with open(caminho, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _gravar_cache(caminho: Optional[str], hourly: dict) -> None:
+        if caminho is None:
+            return
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(hourly, f)
+        os.replace(temporario, caminho)
+
+
+# ==============================================================================
+# CLIMA DA FROTA AO LONGO DAS ROTAS (CÉLULAS DA GRADE x DIAS)
+# ==============================================================================
+
+def rotas_em_celulas(eventos: pd.DataFrame) -> pd.DataFrame:
+    """
+    Trechos da rota de cada navio: do início de um evento até o início do seguinte (o último vai
+    até o maior endGMTDate do navio), na célula da grade da última posição conhecida até ali.
+    `eventos` precisa de shipName (já normalizado), startGMTDate, endGMTDate, decLatitude e decLongitude.
+    """
+    df = eventos.dropna(subset=['startGMTDate']).sort_values(['shipName', 'startGMTDate'], kind='mergesort')
+    navio = df['shipName'].to_numpy()
+    inicio = df['startGMTDate'].to_numpy(dtype='datetime64[ns]')
+
+    mesmo_navio_depois = np.zeros(len(df), dtype=bool)
+    mesmo_navio_depois[:-1] = navio[1:] == navio[:-1]
+    fim_navio = df.groupby('shipName', sort=False)['endGMTDate'].transform('max').to_numpy(dtype='datetime64[ns]')
+    fim = np.where(mesmo_navio_depois, np.roll(inicio, -1), fim_navio)
+
+    # Evento sem posição: o navio continua na última posição conhecida
+    posicoes = df.groupby('shipName', sort=False)[['decLatitude', 'decLongitude']].ffill()
+    trechos = pd.DataFrame({
+        'shipName': navio,
+        'inicio': inicio,
+        'fim': fim,
+        'latitude': ClienteClimaERA5.celula_grade(posicoes['decLatitude']),
+        'longitude': ClienteClimaERA5.celula_grade(posicoes['decLongitude']),
+    })
+    return trechos[(trechos['fim'] > trechos['inicio']) & trechos['latitude'].notna()
+                   & trechos['longitude'].notna()].reset_index(drop=True)
+
+
+def dias_por_celula(trechos: pd.DataFrame) -> pd.DataFrame:
+    """Pares (célula, dia GMT) cobertos pelos trechos de todos os navios, sem repetição."""
+    dia_inicio = trechos['inicio'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    # fim é exclusivo: um trecho que termina à meia-noite não usa o dia seguinte
+    dia_fim = (trechos['fim'].to_numpy(dtype='datetime64[ns]') - np.timedelta64(1, 'ns')) \
+        .astype('datetime64[D]').astype(np.int64)
+    n = np.maximum(dia_fim - dia_inicio + 1, 0)
+    deslocamento = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    pedidos = pd.DataFrame({
+        'latitude': np.repeat(trechos['latitude'].to_numpy(), n),
+        'longitude': np.repeat(trechos['longitude'].to_numpy(), n),
+        'dia': (np.repeat(dia_inicio, n) + deslocamento).astype('datetime64[D]').astype('datetime64[ns]'),
+    })
+    return pedidos.drop_duplicates(ignore_index=True)
+
+
+def clima_nas_rotas(trechos: pd.DataFrame, df_clima: pd.DataFrame, variaveis: List[str]) -> pd.DataFrame:
+    """
+    Junta o clima horário da grade à rota de cada navio: cada hora recebe a célula do trecho em
+    andamento (as-of: o último evento iniciado até aquela hora) e o clima dessa célula nessa hora.
+    Horas sem clima baixado ficam de fora. Colunas: shipName, DataHoraGMT, latitude, longitude
+    (centro da célula) e `variaveis`.
+    """
+    if trechos.empty or df_clima.empty:
+        return pd.DataFrame()
+
+    # Horas inteiras de cada trecho, em [inicio, fim)
+    hora_inicio = -((-trechos['inicio'].to_numpy(dtype='datetime64[ns]').astype(np.int64)) // _HORA_NS)
+    hora_fim = -((-trechos['fim'].to_numpy(dtype='datetime64[ns]').astype(np.int64)) // _HORA_NS)
+    n = np.maximum(hora_fim - hora_inicio, 0)
+    deslocamento = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    hora = np.repeat(hora_inicio, n) + deslocamento
+    linha_trecho = np.repeat(np.arange(len(trechos)), n)
+
+    chave_clima = _chave_celula_hora(df_clima['latitude'].to_numpy(), df_clima['longitude'].to_numpy(),
+                                     df_clima['DataHoraGMT'].to_numpy(dtype='datetime64[ns]').astype(np.int64) // _HORA_NS)
+    chaves, primeira_linha = np.unique(chave_clima, return_index=True)
+    latitude = trechos['latitude'].to_numpy()[linha_trecho]
+    longitude = trechos['longitude'].to_numpy()[linha_trecho]
+    procuradas = _chave_celula_hora(latitude, longitude, hora)
+    i = np.minimum(np.searchsorted(chaves, procuradas), len(chaves) - 1)
+    tem_clima = chaves[i] == procuradas
+    linhas_clima = primeira_linha[i[tem_clima]]
+
+    navios = pd.Categorical(trechos['shipName'].to_numpy())
+    resultado = pd.DataFrame({
+        'shipName': pd.Categorical.from_codes(navios.codes[linha_trecho[tem_clima]], navios.categories),
+        'DataHoraGMT': (hora[tem_clima] * _HORA_NS).astype('datetime64[ns]'),
+        'latitude': latitude[tem_clima],
+        'longitude': longitude[tem_clima],
+    })
+    for variavel in variaveis:
+        if variavel in df_clima.columns:
+            resultado[variavel] = pd.to_numeric(df_clima[variavel], errors='coerce').to_numpy()[linhas_clima]
+    return resultado
+
+
+_HORA_NS = 3_600_000_000_000
+
+
+def _chave_celula_hora(latitude: np.ndarray, longitude: np.ndarray, hora: np.ndarray) -> np.ndarray:
+    """Chave inteira única de (célula, hora): índices da grade em 0,25° e horas desde 1970 (< 2^24)."""
+    i = np.round((np.asarray(latitude, dtype=np.float64) + 90) / ClienteClimaERA5.RESOLUCAO_GRADE).astype(np.int64)
+    j = np.round((np.asarray(longitude, dtype=np.float64) + 180) / ClienteClimaERA5.RESOLUCAO_GRADE).astype(np.int64)
+    return ((i * 1441 + j) << 24) | hora
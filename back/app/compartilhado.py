@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from snapshot import SnapshotCache
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow é opcional: sem ele cada processo carrega a própria cópia
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem gunicorn, há um único processo e o lock é dispensável
+    fcntl = None
+
+
+# ==============================================================================
+# DATASET SOMENTE LEITURA COMPARTILHADO ENTRE PROCESSOS (ARROW IPC + MEMORY-MAP)
+# ==============================================================================
+
+class DatasetCompartilhado:
+    """
+    Tabelas base e pré-calculadas publicadas uma vez em arquivos Arrow IPC sem compressão,
+    para que vários processos (workers do gunicorn) as mapeiem em memória sem cópia:
+    as páginas ficam no cache do sistema operacional e são compartilhadas entre os workers.
+
+    Cada publicação é uma geração em um subdiretório próprio; o manifesto que aponta para a
+    geração atual é trocado atomicamente (os.replace), então um leitor nunca vê uma geração
+    pela metade. Datas são gravadas sem bitmap de nulos (NaT fica como valor sentinela) e
+    textos como strings Arrow, o que mantém numéricos, datas, códigos de categorias e os
+    próprios textos sem cópia.
+    """
+
+    VERSAO_FORMATO = 2
+    ARQUIVO_MANIFESTO = 'manifesto.json'
+    ARQUIVO_LOCK = '.lock'
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    @property
+    def ativo(self) -> bool:
+        return pa is not None
+
+    @contextmanager
+    def bloqueio(self):
+        """Lock exclusivo entre processos (carga inicial e publicação de novas gerações)."""
+        with open(os.path.join(self.diretorio, self.ARQUIVO_LOCK), 'a+') as arquivo:
+            if fcntl is not None:
+                fcntl.flock(arquivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+    # --- MANIFESTO ---
+
+    def manifesto(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.diretorio, self.ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def assinatura(self) -> Optional[int]:
+        """mtime do manifesto: comparação barata para saber se outra geração foi publicada."""
+        try:
+            return os.stat(os.path.join(self.diretorio, self.ARQUIVO_MANIFESTO)).st_mtime_ns
+        except OSError:
+            return None
+
+    # --- PUBLICAÇÃO / ANEXAÇÃO ---
+
+    def publicar(self, tabelas: Dict[str, pd.DataFrame], fontes: List[str], chave_fontes: Optional[List[Dict]] = None,
+                 **extras: Any) -> Dict[str, Any]:
+        """
+        Grava `tabelas` como uma nova geração e a torna a atual. `extras` vão para o manifesto.
+        `chave_fontes` é a assinatura das fontes efetivamente lidas (padrão: a dos arquivos agora).
+        """
+        anterior = self.manifesto()
+        geracao = (anterior['geracao'] + 1) if anterior else 1
+        pasta = os.path.join(self.diretorio, f'g{geracao:06d}')
+        os.makedirs(pasta, exist_ok=True)
+
+        arquivos = {}
+        for nome, df in tabelas.items():
+            tabela = _para_arrow(df)
+            arquivos[nome] = os.path.join(os.path.basename(pasta), nome + '.arrow')
+            with pa.OSFile(os.path.join(self.diretorio, arquivos[nome]), 'wb') as saida:
+                with ipc.new_file(saida, tabela.schema) as escritor:
+                    escritor.write_table(tabela)
+
+        manifesto = {
+            'versao': self.VERSAO_FORMATO,
+            'geracao': geracao,
+            'publicado_em': time.time(),
+            'fontes': chave_fontes if chave_fontes is not None else SnapshotCache.chave_fontes(fontes),
+            'tabelas': arquivos,
+            **extras,
+        }
+        destino = os.path.join(self.diretorio, self.ARQUIVO_MANIFESTO)
+        with open(destino + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+        os.replace(destino + '.tmp', destino)
+
+        self._remover_geracoes_antigas(manter={geracao, geracao - 1})
+        return manifesto
+
+    def anexar(self, fontes: Optional[List[str]] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, pd.DataFrame]]]:
+        """
+        (manifesto, tabelas) da geração atual, mapeadas em memória; None se não houver publicação
+        válida (formato antigo ou, com `fontes`, arquivos de origem diferentes dos publicados).
+        """
+        if not self.ativo:
+            return None
+        manifesto = self.manifesto()
+        if manifesto is None or manifesto.get('versao') != self.VERSAO_FORMATO:
+            return None
+        if fontes is not None and manifesto.get('fontes') != SnapshotCache.chave_fontes(fontes):
+            return None
+
+        try:
+            tabelas = {
+                nome: _de_arrow(ipc.open_file(pa.memory_map(os.path.join(self.diretorio, arquivo))).read_all())
+                for nome, arquivo in manifesto['tabelas'].items()
+            }
+        except (OSError, pa.ArrowException):
+            # Geração removida entre a leitura do manifesto e a abertura: o chamador tenta de novo
+            return None
+        return manifesto, tabelas
+
+    def _remover_geracoes_antigas(self, manter: set) -> None:
+        # Processos que ainda mapeiam uma geração removida continuam lendo (POSIX mantém o inode)
+        for nome in os.listdir(self.diretorio):
+            if nome.startswith('g') and nome[1:].isdigit() and int(nome[1:]) not in manter:
+                shutil.rmtree(os.path.join(self.diretorio, nome), ignore_errors=True)
+
+
+# --- CONVERSÃO PANDAS <-> ARROW ---
+
+_TIPOS_PANDAS = {pa.string(): pd.ArrowDtype(pa.string())} if pa is not None else {}
+
+def _para_arrow(df: pd.DataFrame) -> "pa.Table":
+    """Tabela Arrow que volta para o pandas sem cópia."""
+    colunas = []
+    for nome in df.columns:
+        serie = df[nome]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            colunas.append(pa.DictionaryArray.from_arrays(
+                pa.array(codigos, mask=codigos < 0), pa.array(serie.cat.categories.to_numpy(), from_pandas=True)))
+        elif serie.dtype.kind == 'M' and serie.dt.tz is None:
+            valores = serie.to_numpy(dtype='datetime64[ns]')
+            colunas.append(pa.Array.from_buffers(pa.timestamp('ns'), len(valores),
+                                                 [None, pa.py_buffer(valores.view(np.int64))]))
+        elif serie.dtype == object:
+            colunas.append(pa.array(serie.to_numpy(), from_pandas=True))
+        elif serie.dtype.kind in 'iuf':
+            colunas.append(pa.array(serie.to_numpy()))  # NaN continua NaN (sem bitmap de nulos)
+        else:
+            colunas.append(pa.array(serie, from_pandas=True))
+    return pa.table(colunas, names=[str(c) for c in df.columns])
+
+
+def _de_arrow(tabela: "pa.Table") -> pd.DataFrame:
+    # Textos viram ArrowDtype(string) sobre os próprios buffers mapeados: nada é copiado por processo,
+    # ao contrário de object, que criaria em cada worker um array de ponteiros para strings Python
+    return tabela.to_pandas(split_blocks=True, types_mapper=_TIPOS_PANDAS.get)
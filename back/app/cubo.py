@@ -0,0 +1,174 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# ==============================================================================
+# CUBO DE CONSUMO (NAVIO x MÊS x COMBUSTÍVEL x TIPO DE EVENTO)
+# ==============================================================================
+
+class CuboConsumo:
+    """
+    Fatos de consumo pré-agregados por (navio, mês, combustível, tipo de evento): consumo,
+    número de sessões e horas em porto/navegando. Montado uma vez a partir de eventos e consumo;
+    os totais por frota, navio, combustível etc. saem do cubo (milhares de linhas, não das bases).
+
+    O combustível tem um membro extra, TODOS: uma sessão com dois combustíveis aparece nas duas
+    linhas por combustível, então sessões e horas só podem ser somadas entre combustíveis pelas
+    linhas TODOS (que incluem também as sessões sem consumo registrado).
+    Cada consulta é calculada uma vez e guardada; o cubo não muda depois de criado.
+    """
+
+    DIMENSOES = {'navio': 'shipName', 'mes': 'Mês/Ano', 'combustivel': 'Combustível', 'evento': 'eventName'}
+    MEDIDAS = ['Consumo Total (unidade)', 'Sessões', 'Horas em Porto', 'Horas Navegando']
+    TODOS = 'TODOS'
+    MAX_CONSULTAS = 256
+
+    def __init__(self, fatos: pd.DataFrame):
+        self.fatos = fatos
+        self._codigos: Dict[str, np.ndarray] = {}
+        self._valores: Dict[str, np.ndarray] = {}
+        for dimensao, coluna in self.DIMENSOES.items():
+            codigos, valores = pd.factorize(fatos[coluna].astype(str) if len(fatos) else fatos[coluna], sort=True)
+            self._codigos[dimensao], self._valores[dimensao] = codigos, np.asarray(valores, dtype=object)
+        self._medidas = {medida: fatos[medida].to_numpy(dtype=np.float64) for medida in self.MEDIDAS}
+        self._por_combustivel = fatos[self.DIMENSOES['combustivel']].to_numpy() != self.TODOS
+        self._consultas: Dict[Tuple, pd.DataFrame] = {}
+
+    def __len__(self) -> int:
+        return len(self.fatos)
+
+    # --- CONSTRUÇÃO ---
+
+    @classmethod
+    def construir(cls, eventos: pd.DataFrame, consumo: pd.DataFrame, contar_eventos: bool = True) -> "CuboConsumo":
+        return cls(fatos_consumo(eventos, consumo, contar_eventos))
+
+    def somar(self, fatos_novos: pd.DataFrame) -> "CuboConsumo":
+        """Novo cubo com `fatos_novos` (ex.: sessões ingeridas) somados às células existentes."""
+        if fatos_novos.empty:
+            return self
+        fatos = (pd.concat([self.fatos, fatos_novos], ignore_index=True)
+                 .groupby(list(self.DIMENSOES.values()), sort=True, as_index=False)[self.MEDIDAS].sum())
+        return CuboConsumo(fatos)
+
+    # --- CONSULTAS ---
+
+    def agregar(self, por: Sequence[str] = (), navio: Optional[str] = None, combustivel: Optional[str] = None,
+                evento: Optional[str] = None, inicio: Optional[str] = None, fim: Optional[str] = None) -> pd.DataFrame:
+        """
+        Totais agrupados pelas dimensões `por` ('navio', 'mes', 'combustivel', 'evento'; vazio = um
+        total geral), com filtros opcionais por valor e por mês (limites 'AAAA-MM' inclusivos;
+        datas completas são reduzidas ao mês). Linhas ordenadas pelas dimensões.
+        """
+        por = tuple(por)
+        desconhecidas = [d for d in por if d not in self.DIMENSOES]
+        if desconhecidas:
+            raise ValueError(f"Dimensões desconhecidas: {', '.join(desconhecidas)} "
+                             f"(use {', '.join(self.DIMENSOES)}).")
+        chave = (por, navio, combustivel, evento, inicio[:7] if inicio else None, fim[:7] if fim else None)
+        resultado = self._consultas.get(chave)
+        if resultado is not None:
+            return resultado
+
+        mascara = self._por_combustivel if ('combustivel' in por or combustivel is not None) \
+            else ~self._por_combustivel
+        for dimensao, valor in (('navio', navio), ('combustivel', combustivel), ('evento', evento)):
+            if valor is not None:
+                mascara = mascara & (self._codigos[dimensao] == self._codigo(dimensao, valor.strip()))
+        meses = self._valores['mes']
+        if chave[4] is not None:
+            mascara = mascara & (self._codigos['mes'] >= np.searchsorted(meses, chave[4], side='left'))
+        if chave[5] is not None:
+            mascara = mascara & (self._codigos['mes'] < np.searchsorted(meses, chave[5], side='right'))
+        linhas = np.flatnonzero(mascara)
+
+        if por:
+            tamanhos = tuple(len(self._valores[d]) for d in por)
+            celula = np.ravel_multi_index(tuple(self._codigos[d][linhas] for d in por), tamanhos)
+            celulas, grupo = np.unique(celula, return_inverse=True)
+            resultado = pd.DataFrame({self.DIMENSOES[d]: self._valores[d][codigos]
+                                      for d, codigos in zip(por, np.unravel_index(celulas, tamanhos))})
+        else:
+            grupo = np.zeros(len(linhas), dtype=np.int64)
+            resultado = pd.DataFrame(index=range(1))
+        n_grupos = len(resultado)
+        for medida in self.MEDIDAS:
+            resultado[medida] = np.bincount(grupo, weights=self._medidas[medida][linhas], minlength=n_grupos)
+        resultado['Sessões'] = resultado['Sessões'].round().astype(np.int64)
+
+        if len(self._consultas) >= self.MAX_CONSULTAS:
+            self._consultas.clear()
+        self._consultas[chave] = resultado
+        return resultado
+
+    def _codigo(self, dimensao: str, valor: str) -> int:
+        valores = self._valores[dimensao]
+        i = np.searchsorted(valores, valor)
+        return int(i) if i < len(valores) and valores[i] == valor else -2  # -2: nenhum código
+
+
+# --- FATOS A PARTIR DAS BASES ---
+
+def fatos_consumo(eventos: pd.DataFrame, consumo: pd.DataFrame, contar_eventos: bool = True) -> pd.DataFrame:
+    """
+    Linhas do cubo para as sessões de `eventos` (sessionId, shipName já normalizado, startGMTDate,
+    eventName, duration; vale o primeiro evento de cada sessão, como na consolidação) com o
+    `consumo` delas (sessionId, consumedQuantity, DESCRIPTION).
+    `contar_eventos=False` é para consumo que chega depois dos eventos já contados: as linhas
+    TODOS recebem só o consumo, sem somar sessões e horas de novo.
+    """
+    dims, medidas = list(CuboConsumo.DIMENSOES.values()), CuboConsumo.MEDIDAS
+    col_navio, col_mes, col_combustivel, col_evento = dims
+    consumo_total, sessoes, horas_porto, horas_navegando = medidas
+
+    ev = eventos.drop_duplicates(subset=['sessionId']).dropna(subset=['startGMTDate'])
+    if ev.empty:
+        return pd.DataFrame(columns=dims + medidas)
+    nome_evento = ev['eventName'].astype(str).to_numpy()
+    duracao = pd.to_numeric(ev['duration'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    base = pd.DataFrame({
+        'sessionId': ev['sessionId'].to_numpy(),
+        col_navio: ev['shipName'].astype(str).to_numpy(),
+        col_mes: _meses(ev['startGMTDate']),
+        col_evento: nome_evento,
+        sessoes: 1.0,
+        horas_porto: np.where(nome_evento == 'EM PORTO', duracao, 0.0),
+        horas_navegando: np.where(nome_evento == 'NAVEGACAO', duracao, 0.0),
+    })
+
+    if consumo.empty:
+        por_combustivel = pd.DataFrame(columns=['sessionId', col_combustivel, consumo_total])
+    else:
+        combustivel = (consumo['DESCRIPTION'].astype(str).str.strip() if 'DESCRIPTION' in consumo.columns
+                       else pd.Series('N/D', index=consumo.index))
+        por_combustivel = (pd.DataFrame({'sessionId': consumo['sessionId'].to_numpy(),
+                                         col_combustivel: combustivel.to_numpy(),
+                                         consumo_total: consumo['consumedQuantity'].to_numpy(dtype=np.float64)})
+                           .groupby(['sessionId', col_combustivel], sort=False, as_index=False)[consumo_total].sum())
+
+    # Nível por combustível: cada sessão conta uma vez em cada combustível que consumiu
+    nivel_combustivel = base.merge(por_combustivel, on='sessionId', how='inner')
+
+    # Nível TODOS: todas as sessões, com o consumo somado entre combustíveis
+    total_sessao = por_combustivel.groupby('sessionId', sort=False)[consumo_total].sum()
+    if contar_eventos:
+        nivel_todos = base.assign(**{consumo_total: base['sessionId'].map(total_sessao).fillna(0.0).to_numpy()})
+    else:
+        nivel_todos = base[base['sessionId'].isin(total_sessao.index)].assign(
+            **{consumo_total: lambda df: df['sessionId'].map(total_sessao).to_numpy(),
+               sessoes: 0.0, horas_porto: 0.0, horas_navegando: 0.0})
+    nivel_todos = nivel_todos.assign(**{col_combustivel: CuboConsumo.TODOS})
+
+    niveis = [nivel for nivel in (nivel_combustivel, nivel_todos) if not nivel.empty]
+    if not niveis:
+        return pd.DataFrame(columns=dims + medidas)
+    return pd.concat(niveis, ignore_index=True).groupby(dims, sort=True, as_index=False)[medidas].sum()
+
+
+def _meses(datas: pd.Series) -> np.ndarray:
+    """'AAAA-MM' de cada data, formatando só os meses distintos."""
+    valores = datas.to_numpy(dtype='datetime64[M]')
+    unicos, posicoes = np.unique(valores, return_inverse=True)
+    return np.asarray([str(m) for m in unicos], dtype=object)[posicoes]
@@ -0,0 +1,282 @@
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+# ==============================================================================
+# INSTRUMENTAÇÃO DE DESEMPENHO (ETAPAS, ROTAS, HISTOGRAMAS E PERFIL POR REQUISIÇÃO)
+# ==============================================================================
+
+# Limites (segundos) dos baldes de latência, no estilo dos histogramas do Prometheus
+LIMITES_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histograma:
+    """Contagem de observações por balde (valor <= limite), soma e máximo."""
+
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_LATENCIA):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # o último balde é o +Inf
+        self.soma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def observar(self, valor: float) -> None:
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+        self.maximo = max(self.maximo, valor)
+
+    def cumulativo(self) -> List[Tuple[str, int]]:
+        """Pares (limite, contagem acumulada), terminando em '+Inf' = total."""
+        acumulado, pares = 0, []
+        for limite, contagem in zip(list(self.limites) + ['+Inf'], self.contagens):
+            acumulado += contagem
+            pares.append((str(limite), acumulado))
+        return pares
+
+    def quantil(self, q: float) -> Optional[float]:
+        """Estimativa pelo limite superior do balde que contém o quantil (o máximo, no balde +Inf)."""
+        if self.total == 0:
+            return None
+        alvo, acumulado = q * self.total, 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(self.limites[i], self.maximo) if i < len(self.limites) else self.maximo
+        return self.maximo
+
+
+class EstatisticaEtapa:
+    """Acumulado de uma etapa (ou fase de rota): latências, últimas linhas, maior pico de memória e erros."""
+
+    def __init__(self):
+        self.latencia = Histograma()
+        self.linhas: Optional[int] = None
+        self.pico_memoria_bytes: Optional[int] = None
+        self.erros = 0
+        self.ultimo_erro: Optional[str] = None
+
+    def resumo(self) -> Dict[str, Any]:
+        h = self.latencia
+        return {
+            'chamadas': h.total,
+            'soma_s': h.soma,
+            'media_s': h.soma / h.total if h.total else None,
+            'max_s': h.maximo if h.total else None,
+            'p50_s': h.quantil(0.5),
+            'p95_s': h.quantil(0.95),
+            'p99_s': h.quantil(0.99),
+            'histograma': dict(h.cumulativo()),
+            'linhas': self.linhas,
+            'pico_memoria_bytes': self.pico_memoria_bytes,
+            'erros': self.erros,
+            'ultimo_erro': self.ultimo_erro,
+        }
+
+
+class Medicao:
+    """Uma execução em andamento de etapa ou rota."""
+
+    def __init__(self, tipo: str, nome: str):
+        self.tipo = tipo
+        self.nome = nome
+        self.linhas: Optional[int] = None
+        self.serializacao = 0.0
+        self.memoria_base = 0
+        self.pico_visto = 0
+        self.inicio = time.perf_counter()
+
+
+class MonitorDesempenho:
+    """
+    Registro em memória de latência, linhas e pico de memória por etapa de TranspetroAnalytics
+    (loaders, consolidação, métricas) e por rota Flask (total, cálculo e serialização).
+    O pico de memória usa tracemalloc e só é medido com `medir_memoria=True`, pois o
+    rastreamento dobra o custo das alocações; com várias threads o pico é o do processo.
+    """
+
+    TIPOS = ('etapa', 'rota')
+
+    def __init__(self, medir_memoria: bool = False):
+        self.medir_memoria = medir_memoria
+        self._estatisticas: Dict[Tuple[str, str, str], EstatisticaEtapa] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if medir_memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # --- MEDIÇÃO ---
+
+    @contextmanager
+    def etapa(self, nome: str, tipo: str = 'etapa'):
+        medicao = self.iniciar(tipo, nome)
+        try:
+            yield medicao
+        except Exception as e:
+            self.encerrar(medicao, erro=e)
+            raise
+        self.encerrar(medicao)
+
+    def iniciar(self, tipo: str, nome: str) -> Medicao:
+        medicao = Medicao(tipo, nome)
+        pilha = self._pilha()
+        if tracemalloc.is_tracing():
+            atual, pico = tracemalloc.get_traced_memory()
+            # O reset do pico é global: guarda o pico visto até aqui nas medições abertas
+            for aberta in pilha:
+                aberta.pico_visto = max(aberta.pico_visto, pico)
+            tracemalloc.reset_peak()
+            medicao.memoria_base = medicao.pico_visto = atual
+        pilha.append(medicao)
+        medicao.inicio = time.perf_counter()
+        return medicao
+
+    def encerrar(self, medicao: Medicao, erro: Optional[BaseException] = None) -> float:
+        duracao = time.perf_counter() - medicao.inicio
+        pilha = self._pilha()
+        if medicao in pilha:
+            pilha.remove(medicao)
+
+        pico = None
+        if tracemalloc.is_tracing():
+            pico_global = max(tracemalloc.get_traced_memory()[1], medicao.pico_visto)
+            pico = pico_global - medicao.memoria_base
+            if pilha:
+                pilha[-1].pico_visto = max(pilha[-1].pico_visto, pico_global)
+
+        if medicao.tipo == 'rota':
+            self._observar(medicao.tipo, medicao.nome, 'serializacao', medicao.serializacao)
+            self._observar(medicao.tipo, medicao.nome, 'calculo', max(duracao - medicao.serializacao, 0.0))
+        self._observar(medicao.tipo, medicao.nome, 'total', duracao, medicao.linhas, pico, erro)
+        return duracao
+
+    @contextmanager
+    def serializacao(self):
+        """Conta o tempo do bloco como serialização da rota em andamento nesta thread."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            rotas = [m for m in self._pilha() if m.tipo == 'rota']
+            if rotas:
+                rotas[-1].serializacao += time.perf_counter() - inicio
+
+    def registrar_erro(self, nome: Optional[str], erro: BaseException, tipo: str = 'etapa') -> None:
+        """
+        Erros tratados dentro de uma etapa (ex.: loaders que devolvem DataFrame vazio).
+        Sem `nome`, o erro é atribuído à etapa mais interna em andamento nesta thread.
+        """
+        if nome is None:
+            abertas = [m for m in self._pilha() if m.tipo == tipo]
+            nome = abertas[-1].nome if abertas else 'sem_etapa'
+        with self._lock:
+            estatistica = self._estatisticas.setdefault((tipo, nome, 'total'), EstatisticaEtapa())
+            estatistica.erros += 1
+            estatistica.ultimo_erro = f"{type(erro).__name__}: {erro}"
+
+    def _observar(self, tipo: str, nome: str, fase: str, duracao: float, linhas: Optional[int] = None,
+                  pico: Optional[int] = None, erro: Optional[BaseException] = None) -> None:
+        with self._lock:
+            estatistica = self._estatisticas.setdefault((tipo, nome, fase), EstatisticaEtapa())
+            estatistica.latencia.observar(duracao)
+            if linhas is not None:
+                estatistica.linhas = linhas
+            if pico is not None:
+                estatistica.pico_memoria_bytes = max(estatistica.pico_memoria_bytes or 0, pico)
+            if erro is not None:
+                estatistica.erros += 1
+                estatistica.ultimo_erro = f"{type(erro).__name__}: {erro}"
+
+    def _pilha(self) -> List[Medicao]:
+        if not hasattr(self._local, 'pilha'):
+            self._local.pilha = []
+        return self._local.pilha
+
+    # --- EXPORTAÇÃO ---
+
+    def resumo(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Estatísticas agrupadas por tipo: {'etapas': [...], 'rotas': [...]}, em ordem de primeira execução."""
+        with self._lock:
+            itens = [(chave, estatistica.resumo()) for chave, estatistica in self._estatisticas.items()]
+        resultado = {f'{tipo}s': [] for tipo in self.TIPOS}
+        for (tipo, nome, fase), dados in itens:
+            resultado[f'{tipo}s'].append({'nome': nome, 'fase': fase, **dados})
+        return resultado
+
+    def prometheus(self, prefixo: str = 'transpetro') -> str:
+        """Texto no formato de exposição do Prometheus (version 0.0.4)."""
+        with self._lock:
+            itens = [(chave, estatistica.resumo(), estatistica.latencia.cumulativo())
+                     for chave, estatistica in self._estatisticas.items()]
+
+        metricas = {
+            'etapa': (f'{prefixo}_etapa', 'etapa', 'Etapas de carga e cálculo de TranspetroAnalytics'),
+            'rota': (f'{prefixo}_http', 'rota', 'Rotas HTTP (fases: total, calculo, serializacao)'),
+        }
+        linhas = []
+        for tipo, (base, rotulo, descricao) in metricas.items():
+            do_tipo = [item for item in itens if item[0][0] == tipo]
+            if not do_tipo:
+                continue
+
+            linhas += [f'# HELP {base}_duracao_segundos {descricao}.', f'# TYPE {base}_duracao_segundos histogram']
+            for (_, nome, fase), dados, cumulativo in do_tipo:
+                rotulos = f'{rotulo}="{_escapar(nome)}",fase="{fase}"'
+                linhas += [f'{base}_duracao_segundos_bucket{{{rotulos},le="{le}"}} {n}' for le, n in cumulativo]
+                linhas.append(f'{base}_duracao_segundos_sum{{{rotulos}}} {dados["soma_s"]:.9g}')
+                linhas.append(f'{base}_duracao_segundos_count{{{rotulos}}} {dados["chamadas"]}')
+
+            for campo, tipo_prom, ajuda in (('linhas', 'gauge', 'Linhas do último resultado'),
+                                            ('pico_memoria_bytes', 'gauge', 'Maior pico de memória alocada (tracemalloc)'),
+                                            ('erros', 'counter', 'Erros registrados')):
+                serie = [(nome, dados[campo]) for (_, nome, fase), dados, _ in do_tipo
+                         if fase == 'total' and dados[campo] is not None]
+                if not serie:
+                    continue
+                nome_metrica = f'{base}_{campo}_total' if tipo_prom == 'counter' else f'{base}_{campo}'
+                linhas += [f'# HELP {nome_metrica} {ajuda}.', f'# TYPE {nome_metrica} {tipo_prom}']
+                linhas += [f'{nome_metrica}{{{rotulo}="{_escapar(nome)}"}} {valor}' for nome, valor in serie]
+
+        return '\n'.join(linhas) + '\n'
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- INTEGRAÇÃO COM TranspetroAnalytics ---
+
+def contar_linhas(resultado: Any) -> Optional[int]:
+    return len(resultado) if isinstance(resultado, pd.DataFrame) else None
+
+
+def medir_etapa(metodo):
+    """Decorador para métodos de TranspetroAnalytics: registra a chamada em `self.desempenho`."""
+
+    @functools.wraps(metodo)
+    def medido(self, *args, **kwargs):
+        with self.desempenho.etapa(metodo.__name__) as medicao:
+            resultado = metodo(self, *args, **kwargs)
+            medicao.linhas = contar_linhas(resultado)
+        return resultado
+
+    return medido
+
+
+# --- PERFIL (cProfile) ---
+
+def resumo_perfil(perfil: cProfile.Profile, limite: int = 40, ordenar: str = 'cumulative') -> str:
+    """As `limite` funções mais custosas do perfil, em texto (formato do pstats)."""
+    saida = io.StringIO()
+    pstats.Stats(perfil, stream=saida).strip_dirs().sort_stats(ordenar).print_stats(limite)
+    return saida.getvalue()
@@ -0,0 +1,52 @@
+import zlib
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+
+# ==============================================================================
+# EXPORTAÇÃO EM FLUXO (NDJSON / CSV)
+# ==============================================================================
+
+# formato -> (mimetype, extensão do arquivo)
+FORMATOS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),  # o Flask acrescenta charset=utf-8
+}
+LINHAS_POR_BLOCO = 10_000
+
+
+def blocos(df: pd.DataFrame, formato: str, linhas_por_bloco: int = LINHAS_POR_BLOCO) -> Iterator[bytes]:
+    """
+    Conteúdo de `df` em blocos de `linhas_por_bloco` linhas, cada um serializado a partir de uma
+    fatia das colunas: só um bloco existe como texto por vez, seja qual for o tamanho da tabela.
+    NDJSON: um objeto por linha (NaN vira null); CSV: cabeçalho no primeiro bloco. Datas saem
+    como texto, no mesmo formato das rotas JSON.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconhecido: {formato} (use {', '.join(FORMATOS)}).")
+    colunas_data = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+
+    if formato == 'csv':
+        yield df.iloc[:0].to_csv(index=False).encode('utf-8')
+    for inicio in range(0, len(df), linhas_por_bloco):
+        bloco = df.iloc[inicio:inicio + linhas_por_bloco]
+        if colunas_data:
+            bloco = bloco.assign(**{c: bloco[c].astype(str) for c in colunas_data})
+        if formato == 'csv':
+            texto = bloco.to_csv(index=False, header=False)
+        else:
+            texto = bloco.to_json(orient='records', lines=True, force_ascii=False)
+            if not texto.endswith('\n'):
+                texto += '\n'
+        yield texto.encode('utf-8')
+
+
+def comprimir_gzip(partes: Iterable[bytes], nivel: int = 6) -> Iterator[bytes]:
+    """Fluxo gzip das `partes`, comprimido bloco a bloco (sem juntar o conteúdo)."""
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for parte in partes:
+        comprimido = compressor.compress(parte)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+
+# ==============================================================================
+# ÍNDICES ORDENADOS PARA CONSULTAS SEM VARREDURA COMPLETA
+# ==============================================================================
+
+class IndiceSessoes:
+    """
+    Índice sessionId -> posições das linhas em um DataFrame, mantido como arrays ordenados.
+    Consultas usam busca binária (O(k log n)) e acréscimos preservam a ordem original
+    das linhas para sessões repetidas (a primeira ocorrência continua sendo a primeira).
+    """
+
+    def __init__(self, ids: np.ndarray):
+        ids = np.asarray(ids)
+        ordem = np.argsort(ids, kind='stable')
+        self.ids = ids[ordem]
+        self.posicoes = ordem.astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def contem(self, ids: np.ndarray) -> np.ndarray:
+        """Máscara booleana: quais `ids` já estão no índice."""
+        ids = np.asarray(ids)
+        if len(self.ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        i = np.searchsorted(self.ids, ids, side='left')
+        return self.ids[np.minimum(i, len(self.ids) - 1)] == ids
+
+    def primeira_posicao(self, ids: np.ndarray) -> np.ndarray:
+        """Posição da primeira linha de cada id (-1 quando ausente)."""
+        ids = np.asarray(ids)
+        if len(self.ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        i = np.minimum(np.searchsorted(self.ids, ids, side='left'), len(self.ids) - 1)
+        return np.where(self.ids[i] == ids, self.posicoes[i], -1)
+
+    def todas_posicoes(self, ids: np.ndarray) -> np.ndarray:
+        """Posições de todas as linhas dos `ids` informados (ids ausentes não contribuem)."""
+        ids = np.asarray(ids)
+        esquerda = np.searchsorted(self.ids, ids, side='left')
+        direita = np.searchsorted(self.ids, ids, side='right')
+        tamanhos = direita - esquerda
+        if tamanhos.sum() == 0:
+            return np.array([], dtype=np.int64)
+        # Expande cada faixa [esquerda, direita) sem laço Python
+        inicio_faixa = np.repeat(esquerda - np.concatenate([[0], np.cumsum(tamanhos)[:-1]]), tamanhos)
+        return self.posicoes[inicio_faixa + np.arange(tamanhos.sum())]
+
+    def acrescentar(self, ids: np.ndarray, posicoes: np.ndarray) -> None:
+        """Inclui novas linhas; a ordenação estável mantém as antigas antes das novas em empates."""
+        todos_ids = np.concatenate([self.ids, np.asarray(ids)])
+        todas_pos = np.concatenate([self.posicoes, np.asarray(posicoes, dtype=np.int64)])
+        ordem = np.argsort(todos_ids, kind='stable')
+        self.ids = todos_ids[ordem]
+        self.posicoes = todas_pos[ordem]
+
+
+class IndiceNavioMes:
+    """
+    Índice de uma tabela navio x tempo: posições ordenadas por (navio, tempo) e um dicionário
+    navio -> (início, fim) de offsets. Consultas por navio e/ou período viram fatias e buscas
+    binárias, sem varrer a tabela inteira. Os navios mantêm a ordem da primeira aparição.
+    """
+
+    def __init__(self, navios: np.ndarray, tempos: np.ndarray):
+        codigos, nomes = pd.factorize(np.asarray(navios))
+        ordem = np.lexsort((tempos, codigos))
+        self.posicoes = ordem.astype(np.int64)
+        self.tempos = np.asarray(tempos)[ordem]
+
+        limites = np.searchsorted(codigos[ordem], np.arange(len(nomes) + 1))
+        self.faixas: Dict[str, Tuple[int, int]] = {
+            nome: (int(limites[i]), int(limites[i + 1])) for i, nome in enumerate(nomes)
+        }
+
+    def consultar(self, navio: Optional[str] = None, inicio=None, fim=None) -> np.ndarray:
+        """Posições (na tabela original) das linhas do navio entre `inicio` e `fim`, inclusive."""
+        if navio is not None:
+            faixas = [self.faixas[navio]] if navio in self.faixas else []
+        else:
+            faixas = self.faixas.values()
+
+        partes = []
+        for a, b in faixas:
+            tempos = self.tempos[a:b]
+            i = a + (np.searchsorted(tempos, inicio, side='left') if inicio is not None else 0)
+            j = a + (np.searchsorted(tempos, fim, side='right') if fim is not None else b - a)
+            partes.append(self.posicoes[i:j])
+
+        return np.concatenate(partes) if partes else np.array([], dtype=np.int64)
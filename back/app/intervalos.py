@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from typing import Tuple
+
+
+# ==============================================================================
+# MOTOR DE INTERVALOS (VARREDURA COM VETOR DE DIFERENÇAS)
+# ==============================================================================
+
+def datas_para_dias(datas: pd.Series) -> np.ndarray:
+    """Converte datas (já normalizadas ou não) em número inteiro de dias desde 1970-01-01."""
+    return datas.dt.normalize().to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+
+def dias_para_datas(dias: np.ndarray) -> pd.DatetimeIndex:
+    """Operação inversa de `datas_para_dias`."""
+    return pd.DatetimeIndex(np.asarray(dias, dtype=np.int64).astype('datetime64[D]')).astype('datetime64[ns]')
+
+
+def mesclar_intervalos(chave: np.ndarray, inicio: np.ndarray,
+                       fim: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Mescla intervalos fechados [inicio, fim] (em dias inteiros) que se sobrepõem ou são
+    adjacentes dentro de uma mesma chave (ex.: código do navio).
+    Intervalos com fim < inicio são descartados. Retorna (chave, inicio, fim) ordenados.
+    """
+    validos = fim >= inicio
+    chave, inicio, fim = chave[validos], inicio[validos], fim[validos]
+    if len(chave) == 0:
+        return chave, inicio, fim
+
+    ordem = np.lexsort((inicio, chave))
+    chave, inicio, fim = chave[ordem], inicio[ordem], fim[ordem]
+
+    # Fim acumulado máximo por chave: um novo bloco começa quando a chave muda
+    # ou quando o início ultrapassa (com folga de 1 dia) tudo o que veio antes.
+    nova_chave = np.empty(len(chave), dtype=bool)
+    nova_chave[0] = True
+    nova_chave[1:] = chave[1:] != chave[:-1]
+
+    fim_acumulado = pd.Series(fim).groupby(np.cumsum(nova_chave)).cummax().to_numpy()
+    novo_bloco = nova_chave.copy()
+    novo_bloco[1:] |= inicio[1:] > fim_acumulado[:-1] + 1
+
+    inicios_bloco = np.flatnonzero(novo_bloco)
+    ultimos_bloco = np.append(inicios_bloco[1:] - 1, len(chave) - 1)
+
+    return chave[inicios_bloco], inicio[inicios_bloco], fim_acumulado[ultimos_bloco]
+
+
+def contar_por_dia(grupo: np.ndarray, inicio: np.ndarray, fim: np.ndarray,
+                   n_grupos: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Conta, para cada (grupo, dia), quantos intervalos cobrem o dia, usando um vetor de
+    diferenças (+1 no início, -1 no dia seguinte ao fim) e soma acumulada.
+    Retorna apenas as células com contagem > 0, ordenadas por dia e depois por grupo.
+    """
+    if len(inicio) == 0:
+        vazio = np.array([], dtype=np.int64)
+        return vazio, vazio, vazio
+
+    dia0 = int(inicio.min())
+    n_dias = int(fim.max()) - dia0 + 2
+    tamanho = n_grupos * n_dias
+    base = grupo.astype(np.int64) * n_dias
+
+    delta = (np.bincount(base + (inicio - dia0), minlength=tamanho)
+             - np.bincount(base + (fim - dia0 + 1), minlength=tamanho))
+    contagem = np.cumsum(delta.reshape(n_grupos, n_dias), axis=1)
+
+    dias_idx, grupos_idx = np.nonzero(contagem.T > 0)
+    return grupos_idx, dias_idx + dia0, contagem[grupos_idx, dias_idx]
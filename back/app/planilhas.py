@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # openpyxl é opcional: sem ele só os CSVs exportados são lidos
+    load_workbook = None
+
+
+# ==============================================================================
+# LEITURA DIRETA DAS PLANILHAS (.xlsx) ENTREGUES COM O REPOSITÓRIO
+# ==============================================================================
+
+# "<planilha>.xlsx - <aba>.csv": nome dado pelo Google Sheets/Excel ao exportar uma aba
+_CSV_EXPORTADO = re.compile(r'^(?P<planilha>.+\.xlsx) - (?P<aba>.+)\.csv$', re.IGNORECASE)
+
+LINHAS_BUSCA_CABECALHO = 10
+MAX_ABAS_EM_CACHE = 16
+
+# (sha256 do arquivo, aba pedida, colunas) -> DataFrame lido, em ordem LRU
+_abas_lidas: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+_lock_abas = threading.Lock()
+
+
+def origem_planilha(path: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    (arquivo .xlsx, aba) de onde ler `path`: o próprio .xlsx (aba decidida pelo cabeçalho) ou,
+    para um CSV exportado "<planilha>.xlsx - <aba>.csv" que não existe, a aba da planilha de origem.
+    None quando `path` deve ser lido como CSV.
+    """
+    if path.lower().endswith('.xlsx'):
+        return path, None
+    if os.path.exists(path):
+        return None
+    pasta, nome = os.path.split(path)
+    exportado = _CSV_EXPORTADO.match(nome)
+    if exportado is None:
+        return None
+    planilha = os.path.join(pasta, exportado.group('planilha'))
+    return (planilha, exportado.group('aba')) if os.path.exists(planilha) else None
+
+
+def arquivo_fonte(path: str) -> str:
+    """Arquivo realmente lido para `path` (a planilha de origem de um CSV exportado ausente)."""
+    origem = origem_planilha(path)
+    return origem[0] if origem is not None else path
+
+
+def ler_aba(path: str, colunas: Dict[str, str], aba: Optional[str] = None, extras: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    Lê de `path` só as colunas de `colunas` (cabeçalho -> nome final), já renomeadas, e as de
+    `extras` que existirem (com o próprio nome), da `aba` (ou da primeira aba cujo cabeçalho tem
+    todas as de `colunas`). A planilha é percorrida linha a linha
+    (openpyxl em modo read_only, sem montar a planilha inteira na memória) e o resultado fica em
+    cache pelo hash do conteúdo: recarregar um arquivo igual não reprocessa o XML.
+    Levanta KeyError se nenhuma aba tiver as colunas.
+    """
+    if load_workbook is None:
+        raise ImportError("openpyxl é necessário para ler planilhas .xlsx")
+
+    chave = (_hash_arquivo(path), aba, tuple(colunas.items()), tuple(extras))
+    with _lock_abas:
+        lida = _abas_lidas.get(chave)
+        if lida is not None:
+            _abas_lidas.move_to_end(chave)
+    if lida is None:
+        lida = _ler_aba_xlsx(path, colunas, aba, extras)
+        with _lock_abas:
+            _abas_lidas[chave] = lida
+            while len(_abas_lidas) > MAX_ABAS_EM_CACHE:
+                _abas_lidas.popitem(last=False)
+    # Os loaders alteram o DataFrame (conversões, dropna inplace): cada chamada recebe uma cópia
+    return lida.copy()
+
+
+def _ler_aba_xlsx(path: str, colunas: Dict[str, str], aba: Optional[str], extras: Sequence[str]) -> pd.DataFrame:
+    livro = load_workbook(path, read_only=True, data_only=True)
+    try:
+        folhas = [livro[aba]] if aba is not None else livro.worksheets
+        for folha in folhas:
+            linhas = folha.iter_rows(values_only=True)
+            for _, linha in zip(range(LINHAS_BUSCA_CABECALHO), linhas):
+                cabecalho = [str(v).strip().replace('"', '') if v is not None else '' for v in linha]
+                if all(c in cabecalho for c in colunas):
+                    # Primeira ocorrência de cada cabeçalho (a aba de revestimento repete 'Tipo')
+                    selecionadas = {**colunas, **{c: c for c in extras if c in cabecalho and c not in colunas}}
+                    posicoes = [cabecalho.index(c) for c in selecionadas]
+                    valores = {nome: [] for nome in selecionadas.values()}
+                    for linha in linhas:
+                        celulas = [linha[p] if p < len(linha) else None for p in posicoes]
+                        if all(v is None for v in celulas):
+                            continue
+                        for nome, valor in zip(valores, celulas):
+                            valores[nome].append(valor)
+                    return pd.DataFrame(valores)
+    finally:
+        livro.close()
+    raise KeyError(f"{path}: nenhuma aba{f' {aba!r}' if aba else ''} com as colunas {list(colunas)}")
+
+
+def _hash_arquivo(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ==============================================================================
+# PONTO DE LIMPEZA IDEAL (PLI): CUSTO DA LIMPEZA x ECONOMIA DE COMBUSTÍVEL
+# ==============================================================================
+
+# Acréscimo de consumo de um casco totalmente incrustado em relação ao casco limpo
+PENALIDADE_MAX = 0.40
+# Com risco 5 em todos os meses, a incrustação chega a 63% (1 - 1/e) do máximo neste prazo
+DIAS_SATURACAO_RISCO_MAX = 180
+RISCO_MAX = 5
+RISCO_PADRAO = 3.0  # meses sem risco calculado para o navio
+
+# Grade padrão de cenários: preço do combustível (por unidade de consumo) x custo de uma limpeza
+PRECOS_COMBUSTIVEL_PADRAO = tuple(float(p) for p in range(400, 1001, 50))
+CUSTOS_LIMPEZA_PADRAO = tuple(float(c) for c in range(50_000, 300_001, 25_000))
+HORIZONTE_PADRAO_DIAS = 730
+# Desconto ao ano do combustível economizado e do custo da limpeza (adiar a limpeza adia o custo)
+TAXA_DESCONTO_ANUAL = 0.10
+
+# Parâmetros de um navio já extraídos das tabelas da análise:
+# (navio, consumo diário com casco limpo, incrustação acumulada no início, risco médio por mês do ano
+#  [12 valores, jan..dez], multiplicador do desgaste do revestimento)
+PerfilNavio = Tuple[str, float, float, np.ndarray, float]
+
+
+def taxa_incrustacao(risco: np.ndarray, multiplicador: float) -> np.ndarray:
+    """Incrustação acumulada por dia: proporcional ao risco do mês e ao desgaste do revestimento."""
+    return np.asarray(risco, dtype=np.float64) / RISCO_MAX / DIAS_SATURACAO_RISCO_MAX * multiplicador
+
+
+def penalidade(incrustacao: np.ndarray) -> np.ndarray:
+    """Fração de consumo extra para uma incrustação acumulada (satura em PENALIDADE_MAX)."""
+    return PENALIDADE_MAX * (1.0 - np.exp(-incrustacao))
+
+
+def avaliar_navio(perfil: PerfilNavio, inicio: np.datetime64, horizonte_dias: int, precos: np.ndarray,
+                  custos: np.ndarray, taxa_desconto: float = TAXA_DESCONTO_ANUAL) -> Dict[str, Any]:
+    """
+    Avalia a limpeza do casco em cada dia do horizonte (a partir de `inicio`) para todos os
+    cenários de preço do combustível x custo da limpeza de uma vez.
+
+    Sem limpeza, a incrustação no dia t é F0 + G[t] (G: soma acumulada das taxas diárias); com
+    limpeza no dia d, passa a G[t] - G[d-1]. Como a penalidade é PMAX * (1 - e^-F), o consumo
+    extra de todos os dias t >= d sai de somas de sufixo de e^-G[t]: todas as datas candidatas
+    custam O(horizonte), sem a matriz datas x dias.
+    Devolve o combustível economizado por data candidata e, por cenário (preço, custo), a melhor
+    data e a economia líquida em valor presente no início (índice -1 e 0,0 quando nenhuma
+    limpeza se paga no horizonte).
+    """
+    _, consumo_dia, incrustacao_inicial, risco_mes, multiplicador = perfil
+    dias = inicio + np.arange(horizonte_dias).astype('timedelta64[D]')
+    mes = dias.astype('datetime64[M]').astype(np.int64) % 12
+    taxa = taxa_incrustacao(risco_mes[mes], multiplicador)
+
+    acumulada = np.cumsum(taxa)            # G[t]: até o fim do dia t
+    antes = acumulada - taxa               # G[d-1]: até o início do dia d
+    sem_limpeza = penalidade(incrustacao_inicial + acumulada)
+    decaimento = np.exp(-acumulada)
+
+    def economizado(peso: np.ndarray) -> np.ndarray:
+        # Dias-penalidade (ponderados por `peso`) de d até o fim do horizonte, sem e com limpeza no dia d
+        com_limpeza = PENALIDADE_MAX * (_soma_sufixo(peso) - np.exp(antes) * _soma_sufixo(peso * decaimento))
+        return consumo_dia * (_soma_sufixo(peso * sem_limpeza) - com_limpeza)
+
+    desconto = (1.0 + taxa_desconto) ** (-np.arange(horizonte_dias) / 365.0)
+    combustivel_economizado = economizado(np.ones(horizonte_dias))
+    combustivel_descontado = economizado(desconto)
+
+    # (preço, custo, data): economia líquida de cada cenário em cada data candidata
+    economia = (precos[:, None, None] * combustivel_descontado[None, None, :]
+                - custos[None, :, None] * desconto[None, None, :])
+    melhor = np.argmax(economia, axis=2)
+    economia_melhor = np.take_along_axis(economia, melhor[..., None], axis=2)[..., 0]
+    compensa = economia_melhor > 0
+    return {
+        'combustivel_economizado': combustivel_economizado,
+        'melhor_dia': np.where(compensa, melhor, -1),
+        'economia_melhor': np.where(compensa, economia_melhor, 0.0),
+        'combustivel_melhor': np.where(compensa, combustivel_economizado[melhor], 0.0),
+    }
+
+
+def _soma_sufixo(valores: np.ndarray) -> np.ndarray:
+    return np.cumsum(valores[::-1])[::-1]
+
+
+def _avaliar_lote(perfis: List[PerfilNavio], inicio: np.datetime64, horizonte_dias: int, precos: np.ndarray,
+                  custos: np.ndarray, taxa_desconto: float) -> List[Dict[str, Any]]:
+    """Executado nos processos do pool: um lote de navios por tarefa (amortiza a serialização)."""
+    return [avaliar_navio(perfil, inicio, horizonte_dias, precos, custos, taxa_desconto) for perfil in perfis]
+
+
+def avaliar_frota(perfis: Sequence[PerfilNavio], inicio: np.datetime64, horizonte_dias: int,
+                  precos: Sequence[float], custos: Sequence[float], taxa_desconto: float = TAXA_DESCONTO_ANUAL,
+                  processos: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    `avaliar_navio` para cada perfil, na mesma ordem. Os navios são divididos em lotes entre
+    `processos` processos (padrão: um por CPU); com um só processo (ou uma só CPU) roda aqui mesmo,
+    onde o custo de criar o pool superaria o cálculo.
+    """
+    precos = np.asarray(precos, dtype=np.float64)
+    custos = np.asarray(custos, dtype=np.float64)
+    processos = min(processos or os.cpu_count() or 1, len(perfis))
+    if processos <= 1:
+        return _avaliar_lote(list(perfis), inicio, horizonte_dias, precos, custos, taxa_desconto)
+
+    lotes = [list(perfis[i::processos]) for i in range(processos)]
+    # fork: os processos herdam o sys.path do app e não reimportam o módulo principal (api.py)
+    contexto = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+        por_lote = list(pool.map(_avaliar_lote, lotes, [inicio] * processos, [horizonte_dias] * processos,
+                                 [precos] * processos, [custos] * processos, [taxa_desconto] * processos))
+
+    # Lotes intercalados (i, i + processos, ...): devolve na ordem dos perfis
+    resultados: List[Dict[str, Any]] = [None] * len(perfis)
+    for i, lote in enumerate(por_lote):
+        resultados[i::processos] = lote
+    return resultados
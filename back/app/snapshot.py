@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow é opcional: sem ele o cache em disco fica desativado
+    feather = None
+
+
+# ==============================================================================
+# CACHE DE SNAPSHOTS COLUNARES (ARROW/FEATHER) DOS DATAFRAMES CARREGADOS
+# ==============================================================================
+
+class SnapshotCache:
+    """
+    Guarda cópias tipadas e colunares (Feather v2, sem compressão, lidas com memory-map)
+    dos DataFrames já limpos, indexadas pelo caminho, tamanho e mtime dos arquivos de origem.
+    Também memoriza o separador/encoding detectado para cada CSV.
+    """
+
+    # Incrementar quando a limpeza feita pelos loaders mudar, invalidando snapshots antigos.
+    VERSAO_FORMATO = 1
+    ARQUIVO_OPCOES_CSV = 'opcoes_csv.json'
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self._opcoes_csv = self._ler_json(os.path.join(diretorio, self.ARQUIVO_OPCOES_CSV)) or {}
+        self._lock_opcoes = threading.Lock()  # loaders em threads paralelas gravam o mesmo arquivo
+
+    @property
+    def ativo(self) -> bool:
+        return feather is not None
+
+    # --- CHAVES DE ORIGEM ---
+
+    @staticmethod
+    def chave_fontes(fontes: List[str]) -> Optional[List[Dict]]:
+        """Identificação (caminho, tamanho, mtime) de cada fonte; None se alguma não existir."""
+        chave = []
+        for path in fontes:
+            if not os.path.exists(path):
+                return None
+            stat = os.stat(path)
+            chave.append({'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+        return chave
+
+    # --- LEITURA / ESCRITA DE SNAPSHOTS ---
+
+    def carregar(self, nome: str, fontes: List[str]) -> Optional[pd.DataFrame]:
+        """Retorna o snapshot de `nome` se ele ainda corresponder às fontes atuais."""
+        if not self.ativo:
+            return None
+
+        meta = self._ler_json(self._caminho(nome, '.json'))
+        chave = self.chave_fontes(fontes)
+        if meta is None or chave is None:
+            return None
+        if meta.get('versao') != self.VERSAO_FORMATO or meta.get('fontes') != chave:
+            return None
+
+        try:
+            return feather.read_table(self._caminho(nome, '.arrow'), memory_map=True).to_pandas()
+        except Exception:
+            return None
+
+    def salvar(self, nome: str, fontes: List[str], df: pd.DataFrame) -> bool:
+        """Grava o snapshot de `nome`. Falhas (ex.: colunas com tipos mistos) apenas desativam o cache."""
+        chave = self.chave_fontes(fontes)
+        if not self.ativo or chave is None:
+            return False
+
+        destino = self._caminho(nome, '.arrow')
+        try:
+            feather.write_feather(df.reset_index(drop=True), destino + '.tmp', compression='uncompressed')
+            os.replace(destino + '.tmp', destino)
+        except Exception as e:
+            print(f"  -> Snapshot de '{nome}' não gravado: {e}")
+            return False
+
+        self._gravar_json(self._caminho(nome, '.json'), {'versao': self.VERSAO_FORMATO, 'fontes': chave})
+        return True
+
+    # --- OPÇÕES DE LEITURA DE CSV ---
+
+    def opcoes_csv(self, path: str) -> Optional[Dict[str, str]]:
+        return self._opcoes_csv.get(os.path.abspath(path))
+
+    def lembrar_opcoes_csv(self, path: str, opcoes: Dict[str, str]) -> None:
+        chave = os.path.abspath(path)
+        with self._lock_opcoes:
+            if self._opcoes_csv.get(chave) == opcoes:
+                return
+            self._opcoes_csv[chave] = opcoes
+            self._gravar_json(os.path.join(self.diretorio, self.ARQUIVO_OPCOES_CSV), self._opcoes_csv)
+
+    # --- AUXILIARES ---
+
+    def _caminho(self, nome: str, extensao: str) -> str:
+        return os.path.join(self.diretorio, nome + extensao)
+
+    @staticmethod
+    def _ler_json(path: str) -> Optional[Dict]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _gravar_json(path: str, dados: Dict) -> None:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+# ==============================================================================
+# TAREFAS ASSÍNCRONAS COM COALESCÊNCIA DE EXECUÇÕES IDÊNTICAS
+# ==============================================================================
+
+class Progresso:
+    """Avanço informado pela própria função em execução (ex.: chunks baixados de um total)."""
+
+    def __init__(self):
+        self.feitos = 0
+        self.total: Optional[int] = None
+
+    def __call__(self, feitos: int, total: int) -> None:
+        self.feitos, self.total = feitos, total
+
+    def fracao(self) -> float:
+        return min(self.feitos / self.total, 1.0) if self.total else 0.0
+
+
+class Execucao:
+    """Uma unidade de trabalho (ex.: o clima de um navio), compartilhada por todas as tarefas que a pedem."""
+
+    def __init__(self, chave: Hashable):
+        self.chave = chave
+        self.progresso = Progresso()
+        self.future: Future = Future()
+        self.iniciada_em: Optional[float] = None
+        self.concluida_em: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return 'executando' if self.iniciada_em is not None else 'pendente'
+        return 'erro' if self.future.exception() is not None else 'concluida'
+
+    def resumo(self) -> Dict[str, Any]:
+        status = self.status
+        erro = self.future.exception() if status == 'erro' else None
+        return {
+            'status': status,
+            'progresso': 1.0 if self.future.done() else self.progresso.fracao(),
+            'erro': f"{type(erro).__name__}: {erro}" if erro is not None else None,
+        }
+
+
+class Tarefa:
+    """Pedido de um cliente: um conjunto de itens, cada um ligado a uma execução (possivelmente compartilhada)."""
+
+    def __init__(self, id: str, tipo: str, execucoes: Dict[str, Execucao]):
+        self.id = id
+        self.tipo = tipo
+        self.execucoes = execucoes
+        self.criada_em = time.time()
+
+    @property
+    def concluida(self) -> bool:
+        return all(e.future.done() for e in self.execucoes.values())
+
+    @property
+    def concluida_em(self) -> Optional[float]:
+        return max(e.concluida_em for e in self.execucoes.values()) if self.concluida else None
+
+    @property
+    def status(self) -> str:
+        estados = [e.status for e in self.execucoes.values()]
+        if self.concluida:
+            if 'erro' not in estados:
+                return 'concluida'
+            return 'erro' if all(s == 'erro' for s in estados) else 'parcial'
+        return 'executando' if any(s != 'pendente' for s in estados) else 'pendente'
+
+    @property
+    def progresso(self) -> float:
+        resumos = [e.resumo()['progresso'] for e in self.execucoes.values()]
+        return sum(resumos) / len(resumos) if resumos else 1.0
+
+    def resultados(self) -> Dict[str, Any]:
+        """Resultado de cada item concluído sem erro."""
+        return {item: e.future.result() for item, e in self.execucoes.items() if e.status == 'concluida'}
+
+
+class GerenciadorTarefas:
+    """
+    Executa tarefas em segundo plano num pool de threads de tamanho fixo.
+    Execuções com a mesma chave em andamento são coalescidas (vários clientes pedindo o mesmo
+    navio disparam um único download) e um pedido idêntico a uma tarefa em andamento recebe a
+    mesma tarefa. Tarefas concluídas ficam disponíveis por `retencao_s`.
+    Com `diretorio`, cada tarefa grava um descritor (tipo e itens), para que outro processo
+    (worker do gunicorn) que receba o GET possa retomá-la pelo mesmo id.
+    """
+
+    def __init__(self, max_paralelo: int = 2, retencao_s: float = 900, diretorio: Optional[str] = None):
+        self.retencao_s = retencao_s
+        self.diretorio = os.path.abspath(diretorio) if diretorio else None  # independe de chdir posteriores
+        self._executor = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix='tarefa')
+        self._tipos: Dict[str, Tuple[Callable[[str], Hashable], Callable[[str, Progresso], Any]]] = {}
+        self._execucoes: Dict[Hashable, Execucao] = {}
+        self._tarefas: Dict[str, Tarefa] = {}
+        self._tarefas_ativas: Dict[Tuple, Tarefa] = {}
+        self._lock = threading.RLock()  # submeter() chama executar() com o lock já adquirido
+
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def registrar(self, tipo: str, funcao: Callable[[str, Progresso], Any],
+                  chave: Callable[[str], Hashable] = lambda item: item) -> None:
+        """`funcao(item, progresso)` produz o resultado de um item; `chave(item)` define a coalescência."""
+        self._tipos[tipo] = (chave, funcao)
+
+    # --- EXECUÇÃO ---
+
+    def executar(self, tipo: str, item: str) -> Execucao:
+        """Execução de um item, reaproveitando a que estiver em andamento com a mesma chave."""
+        chave_item, funcao = self._tipos[tipo]
+        chave = (tipo, chave_item(item))
+        with self._lock:
+            execucao = self._execucoes.get(chave)
+            if execucao is not None:
+                return execucao
+            execucao = self._execucoes[chave] = Execucao(chave)
+
+        def rodar():
+            execucao.iniciada_em = time.time()
+            try:
+                resultado = funcao(item, execucao.progresso)
+            except Exception as e:
+                execucao.concluida_em = time.time()
+                execucao.future.set_exception(e)
+            else:
+                execucao.concluida_em = time.time()
+                execucao.future.set_result(resultado)
+            finally:
+                # Depois de concluída, um pedido novo com a mesma chave gera uma nova execução
+                with self._lock:
+                    self._execucoes.pop(chave, None)
+
+        self._executor.submit(rodar)
+        return execucao
+
+    def submeter(self, tipo: str, itens: List[str], id: Optional[str] = None) -> Tarefa:
+        """Nova tarefa com os `itens` (ou a tarefa idêntica ainda em andamento)."""
+        if tipo not in self._tipos:
+            raise KeyError(tipo)
+        itens = list(dict.fromkeys(itens))
+        assinatura = (tipo, tuple(sorted(itens)))
+
+        self._limpar()
+        # Verificação e registro no mesmo lock: pedidos simultâneos idênticos recebem a mesma tarefa
+        with self._lock:
+            existente = self._tarefas_ativas.get(assinatura)
+            if id is None and existente is not None and not existente.concluida:
+                return existente
+            tarefa = Tarefa(id or uuid.uuid4().hex, tipo, {item: self.executar(tipo, item) for item in itens})
+            self._tarefas[tarefa.id] = tarefa
+            self._tarefas_ativas[assinatura] = tarefa
+        self._gravar_descritor(tarefa)
+        return tarefa
+
+    def obter(self, id: str) -> Optional[Tarefa]:
+        """Tarefa pelo id; tarefas criadas em outro processo são retomadas a partir do descritor."""
+        self._limpar()
+        with self._lock:
+            tarefa = self._tarefas.get(id)
+        if tarefa is not None:
+            return tarefa
+
+        descritor = self._ler_descritor(id)
+        if descritor is None or descritor.get('tipo') not in self._tipos:
+            return None
+        if time.time() - descritor.get('criada_em', 0) > self.retencao_s:
+            return None
+        return self.submeter(descritor['tipo'], descritor['itens'], id=id)
+
+    def _limpar(self) -> None:
+        limite = time.time() - self.retencao_s
+        with self._lock:
+            expiradas = [t for t in self._tarefas.values() if t.concluida and t.concluida_em < limite]
+            for tarefa in expiradas:
+                del self._tarefas[tarefa.id]
+            self._tarefas_ativas = {k: t for k, t in self._tarefas_ativas.items() if t.id in self._tarefas}
+        for tarefa in expiradas:
+            if self.diretorio:
+                try:
+                    os.remove(self._caminho_descritor(tarefa.id))
+                except OSError:
+                    pass
+
+    # --- DESCRITORES EM DISCO ---
+
+    def _caminho_descritor(self, id: str) -> str:
+        return os.path.join(self.diretorio, f'{id}.json')
+
+    def _gravar_descritor(self, tarefa: Tarefa) -> None:
+        if not self.diretorio:
+            return
+        caminho = self._caminho_descritor(tarefa.id)
+        with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'tipo': tarefa.tipo, 'itens': list(tarefa.execucoes), 'criada_em': tarefa.criada_em},
+                      f, ensure_ascii=False)
+        os.replace(caminho + '.tmp', caminho)
+
+    def _ler_descritor(self, id: str) -> Optional[Dict[str, Any]]:
+        # O id vem da URL: só aceita o formato gerado aqui (hex), sem separadores de caminho
+        if not self.diretorio or not id.isalnum():
+            return None
+        try:
+            with open(self._caminho_descritor(id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,267 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from intervalos import datas_para_dias, dias_para_datas
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional: sem ele o dataset só pode ser montado em memória
+    pq = None
+
+
+# ==============================================================================
+# DATASET DE TREINAMENTO NAVIO-DIA (MÉTRICA 7)
+# ==============================================================================
+
+EVENTO_PORTO = 'EM PORTO'
+# Faixas de |latitude| média na janela; o limite de 20° é o mesmo do risco por regras (R_base)
+LIMITES_FAIXA_LATITUDE = (20.0, 35.0)
+FAIXAS_LATITUDE = ['tropical', 'subtropical', 'temperada']
+DIAS_POR_MES = 30.437  # mesmo fator da conformidade NORMAM 401
+ARQUIVO_METADADOS = '_metadados.json'  # prefixo '_': ignorado pelos leitores de datasets Parquet
+
+# (navio, eventos, revestimento, iws, clima) de um navio, já fatiados da base
+EntradaNavio = Tuple[str, pd.DataFrame, pd.DataFrame, pd.DataFrame, Optional[pd.DataFrame]]
+
+
+def features_navio(navio: str, eventos: pd.DataFrame, revestimento: pd.DataFrame, iws: pd.DataFrame,
+                   clima: Optional[pd.DataFrame], lookback_days: int, variaveis_clima: List[str]) -> pd.DataFrame:
+    """
+    Uma linha por dia entre o primeiro e o último evento do navio, com:
+      - exposição em porto: horas do dia cobertas por estadias 'EM PORTO' e soma na janela;
+      - |latitude| média do dia (mantida nos dias sem evento), média na janela e faixa;
+      - dias desde a última aplicação de revestimento e fração consumida da vida útil;
+      - clima: média e máximo na janela de cada variável horária (vazio = nulos);
+      - rótulo IWS: risco do próximo relatório (no dia ou depois) e dias até ele.
+    As janelas (`lookback_days`, terminando no próprio dia) usam somas acumuladas e
+    `rolling` sobre os arrays diários ordenados; nada é calculado linha a linha.
+    """
+    inicio = eventos['startGMTDate'].to_numpy(dtype='datetime64[ns]')
+    validos = ~np.isnat(inicio)
+    if not validos.any():
+        return pd.DataFrame()
+
+    dia_evento = inicio[validos].astype('datetime64[D]').astype(np.int64)
+    fim = eventos['endGMTDate'].to_numpy(dtype='datetime64[ns]')
+    fim_valido = fim[~np.isnat(fim)].astype('datetime64[D]').astype(np.int64)
+    dia0 = int(dia_evento.min())
+    n_dias = int(max(dia_evento.max(), fim_valido.max() if len(fim_valido) else dia0)) - dia0 + 1
+    dias = np.arange(dia0, dia0 + n_dias, dtype=np.int64)
+
+    df = pd.DataFrame({'shipName': navio, 'Data': dias_para_datas(dias)})
+    df['NumEventos'] = np.bincount(dia_evento - dia0, minlength=n_dias)
+
+    # --- Exposição em porto ---
+    porto = validos & (eventos['eventName'].astype(str).to_numpy() == EVENTO_PORTO)
+    duracao_h = eventos['duration'].to_numpy(dtype=np.float64)
+    base = np.datetime64(int(dia0), 'D').astype('datetime64[ns]')
+    inicio_h = (inicio[porto] - base) / np.timedelta64(1, 'h')
+    fim_h = np.where(np.isnat(fim[porto]), inicio_h + np.nan_to_num(duracao_h[porto]),
+                     (fim[porto] - base) / np.timedelta64(1, 'h'))
+    df['HorasPorto'] = _horas_cobertas_por_dia(inicio_h, fim_h, n_dias)
+    df['HorasPortoJanela'] = _soma_janela(df['HorasPorto'].to_numpy(), lookback_days)
+
+    # --- Latitude ---
+    latitude = np.abs(eventos['decLatitude'].to_numpy(dtype=np.float64)[validos])
+    com_latitude = ~np.isnan(latitude)
+    indice = dia_evento[com_latitude] - dia0
+    contagem = np.bincount(indice, minlength=n_dias)
+    soma = np.bincount(indice, weights=latitude[com_latitude], minlength=n_dias)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        abs_lat = pd.Series(np.where(contagem > 0, soma / contagem, np.nan)).ffill().to_numpy()
+    abs_lat_janela = _media_janela(abs_lat, lookback_days)
+    df['AbsLat'] = abs_lat
+    df['AbsLatJanela'] = abs_lat_janela
+    df['FaixaLatitude'] = pd.Categorical.from_codes(
+        np.where(np.isnan(abs_lat_janela), -1,
+                 np.searchsorted(LIMITES_FAIXA_LATITUDE, np.nan_to_num(abs_lat_janela), side='right')),
+        categories=FAIXAS_LATITUDE)
+
+    # --- Revestimento ---
+    dias_desde, consumo = np.full(n_dias, np.nan), np.full(n_dias, np.nan)
+    aplicacoes = revestimento.dropna(subset=['DataAplicacao']).sort_values('DataAplicacao', kind='mergesort')
+    if not aplicacoes.empty:
+        dia_aplicacao = datas_para_dias(aplicacoes['DataAplicacao'])
+        ultima = np.searchsorted(dia_aplicacao, dias, side='right') - 1
+        aplicada = ultima >= 0
+        dias_desde[aplicada] = dias[aplicada] - dia_aplicacao[ultima[aplicada]]
+        t_base = aplicacoes['T_base'].to_numpy(dtype=np.float64)[np.maximum(ultima, 0)]
+        t_max = aplicacoes['T_max'].to_numpy(dtype=np.float64)[np.maximum(ultima, 0)]
+        meses = dias_desde / DIAS_POR_MES
+        with np.errstate(invalid='ignore', divide='ignore'):
+            consumo = np.where(aplicada & (t_base > 0) & (t_max > 0), np.maximum(meses / t_base, meses / t_max), np.nan)
+    df['DiasDesdeRevestimento'] = pd.arrays.IntegerArray(np.nan_to_num(dias_desde).astype(np.int32),
+                                                         np.isnan(dias_desde))
+    df['ConsumoRevestimento'] = consumo
+
+    # --- Clima ---
+    for variavel in variaveis_clima:
+        media_dia, maximo_dia = _clima_diario(clima, variavel, dia0, n_dias)
+        df[f'{variavel}_media_janela'] = _media_janela(media_dia, lookback_days)
+        df[f'{variavel}_max_janela'] = pd.Series(maximo_dia).rolling(lookback_days, min_periods=1).max().to_numpy()
+
+    # --- Rótulo IWS ---
+    dias_ate, rotulo = np.full(n_dias, -1, dtype=np.int64), np.full(n_dias, -1, dtype=np.int64)
+    relatorios = iws.dropna(subset=['DataRelatorio'])
+    if not relatorios.empty:
+        # Vários relatórios no mesmo dia: vale o de maior risco
+        por_dia = relatorios.groupby(datas_para_dias(relatorios['DataRelatorio']))['RiscoBioincrustacao'].max()
+        dia_relatorio, risco = por_dia.index.to_numpy(dtype=np.int64), por_dia.to_numpy(dtype=np.int64)
+        proximo = np.searchsorted(dia_relatorio, dias, side='left')
+        existe = proximo < len(dia_relatorio)
+        dias_ate[existe] = dia_relatorio[proximo[existe]] - dias[existe]
+        rotulo[existe] = risco[proximo[existe]]
+    df['DiasAteIWS'] = pd.arrays.IntegerArray(dias_ate.astype(np.int32), dias_ate < 0)
+    df['RotuloIWS'] = pd.arrays.IntegerArray(rotulo.astype(np.int8), dias_ate < 0)
+    return df
+
+
+# --- JANELAS E AGREGAÇÕES DIÁRIAS ---
+
+def _soma_janela(valores: np.ndarray, janela: int) -> np.ndarray:
+    """Soma dos últimos `janela` valores (inclusive o atual) por diferença de somas acumuladas."""
+    acumulado = np.concatenate(([0.0], np.cumsum(valores, dtype=np.float64)))
+    fim = np.arange(1, len(valores) + 1)
+    return acumulado[fim] - acumulado[np.maximum(fim - janela, 0)]
+
+
+def _media_janela(valores: np.ndarray, janela: int) -> np.ndarray:
+    """Média móvel ignorando nulos (nulo só se a janela inteira for nula)."""
+    presentes = ~np.isnan(valores)
+    soma = _soma_janela(np.where(presentes, valores, 0.0), janela)
+    n = _soma_janela(presentes.astype(np.float64), janela)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, soma / n, np.nan)
+
+
+def _horas_cobertas_por_dia(inicio_h: np.ndarray, fim_h: np.ndarray, n_dias: int) -> np.ndarray:
+    """
+    Horas de cada dia cobertas pela união dos intervalos [inicio_h, fim_h) (horas desde o dia 0).
+    Os intervalos são mesclados (sobreposições contam uma vez) e as horas acumuladas até cada
+    meia-noite saem de uma busca binária: só o último bloco iniciado pode estar em andamento.
+    """
+    ok = fim_h > inicio_h
+    inicio_h, fim_h = inicio_h[ok], fim_h[ok]
+    if len(inicio_h) == 0:
+        return np.zeros(n_dias)
+
+    ordem = np.argsort(inicio_h, kind='stable')
+    inicio_h, fim_acumulado = inicio_h[ordem], np.maximum.accumulate(fim_h[ordem])
+    novo_bloco = np.empty(len(inicio_h), dtype=bool)
+    novo_bloco[0] = True
+    novo_bloco[1:] = inicio_h[1:] > fim_acumulado[:-1]
+    primeiros = np.flatnonzero(novo_bloco)
+    inicio_bloco = inicio_h[primeiros]
+    fim_bloco = fim_acumulado[np.append(primeiros[1:] - 1, len(inicio_h) - 1)]
+
+    meias_noites = np.arange(n_dias + 1) * 24.0
+    horas_acumuladas = np.concatenate(([0.0], np.cumsum(fim_bloco - inicio_bloco)))
+    iniciados = np.searchsorted(inicio_bloco, meias_noites, side='right')
+    em_andamento = np.where(iniciados > 0, np.maximum(fim_bloco[np.maximum(iniciados - 1, 0)] - meias_noites, 0.0), 0.0)
+    return np.diff(horas_acumuladas[iniciados] - em_andamento)
+
+
+def _clima_diario(clima: Optional[pd.DataFrame], variavel: str, dia0: int,
+                  n_dias: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Média e máximo diários de uma variável horária na grade de dias do navio (nulos sem dados)."""
+    vazio = np.full(n_dias, np.nan)
+    if clima is None or clima.empty or variavel not in clima.columns:
+        return vazio, vazio.copy()
+
+    valores = pd.to_numeric(clima[variavel], errors='coerce').to_numpy(dtype=np.float64)
+    indice = datas_para_dias(pd.to_datetime(clima['DataHoraGMT'])) - dia0
+    ok = (indice >= 0) & (indice < n_dias) & ~np.isnan(valores)
+    indice, valores = indice[ok], valores[ok]
+
+    contagem = np.bincount(indice, minlength=n_dias)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.where(contagem > 0, np.bincount(indice, weights=valores, minlength=n_dias) / contagem, np.nan)
+    maximo = vazio.copy()
+    if len(indice):
+        maximos = pd.Series(valores).groupby(indice).max()
+        maximo[maximos.index.to_numpy()] = maximos.to_numpy()
+    return media, maximo
+
+
+# --- DATASET PARTICIONADO EM DISCO ---
+
+def _pasta_particao(destino: str, navio: str) -> str:
+    # Particionamento estilo Hive (shipName=<navio>), com o nome codificado como URI
+    return os.path.join(destino, f"shipName={quote(navio, safe='')}")
+
+
+def _processar_navio(entrada: EntradaNavio, lookback_days: int, variaveis_clima: List[str], destino: str) -> int:
+    """Executado nos processos do pool: calcula as features de um navio e grava a partição dele."""
+    navio = entrada[0]
+    df = features_navio(*entrada, lookback_days=lookback_days, variaveis_clima=variaveis_clima)
+    if df.empty:
+        return 0
+    pasta = _pasta_particao(destino, navio)
+    os.makedirs(pasta, exist_ok=True)
+    df.drop(columns=['shipName']).to_parquet(os.path.join(pasta, 'parte-0.parquet'), index=False)
+    return len(df)
+
+
+def gerar_dataset(entradas: Iterable[EntradaNavio], destino: str, lookback_days: int, variaveis_clima: List[str],
+                  processos: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Grava o dataset navio-dia em `destino` (uma partição Parquet por navio), calculando os navios
+    num pool de processos. As entradas são consumidas sob demanda: enquanto os processos calculam,
+    a próxima entrada (ex.: clima baixado do ERA5) já é preparada. O dataset é montado numa pasta
+    temporária e só então substitui o anterior. `processos=1` calcula no próprio processo.
+    """
+    if pq is None:
+        raise RuntimeError("O dataset de treinamento particionado requer pyarrow.")
+
+    inicio = time.perf_counter()
+    temporario = f'{destino}.tmp-{os.getpid()}'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    try:
+        linhas: Dict[str, int] = {}
+        if processos == 1:
+            for entrada in entradas:
+                linhas[entrada[0]] = _processar_navio(entrada, lookback_days, variaveis_clima, temporario)
+        else:
+            # fork: os processos herdam o sys.path do app e não reimportam o módulo principal (api.py)
+            contexto = (multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods()
+                        else None)
+            with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+                futuros = {entrada[0]: pool.submit(_processar_navio, entrada, lookback_days, variaveis_clima, temporario)
+                           for entrada in entradas}
+                linhas = {navio: futuro.result() for navio, futuro in futuros.items()}
+
+        metadados = {
+            'gerado_em': pd.Timestamp.now(tz='UTC').isoformat(),
+            'lookback_days': lookback_days,
+            'variaveis_clima': variaveis_clima,
+            'particionamento': 'shipName',
+            'navios': len([n for n, qtd in linhas.items() if qtd]),
+            'linhas': int(sum(linhas.values())),
+            'linhas_por_navio': linhas,
+            'duracao_s': round(time.perf_counter() - inicio, 3),
+        }
+        with open(os.path.join(temporario, ARQUIVO_METADADOS), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, ensure_ascii=False, indent=2)
+    except BaseException:
+        # Falha em um navio (ou interrupção): não deixa a pasta temporária pela metade no disco
+        shutil.rmtree(temporario, ignore_errors=True)
+        raise
+
+    # Troca: o dataset anterior só é removido depois que o novo está completo
+    antigo = f'{destino}.antigo-{os.getpid()}'
+    if os.path.exists(destino):
+        os.replace(destino, antigo)
+    os.replace(temporario, destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return {k: v for k, v in metadados.items() if k != 'linhas_por_navio'}
@@ -0,0 +1,75 @@
+"""
+Benchmark: conformidade NORMAM 401 (métrica 5) e risco de bioincrustação da frota (métrica 8),
+implementação original por navio (benchmarks/originais.py) x versão vetorizada de
+TranspetroAnalytics, numa frota de algumas centenas de navios com 10 anos de eventos.
+Confere também que as duas versões produzem a mesma tabela.
+
+Uso (a partir de back/):  python benchmarks/bench_conformidade_risco.py [--navios 300] [--anos 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from analytics import TranspetroAnalytics  # noqa: E402
+from gerador_frota import gerar_frota, escrever_csvs  # noqa: E402
+import originais  # noqa: E402
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--navios', type=int, default=300)
+    parser.add_argument('--anos', type=float, default=10)
+    parser.add_argument('--eventos-por-dia', type=float, default=1.2)
+    parser.add_argument('--sem-risco-original', action='store_true',
+                        help='Não mede o risco original (o laço por navio é o trecho mais demorado)')
+    args = parser.parse_args()
+
+    # Eventos terminando hoje: a grade da conformidade vai da primeira aplicação até o mês atual
+    inicio = (pd.Timestamp('today') - pd.DateOffset(days=int(args.anos * 365))).strftime('%Y-%m-%d')
+    dados = gerar_frota(args.navios, args.anos, args.eventos_por_dia, inicio=inicio)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminhos = escrever_csvs(dados, pasta)
+        analytics = TranspetroAnalytics(caminhos['eventos'], caminhos['consumo'], caminhos['revestimento'],
+                                        caminhos['iws'])
+
+    df_r, df_e = analytics.df_revestimento, analytics.df_eventos
+    meses = pd.period_range(df_r['DataAplicacao'].min().to_period('M'), pd.Timestamp('today').to_period('M'), freq='M')
+    print(f"\nNavios: {df_r['shipName'].nunique()} | Aplicações de revestimento: {len(df_r)} | "
+          f"Meses na grade: {len(meses)} | Eventos: {len(df_e)}")
+
+    t_conf_original, conf_original = cronometrar(lambda: originais.conformidade_normam_401(df_r, df_e))
+    t_conf, conformidade = cronometrar(analytics.calcular_conformidade_normam_401)
+    assert_frame_equal(conformidade, conf_original)
+    print(f"Conformidade NORMAM 401  original: {t_conf_original * 1000:10.1f} ms | "
+          f"vetorizada: {t_conf * 1000:8.1f} ms ({t_conf_original / t_conf:.0f}x)")
+
+    t_risco, risco = cronometrar(lambda: analytics.calcular_risco_bioincrustacao_frota(conformidade))
+    t_risco_cache, _ = cronometrar(lambda: analytics.calcular_risco_bioincrustacao_frota(conformidade))
+    if args.sem_risco_original:
+        print(f"Risco da frota           vetorizado: {t_risco * 1000:8.1f} ms | materializado: "
+              f"{t_risco_cache * 1e6:.0f} us")
+    else:
+        t_risco_original, risco_original = cronometrar(
+            lambda: originais.risco_bioincrustacao_frota(df_e, conformidade))
+        assert_frame_equal(risco, risco_original)
+        print(f"Risco da frota           original: {t_risco_original * 1000:10.1f} ms | "
+              f"vetorizado: {t_risco * 1000:8.1f} ms ({t_risco_original / t_risco:.0f}x) | "
+              f"materializado: {t_risco_cache * 1e6:.0f} us")
+    print("Resultados idênticos às implementações originais.")
+
+
+if __name__ == '__main__':
+    main()
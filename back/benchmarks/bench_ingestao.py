@@ -0,0 +1,81 @@
+"""
+Benchmark: custo de acrescentar um dia de dados (ingestão incremental) comparado a uma
+recarga completa da base (construção de TranspetroAnalytics + tabelas derivadas).
+
+Uso (a partir de back/):  python benchmarks/bench_ingestao.py [--navios 50] [--anos 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from analytics import TranspetroAnalytics  # noqa: E402
+from gerador_frota import gerar_frota, escrever_csvs  # noqa: E402
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--navios', type=int, default=50)
+    parser.add_argument('--anos', type=float, default=5)
+    args = parser.parse_args()
+
+    dados = gerar_frota(args.navios, args.anos)
+    df_eventos, df_consumo = dados['eventos'], dados['consumo']
+    fim = df_eventos['startGMTDate'].max()
+    # Penúltimo dia aquece os índices de sessão; o último dia é o que se mede
+    dia_aquecimento = (df_eventos['startGMTDate'] > fim - pd.Timedelta(days=2)) & ~(
+        df_eventos['startGMTDate'] > fim - pd.Timedelta(days=1))
+    dia_medido = df_eventos['startGMTDate'] > fim - pd.Timedelta(days=1)
+    base = ~(dia_aquecimento | dia_medido)
+
+    def consumo_de(mascara):
+        return df_consumo[df_consumo['SESSION_ID'].isin(df_eventos.loc[mascara, 'sessionId'])].copy()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminhos = escrever_csvs(dados, pasta)
+        caminho_eventos_base = os.path.join(pasta, 'eventos_base.csv')
+        caminho_consumo_base = os.path.join(pasta, 'consumo_base.csv')
+        df_eventos[base].to_csv(caminho_eventos_base, index=False)
+        consumo_de(base).to_csv(caminho_consumo_base, index=False)
+
+        def recarga_completa():
+            analytics = TranspetroAnalytics(caminhos['eventos'], caminhos['consumo'], caminhos['revestimento'],
+                                            caminhos['iws'])
+            df_conformidade = analytics.calcular_conformidade_normam_401()
+            analytics.calcular_risco_bioincrustacao_frota(df_conformidade)
+            analytics.calcular_consumo_mensal_total()
+            return analytics
+
+        t_completa, _ = cronometrar(recarga_completa)
+
+        analytics = TranspetroAnalytics(caminho_eventos_base, caminho_consumo_base, caminhos['revestimento'],
+                                        caminhos['iws'])
+        df_conformidade = analytics.calcular_conformidade_normam_401()
+
+        def ingerir_dia(df_eventos_dia, df_consumo_dia):
+            analytics.ingerir_eventos(df_eventos_dia)
+            analytics.ingerir_consumo(df_consumo_dia)
+            analytics.calcular_risco_bioincrustacao_frota(df_conformidade)
+            return analytics.calcular_consumo_mensal_total()
+
+        ingerir_dia(df_eventos[dia_aquecimento].copy(), consumo_de(dia_aquecimento))
+        lote = (df_eventos[dia_medido].copy(), consumo_de(dia_medido))
+        t_incremental, _ = cronometrar(lambda: ingerir_dia(*lote))
+
+    print(f"\nEventos: {len(df_eventos)} | Eventos do último dia: {int(dia_medido.sum())}")
+    print(f"Recarga completa:      {t_completa * 1000:9.1f} ms")
+    print(f"Ingestão de 1 dia:     {t_incremental * 1000:9.1f} ms ({t_incremental / t_completa:.1%} da recarga)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,494 @@
+"""
+Suíte de benchmarks do back-end: tempo e pico de memória de cada método de TranspetroAnalytics
+e de cada endpoint Flask, sobre frotas sintéticas com 1x, 10x e 100x o volume entregue.
+
+Uso (a partir de back/):
+    python benchmarks/bench_suite.py [--escalas 1 10 100] [--repeticoes 3] [--saida bench.json]
+                                     [--comparar bench_anterior.json]
+
+O resultado é um JSON com os metadados do ambiente e uma entrada por (escala, alvo, variante):
+tempo mínimo e mediano em segundos, pico de memória alocada durante a chamada (tracemalloc,
+medido numa execução separada para não distorcer o tempo) e linhas/bytes retornados.
+Variantes: 'frio' descarta as tabelas materializadas e respostas serializadas antes de cada
+execução; 'cache' mede a chamada repetida; '304' mede a revalidação condicional por ETag.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DIR_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIR_BENCHMARKS, '..', 'app'))
+from analytics import TranspetroAnalytics  # noqa: E402
+from compartilhado import DatasetCompartilhado  # noqa: E402
+import planilhas  # noqa: E402
+from gerador_frota import gerar_escala, escrever_csvs  # noqa: E402
+from stub_era5 import iniciar_stub_era5  # noqa: E402
+
+
+# ==============================================================================
+# MEDIÇÃO
+# ==============================================================================
+
+def medir(funcao: Callable[[], Any], repeticoes: int, preparar: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """Tempo (mínimo e mediana de `repeticoes`) e pico de memória de `funcao`; `preparar` roda fora do cronômetro."""
+    tempos = []
+    tamanho = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeticoes):
+            if preparar is not None:
+                preparar()
+            gc.collect()
+            inicio = time.perf_counter()
+            resultado = funcao()
+            tempos.append(time.perf_counter() - inicio)
+            # Solta o resultado antes da próxima execução (nas escalas maiores são GBs)
+            tamanho = _tamanho_resultado(resultado)
+            del resultado
+
+        if preparar is not None:
+            preparar()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            funcao()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'segundos_min': min(tempos),
+        'segundos_mediana': float(np.median(tempos)),
+        'repeticoes': repeticoes,
+        'pico_memoria_bytes': pico,
+        **tamanho,
+    }
+
+
+def _tamanho_resultado(resultado: Any) -> Dict[str, Any]:
+    if isinstance(resultado, pd.DataFrame):
+        return {'linhas': len(resultado)}
+    if isinstance(resultado, (list, dict)):
+        return {'linhas': len(resultado)}
+    if hasattr(resultado, 'status_code'):  # resposta do test_client do Flask
+        return {'status': resultado.status_code, 'bytes': len(resultado.get_data())}
+    return {}
+
+
+class Registro:
+    """Acumula os resultados de uma escala e imprime uma linha por medição."""
+
+    def __init__(self, escala: float, repeticoes: int):
+        self.escala = escala
+        self.repeticoes = repeticoes
+        self.resultados: List[Dict[str, Any]] = []
+        self.cobertos: set = set()
+
+    def medir(self, alvo: str, variante: str, funcao: Callable[[], Any], preparar: Optional[Callable[[], Any]] = None,
+              repeticoes: Optional[int] = None) -> None:
+        r = medir(funcao, repeticoes or self.repeticoes, preparar)
+        self.resultados.append({'escala': self.escala, 'alvo': alvo, 'variante': variante, **r})
+        self.cobertos.add(alvo)
+        print(f"  {alvo:72s} {variante:14s} {r['segundos_min'] * 1000:10.1f} ms "
+              f"{r['pico_memoria_bytes'] / 2 ** 20:9.1f} MiB")
+
+
+# ==============================================================================
+# LOTES DE INGESTÃO
+# ==============================================================================
+
+class LotesIngestao:
+    """
+    Lotes com o último dia de eventos/consumo da frota gerada, com sessionIds sempre inéditos
+    (cada chamada seria descartada como duplicada se reaproveitasse os ids).
+    """
+
+    def __init__(self, dados: Dict[str, pd.DataFrame]):
+        eventos = dados['eventos']
+        ultimo_dia = eventos['startGMTDate'] > eventos['startGMTDate'].max() - pd.Timedelta(days=1)
+        self.eventos = eventos[ultimo_dia].copy()
+        self.consumo = dados['consumo'][dados['consumo']['SESSION_ID'].isin(self.eventos['sessionId'])].copy()
+        self._proximo_id = int(eventos['sessionId'].max()) + 1
+        self._id_base = int(self.eventos['sessionId'].min())
+
+    def proximo(self):
+        deslocamento = self._proximo_id - self._id_base
+        self._proximo_id += int(self.eventos['sessionId'].max()) - self._id_base + 1
+        return (self.eventos.assign(sessionId=self.eventos['sessionId'] + deslocamento),
+                self.consumo.assign(SESSION_ID=self.consumo['SESSION_ID'] + deslocamento))
+
+
+# ==============================================================================
+# ALVOS: MÉTODOS DE TranspetroAnalytics
+# ==============================================================================
+
+def _opcoes_clima(url_clima: Optional[str]) -> Dict[str, str]:
+    return {'clima_api_url': url_clima} if url_clima else {}
+
+
+def bench_metodos(reg: Registro, caminhos: Dict[str, str], pasta: str, lotes: LotesIngestao,
+                  url_clima: Optional[str]) -> None:
+    fontes = (caminhos['eventos'], caminhos['consumo'], caminhos['revestimento'], caminhos['iws'])
+    dir_snapshots = os.path.join(pasta, '.snapshots')
+
+    reg.medir('TranspetroAnalytics.__init__', 'csv', lambda: TranspetroAnalytics(*fontes))
+    with contextlib.redirect_stdout(io.StringIO()):
+        TranspetroAnalytics(*fontes, snapshot_dir=dir_snapshots)  # grava os snapshots
+    reg.medir('TranspetroAnalytics.__init__', 'snapshot',
+              lambda: TranspetroAnalytics(*fontes, snapshot_dir=dir_snapshots))
+
+    # Carga paralela: construtor + espera pelo fim da carga de todas as tabelas base
+    reg.medir('aguardar_carga', 'csv_paralelo', lambda: TranspetroAnalytics(*fontes, paralelo=True).aguardar_carga())
+    reg.medir('aguardar_carga', 'snap_paralelo',
+              lambda: TranspetroAnalytics(*fontes, snapshot_dir=dir_snapshots, paralelo=True).aguardar_carga())
+
+    reg.medir('TranspetroAnalytics.__init__', 'csv_compacto', lambda: TranspetroAnalytics(*fontes, compacto=True))
+    with contextlib.redirect_stdout(io.StringIO()):
+        compacto = TranspetroAnalytics(*fontes, snapshot_dir=dir_snapshots, compacto=True)
+    reg.medir('TranspetroAnalytics.__init__', 'snap_compacto',
+              lambda: TranspetroAnalytics(*fontes, snapshot_dir=dir_snapshots, compacto=True))
+
+    # Modo compacto: as métricas mais pesadas e o relatório de bytes por tabela
+    reg.medir('calcular_consumo_mensal_total', 'compacto', compacto.calcular_consumo_mensal_total, compacto.invalidar_cache)
+    reg.medir('calcular_risco_bioincrustacao_frota', 'compacto',
+              lambda: compacto.calcular_risco_bioincrustacao_frota(compacto.calcular_conformidade_normam_401()),
+              compacto.invalidar_cache)
+    reg.medir('relatorio_memoria', 'frio', compacto.relatorio_memoria, compacto.invalidar_cache)
+    for nome, uso in compacto.relatorio_memoria().items():
+        if 'bytes_padrao' in uso:
+            print(f"  memória {nome:12s} {uso['bytes_padrao'] / 2**20:9.1f} MiB -> {uso['bytes_compacto'] / 2**20:9.1f} MiB")
+    del compacto
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        analytics = TranspetroAnalytics(*fontes, **_opcoes_clima(url_clima))
+
+    # Carregamento e consolidação
+    reg.medir('_carregar_eventos', 'csv', lambda: analytics._carregar_eventos(caminhos['eventos']))
+    reg.medir('_carregar_consumo', 'csv', lambda: analytics._carregar_consumo(caminhos['consumo']))
+    reg.medir('_carregar_revestimento', 'csv', lambda: analytics._carregar_revestimento(caminhos['revestimento']))
+    # Planilhas .xlsx entregues no repositório (lidas sem os CSVs exportados): XML e depois cache por hash
+    for tabela, planilha in (('revestimento', 'Dados navios Hackathon.xlsx'), ('relatorios_iws', 'Relatorios IWS.xlsx')):
+        caminho = os.path.join(DIR_BENCHMARKS, '..', 'app', planilha)
+        carregar = getattr(analytics, f'_carregar_{tabela}')
+        reg.medir(f'_carregar_{tabela}', 'xlsx_frio', lambda: carregar(caminho), planilhas._abas_lidas.clear)
+        reg.medir(f'_carregar_{tabela}', 'xlsx_cache', lambda: carregar(caminho))
+    reg.medir('_carregar_relatorios_iws', 'csv', lambda: analytics._carregar_relatorios_iws(caminhos['iws']))
+    reg.medir('_consolidar_dados', 'frio', analytics._consolidar_dados)
+
+    frio = analytics.invalidar_cache
+    reg.medir('pronto', 'carregada', analytics.pronto)
+    reg.medir('estado_carga', 'carregada', analytics.estado_carga)
+
+    # Métricas do dashboard
+    reg.medir('calcular_total_embarcacoes', 'frio', analytics.calcular_total_embarcacoes)
+    reg.medir('calcular_embarcacoes_operando', 'frio', analytics.calcular_embarcacoes_operando)
+    reg.medir('calcular_consumo_mensal_total', 'frio', analytics.calcular_consumo_mensal_total, frio)
+    reg.medir('calcular_consumo_mensal_total', 'cache', analytics.calcular_consumo_mensal_total)
+    reg.medir('cubo_consumo', 'frio', analytics.cubo_consumo, frio)
+    cubo = analytics.cubo_consumo()
+    reg.medir('CuboConsumo.agregar', 'navio_mes',
+              lambda: cubo.agregar(['navio', 'mes'], inicio='2023-01', fim='2023-12'), cubo._consultas.clear)
+    reg.medir('CuboConsumo.agregar', 'navio_mes_cache', lambda: cubo.agregar(['navio', 'mes'], inicio='2023-01', fim='2023-12'))
+    reg.medir('calcular_intervalos_navegacao', 'frio', analytics.calcular_intervalos_navegacao)
+    for agrupar_por in (None, 'shipName', 'Classe'):
+        variante = f'frio:{agrupar_por}' if agrupar_por else 'frio'
+        reg.medir('calcular_embarcacoes_navegando_por_dia', variante,
+                  lambda: analytics.calcular_embarcacoes_navegando_por_dia(agrupar_por), frio)
+    analytics.calcular_embarcacoes_navegando_por_dia()
+    reg.medir('calcular_embarcacoes_navegando_por_dia', 'cache', analytics.calcular_embarcacoes_navegando_por_dia)
+
+    # Conformidade e risco
+    reg.medir('calcular_conformidade_normam_401', 'frio', analytics.calcular_conformidade_normam_401)
+    df_conformidade = analytics.calcular_conformidade_normam_401()
+    reg.medir('calcular_risco_bioincrustacao_frota', 'frio',
+              lambda: analytics.calcular_risco_bioincrustacao_frota(df_conformidade), frio)
+    reg.medir('calcular_risco_bioincrustacao_frota', 'cache',
+              lambda: analytics.calcular_risco_bioincrustacao_frota(df_conformidade))
+    reg.medir('invalidar_cache', 'todas', frio, lambda: analytics.calcular_risco_bioincrustacao_frota(df_conformidade))
+
+    # Consultas indexadas
+    df_risco = analytics.calcular_risco_bioincrustacao_frota(df_conformidade)
+    navio = str(df_risco['shipName'].iloc[len(df_risco) // 2]) if not df_risco.empty else 'N/D'
+    reg.medir('consultar_tabela', 'frio',
+              lambda: analytics.consultar_tabela('risco', df_risco, 'Mês/Ano', navio, '2023-01', '2023-12'),
+              lambda: analytics.invalidar_cache('indice_tabela:risco'))
+    reg.medir('consultar_tabela', 'cache',
+              lambda: analytics.consultar_tabela('risco', df_risco, 'Mês/Ano', navio, '2023-01', '2023-12'))
+
+    # Ponto de limpeza ideal: perfis dos navios materializados, grade padrão de cenários
+    reg.medir('calcular_ponto_limpeza_ideal', 'frio', lambda: analytics.calcular_ponto_limpeza_ideal(df_conformidade),
+              lambda: analytics.invalidar_cache('perfis_limpeza'))
+    reg.medir('calcular_ponto_limpeza_ideal', 'perfis_cache', lambda: analytics.calcular_ponto_limpeza_ideal(df_conformidade))
+    reg.medir('calcular_ponto_limpeza_ideal', 'perfis_cache_1_processo',
+              lambda: analytics.calcular_ponto_limpeza_ideal(df_conformidade, processos=1))
+
+    # Dataset compartilhado entre workers: publicação, mapeamento e instância sobre as tabelas mapeadas
+    tabelas = analytics.exportar_tabelas(df_conformidade)
+    reg.medir('exportar_tabelas', 'cache', lambda: analytics.exportar_tabelas(df_conformidade))
+    dataset = DatasetCompartilhado(os.path.join(pasta, '.dataset'))
+    reg.medir('DatasetCompartilhado.publicar', 'geracao', lambda: dataset.publicar(tabelas, list(fontes)))
+    reg.medir('DatasetCompartilhado.anexar', 'mmap', dataset.anexar)
+    reg.medir('TranspetroAnalytics.__init__', 'tabelas', lambda: TranspetroAnalytics(*fontes, tabelas=dataset.anexar()[1]))
+    del tabelas
+
+    # Clima (servidor ERA5 local) e o dataset de treinamento navio-dia
+    if url_clima:
+        reg.medir('obter_dados_climaticos_navio', 'stub', lambda: analytics.obter_dados_climaticos_navio(navio))
+        df_clima = analytics.obter_dados_climaticos_navio(navio)
+        # Cinco navios: mostra o reaproveitamento de (célula, dia) entre navios sem baixar a frota inteira
+        cinco_navios = list(analytics._nomes_navio(analytics.df_eventos['shipName']).unique()[:5])
+        reg.medir('obter_clima_frota', 'stub_5_navios', lambda: analytics.obter_clima_frota(cinco_navios))
+    else:
+        df_clima = pd.DataFrame()
+    reg.medir('predizer_risco_bioincrustacao', 'navio',
+              lambda: analytics.predizer_risco_bioincrustacao(df_clima, ship_name=navio))
+    reg.medir('construir_dataset_treinamento', 'frota_sem_clima',
+              lambda: analytics.construir_dataset_treinamento(os.path.join(pasta, 'treinamento'), com_clima=False))
+
+    # Ingestão incremental (por último: altera a base)
+    reg.medir('ingerir_eventos', 'ultimo_dia', lambda: analytics.ingerir_eventos(lotes.proximo()[0]))
+    reg.medir('ingerir_consumo', 'ultimo_dia', lambda: analytics.ingerir_consumo(lotes.proximo()[1]))
+
+    numeracao = itertools.count()
+
+    def ingerir_arquivos():
+        df_eventos, df_consumo = lotes.proximo()
+        destino = os.path.join(pasta, 'ingestao', str(next(numeracao)))
+        os.makedirs(destino)
+        df_eventos.to_csv(os.path.join(destino, 'eventos.csv'), index=False)
+        df_consumo.to_csv(os.path.join(destino, 'consumo.csv'), index=False)
+        return destino
+
+    destinos = []
+    reg.medir('ingerir_pasta', 'ultimo_dia', lambda: analytics.ingerir_pasta(destinos.pop()),
+              lambda: destinos.append(ingerir_arquivos()))
+
+
+# ==============================================================================
+# ALVOS: ENDPOINTS FLASK
+# ==============================================================================
+
+def bench_endpoints(reg: Registro, caminhos: Dict[str, str], pasta: str, lotes: LotesIngestao,
+                    url_clima: Optional[str]) -> None:
+    # api.py carrega os arquivos (nomes relativos) ao ser importado: importa de dentro da pasta gerada
+    diretorio_anterior = os.getcwd()
+    os.chdir(pasta)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import api
+            api.aguardar_inicializacao()
+            # Libera a instância da importação (ou da escala anterior) antes de montar a desta escala
+            api._estado_analise = (None, pd.DataFrame())
+            api._respostas_serializadas.clear()
+            gc.collect()
+            analytics = TranspetroAnalytics(caminhos['eventos'], caminhos['consumo'], caminhos['revestimento'],
+                                            caminhos['iws'], **_opcoes_clima(url_clima))
+            df_conformidade = analytics.calcular_conformidade_normam_401()
+            api._estado_analise = (analytics, df_conformidade)
+            api._respostas_serializadas.clear()
+    finally:
+        os.chdir(diretorio_anterior)
+
+    cliente = api.app.test_client()
+    cabecalhos = {'Accept-Encoding': 'gzip'}
+
+    def frio():
+        analytics.invalidar_cache()
+        api._respostas_serializadas.clear()
+
+    navio = str(df_conformidade['shipName'].iloc[0]) if not df_conformidade.empty else 'N/D'
+    lote = ','.join(map(str, df_conformidade['shipName'].unique()[:5])) or 'N/D'
+    # Cursor opaco da segunda página (ligado à versão da tabela, que não muda entre as medições)
+    pagina = cliente.get('/metrics/risco_bioincrustacao_frota?limit=100').get_json().get('paginacao') or {}
+    cursor = pagina.get('proximo_cursor') or ''
+    rotas = {
+        '/': ['/'],
+        '/metrics/total_embarcacoes': ['/metrics/total_embarcacoes'],
+        '/metrics/consumo_mensal': ['/metrics/consumo_mensal', '/metrics/consumo_mensal?from=2023-01&to=2023-12'],
+        '/metrics/consumo/<string:dimensao>': ['/metrics/consumo/frota', '/metrics/consumo/combustivel?mensal=1',
+                                               f'/metrics/consumo/evento?ship={navio}&from=2023-01&to=2023-12'],
+        '/metrics/navegacao_diaria': ['/metrics/navegacao_diaria', '/metrics/navegacao_diaria?agrupar_por=Classe',
+                                      '/metrics/navegacao_diaria?agrupar_por=shipName&limit=500'],
+        '/metrics/conformidade_normam': ['/metrics/conformidade_normam',
+                                         f'/metrics/conformidade_normam?ship={navio}&from=2023-01&to=2023-12'],
+        '/metrics/risco_bioincrustacao_frota': ['/metrics/risco_bioincrustacao_frota',
+                                                f'/metrics/risco_bioincrustacao_frota?ship={navio}',
+                                                f'/metrics/risco_bioincrustacao_frota?limit=100&cursor={cursor}'],
+        '/metrics/ponto_limpeza_ideal': ['/metrics/ponto_limpeza_ideal',
+                                         f'/metrics/ponto_limpeza_ideal?ship={navio}&preco=500,700,900&custo=100000'],
+        '/export/<string:tabela>': ['/export/conformidade_normam', '/export/navegacao_diaria?agrupar_por=shipName&formato=csv',
+                                    f'/export/risco_bioincrustacao_frota?ship={navio}&from=2023-01&to=2023-12'],
+        '/metrics/navios': [f'/metrics/navios?ship={lote}&metricas=risco,conformidade&from=2023-01&to=2023-12'],
+        '/metrics/_perf': ['/metrics/_perf', '/metrics/_perf?format=prometheus'],
+        '/prontidao': ['/prontidao'],
+    }
+    for regra, urls in rotas.items():
+        for url in urls:
+            alvo = f'GET {url}'
+            # get_data(): as rotas /export só serializam à medida que o corpo é lido
+            reg.medir(alvo, 'frio', lambda: cliente.get(url, headers=cabecalhos).get_data(), frio)
+            reg.medir(alvo, 'cache', lambda: cliente.get(url, headers=cabecalhos).get_data())
+            etag = cliente.get(url, headers=cabecalhos).headers.get('ETag', '').strip('"')
+            if etag:
+                reg.medir(alvo, '304', lambda: cliente.get(url, headers={**cabecalhos, 'If-None-Match': f'"{etag}"'}))
+        reg.cobertos.add(regra)
+
+    if url_clima:
+        # Mede o download completo: sem isso, downloads mais longos que a espera das rotas viram 202
+        api.CLIMA_ESPERA_S = 600
+        reg.medir(f'GET /metrics/clima_navio/{navio}', 'stub', lambda: cliente.get(f'/metrics/clima_navio/{navio}'))
+        reg.cobertos.add('/metrics/clima_navio/<string:ship_name>')
+        reg.medir(f'GET /export/clima_navio?ship={navio}', 'stub',
+                  lambda: cliente.get(f'/export/clima_navio?ship={navio}').get_data())
+        reg.medir('GET /metrics/navios (5 navios, com clima)', 'stub',
+                  lambda: cliente.get(f'/metrics/navios?ship={lote}&from=2023-01&to=2023-12').get_data())
+
+        def tarefa_clima():
+            # Ciclo completo do cliente assíncrono: POST, polling até concluir e GET com os dados
+            tarefa = cliente.post('/tarefas/clima', json={'navios': [navio]}).get_json()['tarefa']
+            while cliente.get(f'/tarefas/{tarefa}?dados=0').get_json()['status'] in ('pendente', 'executando'):
+                time.sleep(0.005)
+            return cliente.get(f'/tarefas/{tarefa}', headers=cabecalhos)
+
+        reg.medir('POST /tarefas/clima + GET /tarefas/<id>', 'stub', tarefa_clima)
+        reg.cobertos.update({'/tarefas/clima', '/tarefas/<string:tarefa_id>'})
+
+    def registros(df: pd.DataFrame) -> list:
+        return json.loads(df.to_json(orient='records', date_format='iso'))
+
+    # Os lotes aceitos são gravados na pasta de ingestão (nome relativo): mantém-nos na pasta gerada
+    api.INGESTAO_DIR = os.path.join(pasta, 'ingestao_api')
+    pendentes = []
+    reg.medir('POST /ingestao/eventos', 'ultimo_dia', lambda: cliente.post('/ingestao/eventos', json=pendentes.pop()),
+              lambda: pendentes.append(registros(lotes.proximo()[0])))
+    reg.medir('POST /ingestao/consumo', 'ultimo_dia', lambda: cliente.post('/ingestao/consumo', json=pendentes.pop()),
+              lambda: pendentes.append(registros(lotes.proximo()[1])))
+    # registrar_arquivo_ingerido roda dentro do POST, ao gravar o lote
+    reg.cobertos.update({'/ingestao/<string:tabela>', 'registrar_arquivo_ingerido'})
+
+    # Por último: a atualização troca a instância da API por uma instância nova sobre as mesmas tabelas base
+    reg.medir('api.atualizar_pre_calculos', 'virada_mes', lambda: api.atualizar_pre_calculos('virada_mes'))
+
+    reg.rotas_flask = sorted(r.rule for r in api.app.url_map.iter_rules() if r.endpoint != 'static')
+
+
+# ==============================================================================
+# EXECUÇÃO / COMPARAÇÃO
+# ==============================================================================
+
+def sem_cobertura(cobertos: set, rotas_flask: List[str]) -> List[str]:
+    """Métodos públicos e rotas que a suíte ainda não mede (para não esquecer alvos novos)."""
+    metodos = [nome for nome in vars(TranspetroAnalytics)
+               if not nome.startswith('_') and callable(getattr(TranspetroAnalytics, nome))]
+    return sorted(set(metodos + rotas_flask) - cobertos)
+
+
+def comparar(resultados: List[Dict[str, Any]], caminho_anterior: str, limiar: float) -> None:
+    with open(caminho_anterior, encoding='utf-8') as f:
+        anteriores = {(r['escala'], r['alvo'], r['variante']): r for r in json.load(f)['resultados']}
+
+    print(f"\n--- Comparação com {caminho_anterior} (limiar {limiar:.2f}x) ---")
+    for r in resultados:
+        anterior = anteriores.get((r['escala'], r['alvo'], r['variante']))
+        if anterior is None or anterior['segundos_min'] <= 0:
+            continue
+        razao = r['segundos_min'] / anterior['segundos_min']
+        # Diferenças abaixo de 1 ms são ruído de medição, não regressão
+        relevante = abs(r['segundos_min'] - anterior['segundos_min']) >= 1e-3
+        marca = '' if not relevante else 'REGRESSÃO' if razao >= limiar else 'melhora' if razao <= 1 / limiar else ''
+        print(f"  {r['escala']:>5g}x {r['alvo']:72s} {r['variante']:14s} {razao:6.2f}x {marca}")
+
+
+def _revisao_git() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIR_BENCHMARKS, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escalas', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sem-clima', action='store_true', help='Não sobe o stub ERA5 nem mede o clima')
+    parser.add_argument('--saida', default='bench_resultados.json')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para apontar regressões')
+    parser.add_argument('--limiar', type=float, default=1.25)
+    args = parser.parse_args()
+
+    # Avisos dos loaders repetidos a cada execução só poluem a tabela de resultados
+    warnings.filterwarnings('ignore', category=UserWarning)
+    url_clima = None if args.sem_clima else iniciar_stub_era5()
+    saida = {
+        'meta': {
+            'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revisao_git': _revisao_git(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeticoes': args.repeticoes,
+            'seed': args.seed,
+        },
+        'escalas': [],
+        'resultados': [],
+    }
+
+    for escala in args.escalas:
+        inicio = time.perf_counter()
+        dados = gerar_escala(escala, seed=args.seed)
+        with tempfile.TemporaryDirectory(prefix='bench_frota_') as pasta:
+            caminhos = escrever_csvs(dados, pasta)
+            tempo_geracao = time.perf_counter() - inicio
+            descricao = {
+                'escala': escala,
+                'navios': int(dados['eventos']['shipName'].nunique()),
+                'linhas': {nome: len(df) for nome, df in dados.items()},
+                'segundos_geracao': tempo_geracao,
+            }
+            # Só os lotes de ingestão ficam em memória; o restante é lido dos CSVs pelos alvos
+            lotes = LotesIngestao(dados)
+            del dados
+            print(f"\n=== Escala {escala:g}x: {descricao['navios']} navios, {descricao['linhas']['eventos']} eventos, "
+                  f"{descricao['linhas']['consumo']} linhas de consumo (gerados em {tempo_geracao:.1f} s) ===")
+
+            reg = Registro(escala, args.repeticoes)
+            reg.rotas_flask = []
+            bench_metodos(reg, caminhos, pasta, lotes, url_clima)
+            gc.collect()
+            bench_endpoints(reg, caminhos, pasta, lotes, url_clima)
+
+        faltando = sem_cobertura(reg.cobertos, reg.rotas_flask)
+        if faltando:
+            print(f"  [aviso] Sem benchmark: {', '.join(faltando)}")
+        saida['escalas'].append({**descricao, 'sem_cobertura': faltando})
+        saida['resultados'].extend(reg.resultados)
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        comparar(saida['resultados'], args.comparar, args.limiar)
+
+
+if __name__ == '__main__':
+    main()
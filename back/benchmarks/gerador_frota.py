@@ -0,0 +1,173 @@
+"""
+Gerador de frota sintética para testes de escala do back-end.
+
+Produz as quatro entradas de TranspetroAnalytics no mesmo formato dos arquivos reais
+(nomes de colunas, formatos de data e vocabulário): eventos de viagem, consumo por sessão,
+especificação de revestimento e relatórios IWS.
+
+Uso (a partir de back/):
+    python benchmarks/gerador_frota.py --navios 21 --anos 5 --eventos-por-dia 1.2 --saida /tmp/frota
+"""
+import argparse
+import os
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+# Nomes de arquivo esperados por api.py
+ARQUIVOS = {
+    'eventos': 'ResultadoQueryEventos.csv',
+    'consumo': 'ResultadoQueryConsumo.csv',
+    'revestimento': 'Dados navios Hackathon.xlsx - Especificacao revestimento.csv',
+    'iws': 'Relatorios IWS.xlsx - Planilha1.csv',
+}
+
+# Terminais da costa brasileira (lat, lon)
+PORTOS = np.array([
+    (-23.96, -46.30),  # Santos
+    (-23.80, -45.40),  # São Sebastião
+    (-23.02, -44.32),  # Angra dos Reis
+    (-22.90, -43.17),  # Rio de Janeiro
+    (-20.32, -40.29),  # Vitória
+    (-12.97, -38.51),  # Salvador
+    (-8.39, -34.96),   # Suape
+    (-2.53, -44.30),   # São Luís
+    (-32.03, -52.10),  # Rio Grande
+])
+
+CLASSES = ['Suezmax', 'Aframax', 'MR2', 'Gaseiro']
+# Proporções aproximadas do ResultadoQueryConsumo.csv real
+COMBUSTIVEIS = ['LSHFO 0.5', 'ULSMGO 0.1', 'LSMGO 0.5', 'VLSHFO 0.1', 'LSLFO 0.5']
+PESOS_COMBUSTIVEIS = [0.38, 0.34, 0.17, 0.08, 0.03]
+TIPOS_INCRUSTACAO = ['Craca, alga e limo', 'Moles e duras', 'Alga e limo', 'Duras no fundo', 'Limo',
+                     'Cracas e limo', 'Alga, limo e calcárea']
+
+# Referência de escala 1x: dimensões aproximadas dos dados entregues no hackathon
+NAVIOS_BASE = 21
+ANOS_BASE = 4.7
+EVENTOS_POR_DIA_BASE = 1.2
+
+
+def gerar_frota(n_navios: int = NAVIOS_BASE, anos: float = ANOS_BASE, eventos_por_dia: float = EVENTOS_POR_DIA_BASE,
+                inicio: str = '2021-03-01', seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """
+    Gera a frota sintética. `eventos_por_dia` é a média de eventos por navio por dia; as
+    durações seguem a alternância NAVEGACAO -> (EM PORTO | FUNDEIO) -> NAVEGACAO.
+    Retorna um dicionário com os DataFrames 'eventos', 'consumo', 'revestimento' e 'iws'
+    no formato bruto (colunas dos CSVs originais).
+    """
+    rng = np.random.default_rng(seed)
+    t0 = pd.Timestamp(inicio)
+    horas_totais = anos * 365 * 24
+    duracao_media = 24.0 / eventos_por_dia
+    nomes = [f'NAVIO {i:04d}' for i in range(n_navios)]
+
+    blocos = []
+    for nome in nomes:
+        n = int(horas_totais / duracao_media * 1.2) + 2
+        navegando = np.arange(n) % 2 == 0
+        # Navegação dura ~1.5x a média; paradas ~0.5x (média geral preservada)
+        duracoes = rng.lognormal(np.log(duracao_media), 0.6, size=n) * np.where(navegando, 1.5, 0.5)
+        deslocamentos = np.concatenate([[0.0], np.cumsum(duracoes)[:-1]]) + rng.uniform(0, duracao_media)
+        manter = deslocamentos < horas_totais
+        duracoes, deslocamentos, navegando = duracoes[manter], deslocamentos[manter], navegando[manter]
+
+        parada = np.where(rng.random(len(duracoes)) < 0.7, 'EM PORTO', 'FUNDEIO')
+        portos = PORTOS[rng.integers(0, len(PORTOS), size=len(duracoes))]
+        # Em navegação a posição registrada fica ao largo do terminal
+        deslocamento_mar = np.where(navegando[:, None], rng.normal(0, 1.5, size=(len(duracoes), 2)), 0.0)
+        posicoes = portos + deslocamento_mar + rng.normal(0, 0.02, size=(len(duracoes), 2))
+
+        inicios = (t0 + pd.to_timedelta(deslocamentos, unit='h')).floor('s')
+        blocos.append(pd.DataFrame({
+            'shipName': nome,
+            'eventName': np.where(navegando, 'NAVEGACAO', parada),
+            'startGMTDate': inicios,
+            'endGMTDate': (inicios + pd.to_timedelta(duracoes, unit='h')).floor('s'),
+            'duration': duracoes.round(2),
+            'decLatitude': posicoes[:, 0].round(5),
+            'decLongitude': posicoes[:, 1].round(5),
+        }))
+
+    df_eventos = pd.concat(blocos, ignore_index=True)
+    df_eventos.insert(0, 'sessionId', 39800000000 + np.arange(len(df_eventos), dtype=np.int64))
+    # Pequena fração de posições ausentes, como nos dados reais
+    df_eventos.loc[rng.random(len(df_eventos)) < 0.01, ['decLatitude', 'decLongitude']] = np.nan
+
+    # Consumo: 1 a 3 combustíveis por sessão (~2.4 em média, como no real), quantidade proporcional à duração
+    n_comb = rng.choice([1, 2, 3], size=len(df_eventos), p=[0.15, 0.35, 0.5])
+    sessoes = np.repeat(df_eventos['sessionId'].to_numpy(), n_comb)
+    horas = np.repeat(df_eventos['duration'].to_numpy(), n_comb)
+    taxa = np.repeat(np.where(df_eventos['eventName'] == 'NAVEGACAO', 1.6, 0.25), n_comb)
+    quantidade = (horas * taxa * rng.uniform(0.5, 1.5, size=len(sessoes))).round(4)
+    quantidade[rng.random(len(quantidade)) < 0.02] = np.nan
+    # Combustíveis distintos dentro da sessão: amostragem ponderada sem reposição (chaves u^(1/peso))
+    chaves = rng.random((len(df_eventos), len(COMBUSTIVEIS))) ** (1 / np.array(PESOS_COMBUSTIVEIS))
+    escolhidos = np.argsort(-chaves, axis=1)[np.arange(len(COMBUSTIVEIS)) < n_comb[:, None]]
+    df_consumo = pd.DataFrame({
+        'SESSION_ID': sessoes,
+        'CONSUMED_QUANTITY': quantidade,
+        'DESCRIPTION': np.array(COMBUSTIVEIS)[escolhidos],
+    })
+
+    # Revestimento: 1 a 3 aplicações por navio; a primeira sempre antes do início dos eventos
+    linhas_rev = []
+    for nome in nomes:
+        classe = CLASSES[rng.integers(0, len(CLASSES))]
+        dias = np.sort(rng.integers(-8 * 365, int(anos * 365), size=int(rng.integers(1, 4))))
+        dias[0] = rng.integers(-8 * 365, 0)
+        for data in t0 + pd.to_timedelta(np.sort(dias), unit='D'):
+            linhas_rev.append({
+                'Nome do navio': nome,
+                'Classe': classe,
+                'Data da aplicacao': data.strftime('%d/%m/%Y'),
+                'Cr1. Período base de verificação': int(rng.choice([35, 52, 60, 150])),
+                'Cr1. Parada máxima acumulada no período': int(rng.choice([35, 40, 150])),
+            })
+    df_revestimento = pd.DataFrame(linhas_rev)
+
+    # IWS: 1 ou 2 inspeções por navio dentro do período
+    n_iws = rng.integers(1, 3, size=n_navios)
+    df_iws = pd.DataFrame({
+        'Embarcação': np.repeat(nomes, n_iws),
+        'Data': (t0 + pd.to_timedelta(rng.integers(0, int(anos * 365), size=n_iws.sum()), unit='D')).strftime(
+            '%d/%m/%Y'),
+        'Tipo de incrustação da embarcação': rng.choice(TIPOS_INCRUSTACAO, size=n_iws.sum()),
+    })
+
+    return {'eventos': df_eventos, 'consumo': df_consumo, 'revestimento': df_revestimento, 'iws': df_iws}
+
+
+def gerar_escala(escala: float, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """Frota com `escala` vezes o volume entregue (mais navios, mesmo período e ritmo de eventos)."""
+    return gerar_frota(n_navios=max(1, int(round(NAVIOS_BASE * escala))), seed=seed)
+
+
+def escrever_csvs(dados: Dict[str, pd.DataFrame], pasta: str) -> Dict[str, str]:
+    """Grava os DataFrames com os nomes de arquivo usados por api.py e retorna os caminhos."""
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = {}
+    for nome, df in dados.items():
+        caminhos[nome] = os.path.join(pasta, ARQUIVOS[nome])
+        df.to_csv(caminhos[nome], index=False)
+    return caminhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--navios', type=int, default=NAVIOS_BASE)
+    parser.add_argument('--anos', type=float, default=ANOS_BASE)
+    parser.add_argument('--eventos-por-dia', type=float, default=EVENTOS_POR_DIA_BASE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--saida', required=True, help='Pasta onde os CSVs serão gravados')
+    args = parser.parse_args()
+
+    dados = gerar_frota(args.navios, args.anos, args.eventos_por_dia, seed=args.seed)
+    for nome, caminho in escrever_csvs(dados, args.saida).items():
+        print(f"{nome:13s} {len(dados[nome]):>10d} linhas -> {caminho}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Implementações originais (laço por navio) da conformidade NORMAM 401 e do risco de
+bioincrustação da frota, mantidas como referência: os testes comparam as versões vetorizadas de
+TranspetroAnalytics com estas, e `bench_conformidade_risco.py` mede as duas.
+Recebem as tabelas já carregadas (df_revestimento/df_eventos no formato de TranspetroAnalytics).
+"""
+import pandas as pd
+
+
+def conformidade_normam_401(df_revestimento: pd.DataFrame, df_eventos: pd.DataFrame,
+                            hoje=None) -> pd.DataFrame:
+    if df_revestimento.empty or df_eventos.empty:
+        return pd.DataFrame({'Mês/Ano': [], 'shipName': [], 'Conformidade (%)': []})
+
+    df_r = df_revestimento.copy()
+
+    min_date = df_r['DataAplicacao'].min().to_period('M')
+    max_date = pd.to_datetime(hoje or 'today').to_period('M')
+    meses = pd.period_range(start=min_date, end=max_date, freq='M')
+    navios_unicos = df_r['shipName'].unique()
+
+    resultados = []
+
+    for ship in navios_unicos:
+        df_ship = df_r[df_r['shipName'] == ship].sort_values('DataAplicacao')
+        last_app_date = pd.NaT
+        T_base_current = 0
+        T_max_current = 0
+
+        for mes in meses:
+            data_fim_mes = mes.to_timestamp(how='end')
+
+            aplicacao_recente = df_ship[df_ship['DataAplicacao'] <= data_fim_mes]
+
+            if not aplicacao_recente.empty:
+                ultima_app = aplicacao_recente.iloc[-1]
+
+                if ultima_app['DataAplicacao'] > last_app_date or pd.isna(last_app_date):
+                    last_app_date = ultima_app['DataAplicacao']
+                    T_base_current = ultima_app['T_base']
+                    T_max_current = ultima_app['T_max']
+
+            if pd.isna(last_app_date) or T_base_current == 0 or T_max_current == 0:
+                conformidade = 0.0
+            else:
+                T_passado_dias = (data_fim_mes - last_app_date).days
+                T_passado_meses = T_passado_dias / 30.437
+
+                consumo_base = T_passado_meses / T_base_current
+                consumo_max = T_passado_meses / T_max_current
+
+                conformidade = 1.0 - max(consumo_base, consumo_max)
+                conformidade = max(0.0, conformidade) * 100.0
+
+            resultados.append({
+                'Mês/Ano': str(mes),
+                'shipName': ship,
+                'Conformidade (%)': round(conformidade, 2)
+            })
+
+    return pd.DataFrame(resultados)
+
+
+def risco_bioincrustacao_frota(df_eventos: pd.DataFrame, df_conformidade: pd.DataFrame) -> pd.DataFrame:
+    if df_eventos.empty:
+        return pd.DataFrame()
+
+    navios_unicos = df_eventos['shipName'].astype(str).str.strip().unique()
+    resultados_frota = []
+
+    for ship_name in navios_unicos:
+        df_navio = df_eventos[df_eventos['shipName'].astype(str).str.strip() == ship_name].copy()
+        df_navio.dropna(subset=['startGMTDate', 'decLatitude', 'eventName'], inplace=True)
+
+        if df_navio.empty:
+            continue
+
+        df_navio['Mes_Ano'] = df_navio['startGMTDate'].dt.to_period('M')
+        df_navio['AbsLat'] = df_navio['decLatitude'].abs()
+
+        df_navio['horas_em_porto'] = df_navio.apply(
+            lambda row: row['duration'] if row['eventName'] == 'EM PORTO' else 0, axis=1
+        )
+
+        df_mensal = df_navio.groupby('Mes_Ano').agg(
+            MediaAbsLat=('AbsLat', 'mean'),
+            TotalHorasPorto=('horas_em_porto', 'sum')
+        ).reset_index()
+
+        df_mensal['shipName'] = ship_name
+        df_mensal['TotalDiasPorto'] = df_mensal['TotalHorasPorto'] / 24
+
+        df_mensal['R_base'] = 0.0
+        df_mensal.loc[df_mensal['MediaAbsLat'] < 20, 'R_base'] = 2.5
+        df_mensal.loc[df_mensal['MediaAbsLat'] >= 20, 'R_base'] = 1.0
+
+        df_mensal['R_exp'] = 0.0
+        df_mensal.loc[df_mensal['TotalDiasPorto'] > 10, 'R_exp'] = 1.5
+        df_mensal.loc[(df_mensal['TotalDiasPorto'] > 3) & (df_mensal['TotalDiasPorto'] <= 10), 'R_exp'] = 0.5
+
+        df_conform_ship = df_conformidade[df_conformidade['shipName'].astype(str).str.strip() == ship_name].copy()
+
+        if not df_conform_ship.empty:
+            df_conform_ship['Mes_Ano'] = df_conform_ship['Mês/Ano'].astype(str).str.strip().str.replace(
+                '-', '', regex=False).str.replace('P', '', regex=False).apply(lambda x: pd.Period(x, freq='M'))
+            df_mensal = pd.merge(df_mensal, df_conform_ship[['Mes_Ano', 'Conformidade (%)']], on='Mes_Ano',
+                                 how='left')
+        else:
+            df_mensal['Conformidade (%)'] = 100.0
+
+        df_mensal['Conformidade (%)'] = df_mensal['Conformidade (%)'].fillna(100.0)
+
+        df_mensal['R_coat'] = 0.0
+        df_mensal.loc[df_mensal['Conformidade (%)'] < 25, 'R_coat'] = 1.0
+        df_mensal.loc[(df_mensal['Conformidade (%)'] >= 25) & (df_mensal['Conformidade (%)'] < 75), 'R_coat'] = 0.5
+
+        df_mensal['Risco Total'] = df_mensal['R_base'] + df_mensal['R_exp'] + df_mensal['R_coat']
+        df_mensal['Risco Total (1-5)'] = df_mensal['Risco Total'].clip(lower=1.0, upper=5.0).round().astype(int)
+        df_mensal['Mês/Ano'] = df_mensal['Mes_Ano'].astype(str)
+
+        resultados_frota.append(df_mensal[['shipName', 'Mês/Ano', 'Risco Total (1-5)']])
+
+    if not resultados_frota:
+        return pd.DataFrame({'shipName': [], 'Mês/Ano': [], 'Risco Total (1-5)': []})
+
+    return pd.concat(resultados_frota, ignore_index=True)
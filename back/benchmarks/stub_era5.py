@@ -0,0 +1,95 @@
+"""
+Servidor local que imita o endpoint ERA5 da Open-Meteo (mesmo formato de resposta 'hourly'),
+para medir e testar o caminho de clima sem depender da rede nem da cota da API pública.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+
+class _HandlerERA5(BaseHTTPRequestHandler):
+    # HTTP/1.1: conexões mantidas abertas, como na API real (o pool do cliente as reaproveita)
+    protocol_version = 'HTTP/1.1'
+    stub: "StubERA5" = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        status = self.stub.registrar(self.path, self.client_address) if self.stub is not None else 200
+        if status != 200:
+            corpo = json.dumps({'error': True, 'reason': f'HTTP {status} simulado'}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        horas = pd.date_range(query['start_date'][0],
+                              pd.Timestamp(query['end_date'][0]) + pd.Timedelta(hours=23), freq='h')
+        # Ciclo diário simples em torno de 24 °C
+        temperatura = (24 + 4 * np.sin(2 * np.pi * horas.hour.to_numpy() / 24)).round(1)
+        resposta = {'hourly': {
+            'time': horas.strftime('%Y-%m-%dT%H:%M').tolist(),
+            'temperature_2m': temperatura.tolist(),
+            'apparent_temperature': (temperatura + 1.5).round(1).tolist(),
+        }}
+        # Como a API real: várias coordenadas separadas por vírgula devolvem uma lista, na ordem pedida
+        n_locais = len(query['latitude'][0].split(','))
+        corpo = json.dumps(resposta if n_locais == 1 else [resposta] * n_locais).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+class StubERA5:
+    """
+    Servidor em uma porta livre (thread daemon) que registra as requisições recebidas e as conexões
+    usadas. `falhas` são status HTTP (ex.: 429, 503) devolvidos, em ordem, às primeiras requisições
+    antes das respostas normais.
+    """
+
+    def __init__(self, falhas: Iterable[int] = ()):
+        self.falhas: List[int] = list(falhas)
+        self.caminhos: List[str] = []  # path + query de cada requisição, na ordem de chegada
+        self.status: List[int] = []
+        self.conexoes: Set[Tuple[str, int]] = set()
+        self._lock = threading.Lock()
+
+        handler = type('HandlerERA5', (_HandlerERA5,), {'stub': self})
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, name='stub-era5', daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/v1/era5"
+
+    @property
+    def requisicoes(self) -> int:
+        return len(self.caminhos)
+
+    def registrar(self, caminho: str, cliente: Tuple[str, int]) -> int:
+        """Status a devolver para esta requisição (a próxima falha pendente ou 200)."""
+        with self._lock:
+            status = self.falhas.pop(0) if self.falhas else 200
+            self.caminhos.append(caminho)
+            self.status.append(status)
+            self.conexoes.add(cliente)
+        return status
+
+    def fechar(self) -> None:
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def iniciar_stub_era5() -> str:
+    """Sobe o servidor em uma porta livre (thread daemon) e retorna a URL no formato da API real."""
+    return StubERA5().url
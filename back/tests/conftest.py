@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os módulos do back-end são importados pelo nome (como em api.py), a partir de app/ e benchmarks/
+DIR_TESTES = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIR_TESTES, '..', 'benchmarks'))
+sys.path.insert(0, os.path.join(DIR_TESTES, '..', 'app'))
@@ -0,0 +1,171 @@
+"""
+Rotas da API pelo cliente de teste do Flask, sobre uma frota gerada (gerador_frota) e o clima do
+servidor local de benchmarks/stub_era5.py.
+"""
+import gzip
+import io
+import json
+import os
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import exportacao
+from analytics import TranspetroAnalytics
+from gerador_frota import escrever_csvs, gerar_frota
+from stub_era5 import StubERA5
+
+
+@pytest.fixture(scope='module')
+def api(tmp_path_factory):
+    # api.py lê os arquivos pelos nomes relativos à pasta corrente e carrega ao ser importado
+    pasta = tmp_path_factory.mktemp('dados')
+    caminhos = escrever_csvs(gerar_frota(n_navios=6, anos=2, seed=11), str(pasta))
+    stub = StubERA5()
+    diretorio = os.getcwd()
+    os.environ.setdefault('ATUALIZACAO_INTERVALO_S', '0')
+    os.chdir(pasta)
+    try:
+        import api as modulo
+        assert modulo.aguardar_inicializacao(120)
+        # Mesma base, com o clima vindo do stub (as tarefas de clima usam a instância do estado)
+        analise = TranspetroAnalytics(caminhos['eventos'], caminhos['consumo'], caminhos['revestimento'],
+                                      caminhos['iws'], clima_api_url=stub.url,
+                                      clima_cache_dir=str(pasta / 'clima'))
+        modulo._estado_analise = (analise, analise.calcular_conformidade_normam_401())
+        modulo._respostas_serializadas.clear()
+        yield modulo
+    finally:
+        os.chdir(diretorio)
+        stub.fechar()
+
+
+@pytest.fixture
+def cliente(api):
+    return api.app.test_client()
+
+
+# --- PONTO DE LIMPEZA IDEAL ---
+
+def test_pli_sem_limpeza_que_compense(cliente):
+    # Limpeza mais cara que qualquer economia no horizonte: Data Ideal nula (melhor dia -1), não 'NaT'
+    resposta = cliente.get('/metrics/ponto_limpeza_ideal?preco=400&custo=1000000000000')
+    assert resposta.status_code == 200
+    dados = resposta.get_json()['dados']
+    assert dados and all(d['Data Ideal'] is None for d in dados)
+    assert all(d['Economia Líquida'] == 0 and d['Combustível Economizado (unidade)'] == 0 for d in dados)
+
+    # Limpeza barata: todos os navios têm uma data
+    dados = cliente.get('/metrics/ponto_limpeza_ideal?preco=1000&custo=1000').get_json()['dados']
+    assert all(isinstance(d['Data Ideal'], str) and d['Economia Líquida'] > 0 for d in dados)
+
+
+# --- EXPORTAÇÃO EM FLUXO ---
+
+@pytest.fixture
+def exportacao_em_blocos(api, monkeypatch):
+    """Blocos de 100 linhas e um valor ausente na conformidade: a tabela sai em vários blocos."""
+    monkeypatch.setattr(api, 'blocos_exportacao', partial(exportacao.blocos, linhas_por_bloco=100))
+    analise, df_conformidade = api._estado_analise
+    df_conformidade = df_conformidade.copy()
+    df_conformidade.loc[150, 'Conformidade (%)'] = np.nan
+    monkeypatch.setattr(api, '_estado_analise', (analise, df_conformidade))
+    return df_conformidade
+
+
+def test_export_ndjson_em_blocos(cliente, exportacao_em_blocos):
+    df = exportacao_em_blocos
+    resposta = cliente.get('/export/conformidade_normam', buffered=False)
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'application/x-ndjson'
+    blocos = list(resposta.response)
+    assert len(blocos) == -(-len(df) // 100)
+
+    registros = [json.loads(linha) for linha in b''.join(blocos).decode('utf-8').splitlines()]
+    assert len(registros) == len(df)
+    assert registros[150]['Conformidade (%)'] is None
+    assert [r['shipName'] for r in registros] == df['shipName'].tolist()
+    assert [r['Mês/Ano'] for r in registros] == df['Mês/Ano'].tolist()
+
+
+def test_export_csv_com_um_cabecalho(cliente, exportacao_em_blocos):
+    df = exportacao_em_blocos
+    resposta = cliente.get('/export/conformidade_normam?formato=csv', buffered=False)
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'text/csv'
+    assert resposta.headers['Content-Disposition'] == 'attachment; filename="conformidade_normam.csv"'
+    blocos = list(resposta.response)
+    assert len(blocos) == 1 + -(-len(df) // 100)  # o cabeçalho sai num bloco próprio
+    corpo = b''.join(blocos).decode('utf-8')
+
+    linhas = corpo.splitlines()
+    assert linhas.count(linhas[0]) == 1 and linhas[0] == ','.join(df.columns)
+    lido = pd.read_csv(io.StringIO(corpo))
+    assert len(lido) == len(df)
+    assert pd.isna(lido.loc[150, 'Conformidade (%)'])
+    assert lido['shipName'].tolist() == df['shipName'].tolist()
+
+
+@pytest.mark.parametrize('formato', ['ndjson', 'csv'])
+def test_export_gzip_igual_ao_sem_compressao(cliente, exportacao_em_blocos, formato):
+    url = f'/export/conformidade_normam?formato={formato}'
+    sem_compressao = cliente.get(url)
+    comprimida = cliente.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in sem_compressao.headers
+    assert comprimida.headers['Content-Encoding'] == 'gzip'
+    assert comprimida.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(comprimida.data) == sem_compressao.data
+
+
+def test_export_tabela_ou_formato_desconhecido(cliente):
+    assert cliente.get('/export/nao_existe').status_code == 404
+    assert cliente.get('/export/conformidade_normam?formato=xml').status_code == 400
+
+
+# --- LOTE DE NAVIOS ---
+
+NAVIOS = ['NAVIO 0000', 'NAVIO 0003']
+
+
+def test_lote_com_clima_pendente(api, cliente, monkeypatch):
+    # Sem espera pelo download: o clima vai para uma tarefa e o restante já vem preenchido
+    monkeypatch.setattr(api, 'CLIMA_ESPERA_S', 0)
+    resposta = cliente.get('/metrics/navios', query_string={'ship': NAVIOS})
+    assert resposta.status_code == 202
+    corpo = resposta.get_json()
+    tarefa = corpo['clima_pendente']['url']
+    assert resposta.headers['Location'] == tarefa
+    assert corpo['clima_pendente']['navios'] == NAVIOS
+
+    analise, df_conformidade = api._estado_analise
+    for navio in NAVIOS:
+        item = corpo['navios'][navio]
+        assert item['clima'] is None and item['tarefa_clima'] == tarefa
+        assert len(item['conformidade']) == (df_conformidade['shipName'] == navio).sum()
+        assert len(item['risco']) > 0 and {r['shipName'] for r in item['risco']} == {navio}
+
+    # A tarefa termina com o clima dos dois navios; o próximo lote já responde 200 com ele
+    for _ in range(200):
+        status = cliente.get(tarefa, query_string={'dados': '0'}).get_json()['status']
+        if status not in ('pendente', 'executando'):
+            break
+        time.sleep(0.05)
+    assert status == 'concluida'
+    monkeypatch.setattr(api, 'CLIMA_ESPERA_S', 10)
+    resposta = cliente.get('/metrics/navios', query_string={'ship': ','.join(NAVIOS), 'metricas': 'clima'})
+    assert resposta.status_code == 200
+    assert all(len(resposta.get_json()['navios'][navio]['clima']) > 0 for navio in NAVIOS)
+
+
+@pytest.mark.parametrize('consulta', [
+    {'ship': NAVIOS[0], 'metricas': 'risco,temperatura'},
+    {'ship': NAVIOS[0], 'metricas': ','},
+    {'ship': ','.join(f'NAVIO {i:04d}' for i in range(51))},
+    {},
+])
+def test_lote_invalido(cliente, consulta):
+    assert cliente.get('/metrics/navios', query_string=consulta).status_code == 400
@@ -0,0 +1,119 @@
+"""
+Cliente ERA5 (ClienteClimaERA5) contra o servidor local de benchmarks/stub_era5.py: retry em
+429/5xx, cache em disco só para chunks com mais de ATRASO_ERA5_DIAS, divisão em chunks de um
+ano, lotes de células da grade por requisição e reaproveitamento das conexões do pool.
+"""
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from clima import ClienteClimaERA5
+from stub_era5 import StubERA5
+
+
+@pytest.fixture
+def stub():
+    servidor = StubERA5()
+    yield servidor
+    servidor.fechar()
+
+
+def cliente_para(stub, tmp_path=None, **opcoes) -> ClienteClimaERA5:
+    # backoff=0: as novas tentativas não esperam (o comportamento testado é o número de tentativas)
+    opcoes.setdefault('backoff', 0)
+    return ClienteClimaERA5(stub.url, cache_dir=str(tmp_path) if tmp_path is not None else None, **opcoes)
+
+
+# --- RETRY ---
+
+@pytest.mark.parametrize('falhas', [[429], [503], [500, 502], [429, 504, 503]])
+def test_retry_em_429_e_5xx(stub, falhas):
+    stub.falhas = list(falhas)
+    cliente = cliente_para(stub, tentativas=3)
+    df = cliente.buscar(-23.0, -43.0, date(2023, 1, 1), date(2023, 1, 10))
+
+    assert len(df) == 10 * 24
+    assert stub.status == falhas + [200]
+    assert cliente.requisicoes == 1  # as novas tentativas ficam no adapter, não contam como chamadas
+
+
+def test_retry_esgotado_devolve_vazio(stub):
+    stub.falhas = [503] * 10
+    cliente = cliente_para(stub, tentativas=2)
+    df = cliente.buscar(-23.0, -43.0, date(2023, 1, 1), date(2023, 1, 10))
+
+    assert df.empty
+    assert stub.requisicoes == 3  # a original + 2 novas tentativas
+
+
+def test_erro_do_cliente_nao_e_repetido(stub):
+    stub.falhas = [400]
+    cliente = cliente_para(stub, tentativas=3)
+    assert cliente.buscar(-23.0, -43.0, date(2023, 1, 1), date(2023, 1, 10)).empty
+    assert stub.requisicoes == 1
+
+
+# --- CACHE EM DISCO ---
+
+def test_chunk_antigo_vem_do_cache(stub, tmp_path):
+    cliente = cliente_para(stub, tmp_path)
+    primeira = cliente.buscar(-23.0, -43.0, date(2023, 1, 1), date(2023, 3, 31))
+    assert stub.requisicoes == 1
+
+    # Outro cliente (ex.: outro processo) com o mesmo diretório: nenhuma requisição nova
+    segunda = cliente_para(stub, tmp_path).buscar(-23.0, -43.0, date(2023, 1, 1), date(2023, 3, 31))
+    assert stub.requisicoes == 1
+    pd.testing.assert_frame_equal(primeira, segunda)
+
+
+def test_chunk_recente_nao_vai_para_o_cache(stub, tmp_path):
+    # Termina dentro da janela de ATRASO_ERA5_DIAS: o ERA5 ainda pode revisar esses dias
+    fim = date.today() - timedelta(days=ClienteClimaERA5.ATRASO_ERA5_DIAS - 2)
+    cliente = cliente_para(stub, tmp_path)
+    cliente.buscar(-23.0, -43.0, fim - timedelta(days=20), fim)
+    cliente.buscar(-23.0, -43.0, fim - timedelta(days=20), fim)
+    assert stub.requisicoes == 2
+    assert not list(tmp_path.iterdir())
+
+
+def test_falha_nao_vai_para_o_cache(stub, tmp_path):
+    stub.falhas = [503] * 4
+    cliente = cliente_para(stub, tmp_path, tentativas=3)
+    assert cliente.buscar(-23.0, -43.0, date(2023, 1, 1), date(2023, 1, 10)).empty
+    assert not cliente.buscar(-23.0, -43.0, date(2023, 1, 1), date(2023, 1, 10)).empty
+    assert stub.requisicoes == 5
+
+
+# --- CHUNKS, LOTES E POOL ---
+
+def test_periodo_longo_em_chunks_de_um_ano_com_pool(stub):
+    # Antes de API_START_LIMIT não há pedido; 2022-01-01..2026-06-30 são 5 chunks de até 365 dias
+    cliente = cliente_para(stub, max_paralelo=2)
+    df = cliente.buscar(-23.0, -43.0, date(2020, 5, 1), date(2026, 6, 30))
+
+    dias = (date(2026, 6, 30) - ClienteClimaERA5.API_START_LIMIT).days + 1
+    assert stub.requisicoes == 5
+    assert len(df) == dias * 24
+    assert df['DataHoraGMT'].is_monotonic_increasing
+    # Conexões HTTP/1.1 reaproveitadas pelo pool: no máximo uma por download simultâneo
+    assert len(stub.conexoes) <= 2
+
+
+def test_grade_em_lotes_por_dia_e_cache(stub, tmp_path):
+    celulas = 120  # 3 requisições de até MAX_LOCAIS_POR_REQUISICAO (50) células
+    pedidos = pd.DataFrame({
+        'latitude': ClienteClimaERA5.celula_grade([-20.0 - 0.25 * i for i in range(celulas)] * 2),
+        'longitude': ClienteClimaERA5.celula_grade([-40.0] * celulas * 2),
+        'dia': ['2023-05-01'] * celulas + ['2023-05-02'] * celulas,
+    })
+    cliente = cliente_para(stub, tmp_path)
+    df = cliente.buscar_grade(pedidos)
+
+    assert stub.requisicoes == 2 * 3
+    assert len(df) == 2 * celulas * 24
+    assert max(len(c.split('latitude=')[1].split('&')[0].split('%2C')) for c in stub.caminhos) == 50
+
+    # Um arquivo de cache por dia: repetir (ou pedir um subconjunto) não baixa nada
+    cliente.buscar_grade(pedidos.iloc[::7])
+    assert stub.requisicoes == 6
@@ -0,0 +1,76 @@
+"""
+Métricas 5 e 8: a conformidade NORMAM 401 (grade navio x mês + merge_asof) e o risco de
+bioincrustação da frota (uma passada agrupada) devem reproduzir as implementações originais
+por navio (benchmarks/originais.py).
+"""
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import originais
+from analytics import TranspetroAnalytics
+from gerador_frota import escrever_csvs, gerar_frota
+
+
+@pytest.fixture(scope='module')
+def caminhos(tmp_path_factory):
+    return escrever_csvs(gerar_frota(n_navios=12, anos=4, seed=3), str(tmp_path_factory.mktemp('frota')))
+
+
+def carregar(caminhos, compacto=False) -> TranspetroAnalytics:
+    return TranspetroAnalytics(caminhos['eventos'], caminhos['consumo'], caminhos['revestimento'],
+                               caminhos['iws'], compacto=compacto)
+
+
+@pytest.fixture(scope='module')
+def analytics(caminhos):
+    return carregar(caminhos)
+
+
+def test_conformidade_igual_ao_laco_original(analytics):
+    esperado = originais.conformidade_normam_401(analytics.df_revestimento, analytics.df_eventos)
+    assert_frame_equal(analytics.calcular_conformidade_normam_401(), esperado)
+
+
+def test_conformidade_casos_de_borda(analytics):
+    # Prazos zerados, duas aplicações na mesma data, aplicação futura e nomes com espaços
+    revestimento = pd.DataFrame({
+        'shipName': ['NAVIO A', 'NAVIO A', 'NAVIO B', 'NAVIO B', 'NAVIO B', ' NAVIO C ', 'NAVIO D'],
+        'DataAplicacao': pd.to_datetime(['2019-01-31', '2021-05-10', '2020-02-29', '2020-02-29', '2022-07-01',
+                                         '2018-03-15', pd.Timestamp('today') + pd.Timedelta(days=400)]),
+        'T_base': [60, 0, 36, 60, 150, 35, 60],
+        'T_max': [150, 150, 36, 60, 40, 35, 60],
+    })
+    original = analytics.df_revestimento
+    analytics.df_revestimento = revestimento
+    try:
+        obtido = analytics.calcular_conformidade_normam_401()
+    finally:
+        analytics.df_revestimento = original
+    assert_frame_equal(obtido, originais.conformidade_normam_401(revestimento, analytics.df_eventos))
+
+
+def test_risco_igual_ao_laco_original(analytics):
+    df_conformidade = analytics.calcular_conformidade_normam_401()
+    esperado = originais.risco_bioincrustacao_frota(analytics.df_eventos, df_conformidade)
+    analytics.invalidar_cache()
+    assert_frame_equal(analytics.calcular_risco_bioincrustacao_frota(df_conformidade), esperado)
+    # Segunda chamada: a tabela materializada
+    assert_frame_equal(analytics.calcular_risco_bioincrustacao_frota(df_conformidade), esperado)
+
+
+def test_risco_sem_conformidade_do_navio(analytics):
+    # Navios fora da tabela de conformidade contam como 100% conformes
+    df_conformidade = analytics.calcular_conformidade_normam_401()
+    parcial = df_conformidade[df_conformidade['shipName'] != df_conformidade['shipName'].iloc[0]]
+    esperado = originais.risco_bioincrustacao_frota(analytics.df_eventos, parcial)
+    assert_frame_equal(analytics.calcular_risco_bioincrustacao_frota(parcial), esperado)
+
+
+def test_modo_compacto_igual_ao_laco_original(caminhos, analytics):
+    compacto = carregar(caminhos, compacto=True)
+    df_conformidade = compacto.calcular_conformidade_normam_401()
+    assert_frame_equal(df_conformidade,
+                       originais.conformidade_normam_401(analytics.df_revestimento, analytics.df_eventos))
+    assert_frame_equal(compacto.calcular_risco_bioincrustacao_frota(df_conformidade),
+                       originais.risco_bioincrustacao_frota(analytics.df_eventos, df_conformidade))
@@ -0,0 +1,110 @@
+"""
+Cubo de consumo (navio x mês x combustível x tipo de evento): as consultas devem bater com a
+métrica 3 (consumo mensal), os combustíveis devem somar o membro TODOS e o cubo atualizado na
+ingestão deve ser igual ao remontado do zero a partir das bases.
+"""
+import numpy as np
+import pytest
+from pandas.testing import assert_frame_equal
+
+from analytics import TranspetroAnalytics
+from cubo import CuboConsumo
+from gerador_frota import escrever_csvs, gerar_frota
+
+CONSUMO = 'Consumo Total (unidade)'
+
+
+@pytest.fixture(scope='module')
+def frota():
+    return gerar_frota(n_navios=8, anos=2, seed=5)
+
+
+@pytest.fixture(scope='module')
+def caminhos(frota, tmp_path_factory):
+    return escrever_csvs(frota, str(tmp_path_factory.mktemp('frota')))
+
+
+def carregar(caminhos, compacto=False) -> TranspetroAnalytics:
+    return TranspetroAnalytics(caminhos['eventos'], caminhos['consumo'], caminhos['revestimento'],
+                               caminhos['iws'], compacto=compacto)
+
+
+@pytest.fixture(scope='module')
+def analytics(caminhos):
+    return carregar(caminhos)
+
+
+def cubo_do_zero(analytics: TranspetroAnalytics) -> CuboConsumo:
+    return CuboConsumo.construir(analytics._eventos_cubo(analytics.df_eventos), analytics.df_consumo)
+
+
+def test_agregar_por_mes_igual_ao_consumo_mensal(analytics):
+    esperado = analytics.calcular_consumo_mensal_total()
+    obtido = analytics.cubo_consumo().agregar(['mes'])
+    # Meses só com sessões sem consumo aparecem no cubo (com consumo zero), não na métrica 3
+    obtido = obtido[obtido['Mês/Ano'].isin(esperado['Mês/Ano'])].reset_index(drop=True)
+    assert obtido['Mês/Ano'].tolist() == esperado['Mês/Ano'].tolist()
+    np.testing.assert_allclose(obtido[CONSUMO].to_numpy(), esperado[CONSUMO].to_numpy(), rtol=1e-9)
+
+
+def test_combustiveis_somam_o_total(analytics):
+    cubo = analytics.cubo_consumo()
+    total = cubo.agregar(['navio', 'mes'])
+    por_combustivel = (cubo.agregar(['navio', 'mes', 'combustivel'])
+                       .groupby(['shipName', 'Mês/Ano'], as_index=False)[CONSUMO].sum())
+    juntos = total.merge(por_combustivel, on=['shipName', 'Mês/Ano'], how='left', suffixes=('', '_comb'))
+    np.testing.assert_allclose(juntos[CONSUMO].to_numpy(), juntos[CONSUMO + '_comb'].fillna(0).to_numpy(),
+                               rtol=1e-9)
+    assert cubo.agregar()[CONSUMO].iloc[0] == pytest.approx(cubo.agregar(['combustivel'])[CONSUMO].sum())
+    # Sessões e horas só pelo membro TODOS: cada sessão com data de início conta uma vez
+    sessoes = analytics.df_eventos.dropna(subset=['startGMTDate'])['sessionId'].nunique()
+    assert cubo.agregar()['Sessões'].iloc[0] == sessoes
+
+
+def test_filtros_por_mes_inclusivos(analytics):
+    cubo = analytics.cubo_consumo()
+    por_mes = cubo.agregar(['mes'])
+    meses = por_mes['Mês/Ano'].tolist()
+    inicio, fim = meses[2], meses[5]
+
+    esperado = por_mes[(por_mes['Mês/Ano'] >= inicio) & (por_mes['Mês/Ano'] <= fim)].reset_index(drop=True)
+    assert_frame_equal(cubo.agregar(['mes'], inicio=inicio, fim=fim), esperado)
+    # Datas completas são reduzidas ao mês
+    assert_frame_equal(cubo.agregar(['mes'], inicio=f'{inicio}-28', fim=f'{fim}-01'), esperado)
+    assert cubo.agregar(['mes'], inicio=meses[-1])['Mês/Ano'].tolist() == [meses[-1]]
+    assert cubo.agregar(['mes'], fim='1900-01').empty
+
+    navio = cubo.agregar(['navio'])['shipName'].iloc[0]
+    filtrado = cubo.agregar(['navio', 'mes'], navio=navio, inicio=inicio, fim=fim)
+    assert set(filtrado['shipName']) == {navio}
+    assert filtrado['Mês/Ano'].between(inicio, fim).all()
+
+
+@pytest.mark.parametrize('compacto', [False, True])
+def test_ingestao_igual_ao_cubo_do_zero(frota, tmp_path, compacto):
+    eventos, consumo = frota['eventos'], frota['consumo']
+    sessoes = eventos['sessionId'].drop_duplicates()
+    sessoes_tardias = set(sessoes.iloc[-len(sessoes) // 5:])
+    # Parte do consumo das sessões já carregadas chega depois (contar_eventos=False)
+    consumo_tardio = consumo.iloc[::7]
+    consumo_inicial = consumo.drop(consumo_tardio.index)
+    base = escrever_csvs({**frota, 'eventos': eventos[~eventos['sessionId'].isin(sessoes_tardias)],
+                          'consumo': consumo_inicial}, str(tmp_path))
+    analytics = carregar(base, compacto=compacto)
+    analytics.cubo_consumo()
+
+    resumo = analytics.ingerir_consumo(consumo_tardio)
+    assert resumo['linhas_consumo_novas'] == len(consumo_tardio)
+    assert resumo['linhas_repetidas'] == 0
+    assert 'cubo_consumo' in analytics._tabelas_materializadas
+    analytics.ingerir_eventos(eventos[eventos['sessionId'].isin(sessoes_tardias)])
+    assert 'cubo_consumo' in analytics._tabelas_materializadas
+
+    incremental, do_zero = analytics.cubo_consumo(), cubo_do_zero(analytics)
+    assert analytics._tabelas_materializadas['cubo_consumo'][2] is incremental
+    for por in ([], ['mes'], ['navio', 'mes'], ['navio', 'mes', 'combustivel', 'evento']):
+        assert_frame_equal(incremental.agregar(por), do_zero.agregar(por), check_exact=False, rtol=1e-6)
+
+    # Reingerir o mesmo consumo não altera o cubo
+    assert analytics.ingerir_consumo(consumo_tardio)['linhas_consumo_novas'] == 0
+    assert analytics.cubo_consumo() is incremental
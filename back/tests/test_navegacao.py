@@ -0,0 +1,129 @@
+"""
+Métrica 4 (embarcações navegando por dia): a varredura de intervalos deve reproduzir o laço
+original (um `date_range` por evento de NAVEGACAO) e o `embarcacoes_navegando_por_dia.csv`
+entregue com o repositório.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from analytics import TranspetroAnalytics
+from gerador_frota import gerar_frota
+
+CSV_ENTREGUE = os.path.join(os.path.dirname(__file__), '..', 'app', 'embarcacoes_navegando_por_dia.csv')
+
+
+def navegacao_por_dia_original(df_eventos: pd.DataFrame, classes: dict = None,
+                               agrupar_por: str = None) -> pd.DataFrame:
+    """Implementação anterior à varredura (um date_range por evento), estendida aos agrupamentos."""
+    df_nav = df_eventos[df_eventos['eventName'] == 'NAVEGACAO'].copy()
+    df_nav.dropna(subset=['startGMTDate', 'endGMTDate'], inplace=True)
+    df_nav['start_date'] = df_nav['startGMTDate'].dt.normalize()
+    df_nav['end_date'] = df_nav['endGMTDate'].dt.normalize()
+
+    date_ranges = []
+    for _, row in df_nav.iterrows():
+        dates = pd.date_range(start=row['start_date'], end=row['end_date'], freq='D')
+        date_ranges.extend([(row['shipName'], date) for date in dates])
+    df_daily_nav = pd.DataFrame(date_ranges, columns=['shipName', 'Data'])
+
+    if agrupar_por is None:
+        chaves = ['Data']
+    else:
+        if agrupar_por != 'shipName':
+            df_daily_nav[agrupar_por] = df_daily_nav['shipName'].map(classes)
+        chaves = ['Data', agrupar_por]
+    df_resultado = (df_daily_nav.groupby(chaves)['shipName'].nunique()
+                    .rename('Embarcações Navegando').reset_index())
+    return df_resultado[chaves + ['Embarcações Navegando']].sort_values(by=chaves).reset_index(drop=True)
+
+
+def analytics_com(df_eventos: pd.DataFrame, classes: dict) -> TranspetroAnalytics:
+    revestimento = pd.DataFrame({'shipName': list(classes), 'Classe': list(classes.values())})
+    return TranspetroAnalytics('', '', '', '', tabelas={'eventos': df_eventos, 'revestimento': revestimento})
+
+
+def comparavel(df: pd.DataFrame) -> pd.DataFrame:
+    chaves = [c for c in df.columns if c != 'Embarcações Navegando']
+    df = df.sort_values(chaves).reset_index(drop=True)
+    df['Data'] = pd.to_datetime(df['Data']).astype('datetime64[ns]')
+    df['Embarcações Navegando'] = df['Embarcações Navegando'].astype(np.int64)
+    return df
+
+
+# --- FROTA GERADA ---
+
+@pytest.fixture(scope='module')
+def frota():
+    eventos = gerar_frota(n_navios=6, anos=1.5, seed=1)['eventos']
+    # Casos de borda: viagens sobrepostas e adjacentes do mesmo navio, virada de dia e fim ausente
+    extras = pd.DataFrame({
+        'sessionId': [1, 2, 3, 4],
+        'shipName': ['NAVIO 0000', 'NAVIO 0000', 'NAVIO 0001', 'NAVIO 0002'],
+        'eventName': 'NAVEGACAO',
+        'startGMTDate': pd.to_datetime(['2021-04-01 10:00', '2021-04-03 23:00', '2021-05-10 23:59', '2021-06-01 00:00']),
+        'endGMTDate': pd.to_datetime(['2021-04-04 02:00', '2021-04-08 01:00', '2021-05-11 00:01', None]),
+    })
+    eventos = pd.concat([eventos, extras], ignore_index=True)
+    classes = {navio: ['Suezmax', 'Aframax', 'MR2'][i % 3] for i, navio in enumerate(sorted(eventos['shipName'].unique()))}
+    return eventos, classes
+
+
+@pytest.mark.parametrize('agrupar_por', [None, 'shipName', 'Classe'])
+def test_varredura_igual_ao_laco_original(frota, agrupar_por):
+    eventos, classes = frota
+    esperado = navegacao_por_dia_original(eventos, classes, agrupar_por)
+    obtido = analytics_com(eventos, classes).calcular_embarcacoes_navegando_por_dia(agrupar_por)
+
+    assert list(obtido.columns) == list(esperado.columns)
+    assert_frame_equal(comparavel(obtido), comparavel(esperado))
+
+
+def test_sem_eventos_de_navegacao(frota):
+    eventos, classes = frota
+    obtido = analytics_com(eventos[eventos['eventName'] != 'NAVEGACAO'], classes) \
+        .calcular_embarcacoes_navegando_por_dia()
+    assert obtido.empty
+    assert list(obtido.columns) == ['Data', 'Embarcações Navegando']
+
+
+# --- CSV ENTREGUE COM O REPOSITÓRIO ---
+
+@pytest.fixture(scope='module')
+def entregue():
+    """
+    O CSV entregue e eventos que o reproduzem: os eventos originais não acompanham o repositório,
+    então cada dia com contagem n vira n navios navegando naquele dia (trechos dentro do dia).
+    """
+    csv = pd.read_csv(CSV_ENTREGUE, parse_dates=['Data'])
+    dias = csv['Data'].to_numpy().repeat(csv['Embarcações Navegando'].to_numpy())
+    navio = np.concatenate([np.arange(n) for n in csv['Embarcações Navegando']])
+    eventos = pd.DataFrame({
+        'sessionId': np.arange(len(dias)),
+        'shipName': [f'NAVIO {i:04d}' for i in navio],
+        'eventName': 'NAVEGACAO',
+        'startGMTDate': pd.DatetimeIndex(dias) + pd.Timedelta(hours=6),
+        'endGMTDate': pd.DatetimeIndex(dias) + pd.Timedelta(hours=18),
+    })
+    classes = {nome: ['Suezmax', 'Aframax', 'MR2', 'Gaseiro'][i % 4]
+               for i, nome in enumerate(sorted(eventos['shipName'].unique()))}
+    return csv, eventos, classes
+
+
+def test_laco_original_reproduz_csv_entregue(entregue):
+    csv, eventos, classes = entregue
+    assert_frame_equal(comparavel(navegacao_por_dia_original(eventos)), comparavel(csv))
+
+
+@pytest.mark.parametrize('agrupar_por', [None, 'shipName', 'Classe'])
+def test_varredura_reproduz_csv_entregue(entregue, agrupar_por):
+    csv, eventos, classes = entregue
+    obtido = analytics_com(eventos, classes).calcular_embarcacoes_navegando_por_dia(agrupar_por)
+    if agrupar_por is not None:
+        # Navios distintos por grupo somam os navios distintos do dia (cada navio tem um só grupo)
+        assert_frame_equal(comparavel(obtido), comparavel(navegacao_por_dia_original(eventos, classes, agrupar_por)))
+        obtido = obtido.groupby('Data', as_index=False)['Embarcações Navegando'].sum()
+    assert_frame_equal(comparavel(obtido), comparavel(csv))
@@ -0,0 +1,86 @@
+"""
+Ponto de limpeza ideal: avaliar_navio (somas de sufixo, todas as datas de uma vez) deve reproduzir a
+simulação direta, dia a dia, da incrustação com e sem limpeza em cada data candidata.
+"""
+import math
+
+import numpy as np
+import pytest
+
+import pli
+
+INICIO = np.datetime64('2024-11-20')
+
+
+def avaliar_por_forca_bruta(perfil, inicio, horizonte_dias, precos, custos, taxa_desconto):
+    """Laço O(datas x dias): limpa no início do dia d e soma o consumo extra evitado até o fim do horizonte."""
+    _, consumo_dia, incrustacao_inicial, risco_mes, multiplicador = perfil
+    taxas = []
+    for t in range(horizonte_dias):
+        mes = int((inicio + np.timedelta64(t, 'D')).astype('datetime64[M]').astype(np.int64) % 12)
+        taxas.append(risco_mes[mes] / pli.RISCO_MAX / pli.DIAS_SATURACAO_RISCO_MAX * multiplicador)
+    desconto = [(1.0 + taxa_desconto) ** (-t / 365.0) for t in range(horizonte_dias)]
+
+    def penalidade(incrustacao):
+        return pli.PENALIDADE_MAX * (1.0 - math.exp(-incrustacao))
+
+    economizado, descontado = [], []
+    for d in range(horizonte_dias):
+        sem_limpeza = incrustacao_inicial + sum(taxas[:d])
+        com_limpeza = 0.0
+        total = total_descontado = 0.0
+        for t in range(d, horizonte_dias):
+            sem_limpeza += taxas[t]
+            com_limpeza += taxas[t]
+            extra = consumo_dia * (penalidade(sem_limpeza) - penalidade(com_limpeza))
+            total += extra
+            total_descontado += extra * desconto[t]
+        economizado.append(total)
+        descontado.append(total_descontado)
+
+    melhor_dia = np.full((len(precos), len(custos)), -1)
+    economia_melhor = np.zeros((len(precos), len(custos)))
+    for i, preco in enumerate(precos):
+        for j, custo in enumerate(custos):
+            liquida = [preco * descontado[d] - custo * desconto[d] for d in range(horizonte_dias)]
+            d = int(np.argmax(liquida))
+            if liquida[d] > 0:
+                melhor_dia[i, j], economia_melhor[i, j] = d, liquida[d]
+    return np.array(economizado), melhor_dia, economia_melhor
+
+
+def perfil_aleatorio(seed: int) -> pli.PerfilNavio:
+    rng = np.random.default_rng(seed)
+    return (f'NAVIO {seed}', float(rng.uniform(20, 80)), float(rng.uniform(0, 1.5)),
+            rng.uniform(1, pli.RISCO_MAX, 12), float(rng.uniform(0.5, 2.0)))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_avaliar_navio_igual_a_forca_bruta(seed):
+    perfil = perfil_aleatorio(seed)
+    precos = np.array([400.0, 650.0, 1000.0])
+    # Custos do mais barato (limpa logo) ao que nenhuma limpeza paga no horizonte (-1)
+    custos = np.array([1_000.0, 50_000.0, 200_000.0, 1e9])
+    horizonte, taxa = 150, 0.08
+
+    obtido = pli.avaliar_navio(perfil, INICIO, horizonte, precos, custos, taxa)
+    economizado, melhor_dia, economia_melhor = avaliar_por_forca_bruta(perfil, INICIO, horizonte, precos,
+                                                                       custos, taxa)
+
+    np.testing.assert_allclose(obtido['combustivel_economizado'], economizado, rtol=1e-9, atol=1e-9)
+    np.testing.assert_array_equal(obtido['melhor_dia'], melhor_dia)
+    np.testing.assert_allclose(obtido['economia_melhor'], economia_melhor, rtol=1e-9, atol=1e-6)
+    assert (obtido['melhor_dia'][:, -1] == -1).all()
+    assert (obtido['combustivel_melhor'][:, -1] == 0).all()
+
+
+def test_avaliar_frota_em_processos_igual_ao_laco():
+    perfis = [perfil_aleatorio(seed) for seed in range(5)]
+    precos, custos = pli.PRECOS_COMBUSTIVEL_PADRAO[:3], pli.CUSTOS_LIMPEZA_PADRAO[:3]
+    em_processos = pli.avaliar_frota(perfis, INICIO, 90, precos, custos, processos=2)
+    no_laco = pli.avaliar_frota(perfis, INICIO, 90, precos, custos, processos=1)
+
+    assert len(em_processos) == len(perfis)
+    for a, b in zip(em_processos, no_laco):
+        for chave in a:
+            np.testing.assert_array_equal(a[chave], b[chave])
@@ -0,0 +1,54 @@
+"""
+Métrica 7: o dataset navio-dia é montado numa pasta temporária e só substitui o anterior quando
+está completo; se um navio falhar, nada fica para trás no disco.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from treinamento import gerar_dataset
+
+
+def entrada(navio: str) -> tuple:
+    eventos = pd.DataFrame({
+        'shipName': [navio] * 2,
+        'eventName': ['NAVEGACAO', 'EM PORTO'],
+        'startGMTDate': pd.to_datetime(['2023-01-01 00:00', '2023-01-03 06:00']),
+        'endGMTDate': pd.to_datetime(['2023-01-03 06:00', '2023-01-05 12:00']),
+        'duration': [54.0, 54.0],
+        'decLatitude': [-23.0, -22.9],
+        'decLongitude': [-43.2, -43.1],
+    })
+    revestimento = pd.DataFrame({'DataAplicacao': pd.to_datetime(['2022-06-01']), 'T_base': [12.0], 'T_max': [60.0]})
+    iws = pd.DataFrame({'DataRelatorio': pd.to_datetime(['2023-01-04']), 'RiscoBioincrustacao': [2]})
+    return navio, eventos, revestimento, iws, None
+
+
+def entrada_invalida(navio: str) -> tuple:
+    return navio, pd.DataFrame({'shipName': [navio]}), pd.DataFrame(), pd.DataFrame(), None
+
+
+def pastas(tmp_path) -> list:
+    return sorted(os.listdir(tmp_path))
+
+
+@pytest.mark.parametrize('processos', [1, 2])
+def test_gera_dataset_e_troca_o_anterior(tmp_path, processos):
+    destino = str(tmp_path / 'dataset')
+    os.makedirs(destino)
+    resumo = gerar_dataset([entrada('NAVIO A'), entrada('NAVIO B')], destino, 7, [], processos=processos)
+    assert resumo['navios'] == 2 and resumo['linhas'] > 0
+    assert pastas(tmp_path) == ['dataset']
+
+
+@pytest.mark.parametrize('processos', [1, 2])
+def test_falha_em_um_navio_remove_a_pasta_temporaria(tmp_path, processos):
+    destino = str(tmp_path / 'dataset')
+    gerar_dataset([entrada('NAVIO A')], destino, 7, [], processos=1)
+    anterior = sorted(os.listdir(destino))
+
+    with pytest.raises(Exception):
+        gerar_dataset([entrada('NAVIO A'), entrada_invalida('NAVIO B')], destino, 7, [], processos=processos)
+    assert pastas(tmp_path) == ['dataset']
+    assert sorted(os.listdir(destino)) == anterior